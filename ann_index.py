@@ -0,0 +1,297 @@
+import os
+import logging
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rows scored per block when assigning vectors to centroids, to bound memory
+ASSIGN_BLOCK_ROWS = 65536
+
+# An IVF index is retrained once its row count has grown or shrunk by this
+# factor since training, as its centroids no longer fit the data well
+IVF_RETRAIN_FACTOR = 2.0
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    rows = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return rows[np.argsort(-scores[rows], kind="stable")]
+
+
+class IVFFlatIndex:
+    """Inverted-file index over an inner-product (cosine) vector matrix.
+
+    Vectors are clustered with spherical k-means; a query scores only the
+    rows in its `nprobe` closest clusters. The index stores row numbers, not
+    vectors, and reads candidate rows from the caller's matrix, so it works
+    directly on a memory-mapped matrix. Higher `nprobe` trades latency for
+    recall.
+
+    Rows added or removed after training are assigned to, or dropped from,
+    the existing lists; `drifted` says when the row count has moved far
+    enough from the training set that the centroids should be retrained.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, nprobe: int = 8, trained_rows: Optional[int] = None):
+        self.centroids = centroids.astype(np.float32, copy=False)
+        self.assignments = assignments.astype(np.int32, copy=False)
+        self.nprobe = nprobe
+        self.trained_rows = len(self.assignments) if trained_rows is None else trained_rows
+        self._lists = None
+
+    @classmethod
+    def train(
+        cls,
+        matrix: np.ndarray,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        iterations: int = 10,
+        seed: int = 0
+    ) -> "IVFFlatIndex":
+        """
+        Cluster a (normalised) matrix and assign every row to a list.
+
+        Args:
+            matrix: Row-normalised float32 vectors
+            nlist: Number of clusters (defaults to 4 * sqrt(rows))
+            nprobe: Clusters scanned per query
+            iterations: k-means iterations
+            seed: Random seed for the initial centroids and training sample
+
+        Returns:
+            The trained index
+        """
+        rows = len(matrix)
+        nlist = max(1, min(rows, nlist or int(4 * np.sqrt(rows))))
+        rng = np.random.default_rng(seed)
+        sample_size = min(rows, max(nlist * 64, 10000), 200000)
+        sample = np.asarray(matrix[np.sort(rng.choice(rows, sample_size, replace=False))], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty clusters from random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+
+        index = cls(centroids, np.zeros(0, dtype=np.int32), nprobe=nprobe, trained_rows=rows)
+        index.add(matrix)
+        logger.info(f"Trained IVF index with {nlist} lists over {rows} vectors")
+        return index
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        labels = [
+            np.argmax(np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS]) @ self.centroids.T, axis=1)
+            for start in range(0, len(vectors), ASSIGN_BLOCK_ROWS)
+        ]
+        return np.concatenate(labels).astype(np.int32) if labels else np.zeros(0, dtype=np.int32)
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Assign newly appended matrix rows to their nearest lists."""
+        self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+        self._lists = None
+
+    def remove(self, keep: np.ndarray) -> None:
+        """Drop matrix rows; `keep` is a boolean mask over the current rows."""
+        self.assignments = self.assignments[keep]
+        self._lists = None
+
+    def drifted(self) -> bool:
+        """Whether the index has changed enough since training to be retrained."""
+        rows = len(self)
+        return rows > IVF_RETRAIN_FACTOR * self.trained_rows or rows * IVF_RETRAIN_FACTOR < self.trained_rows
+
+    def __len__(self) -> int:
+        return len(self.assignments)
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(self.assignments, minlength=len(self.centroids)))])
+            self._lists = (order, offsets)
+        return self._lists
+
+    def search(self, matrix: np.ndarray, query: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k rows by inner product.
+
+        Args:
+            matrix: The matrix the index was built over
+            query: Normalised query vector
+            k: Number of rows to return
+            nprobe: Clusters to scan (defaults to the index setting)
+
+        Returns:
+            (rows, scores), best first
+        """
+        order, offsets = self._inverted_lists()
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = _top_k(self.centroids @ query, nprobe)
+        candidates = np.concatenate([order[offsets[p]:offsets[p + 1]] for p in probes])
+        candidates.sort()
+        scores = np.asarray(matrix[candidates]) @ query
+        best = _top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def save(self, path: str) -> None:
+        """Save centroids and assignments to an .npz file."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                assignments=self.assignments,
+                nprobe=self.nprobe,
+                trained_rows=self.trained_rows
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFFlatIndex":
+        data = np.load(path)
+        # Indexes saved before trained_rows was recorded count as freshly trained
+        trained_rows = int(data["trained_rows"]) if "trained_rows" in data else None
+        return cls(data["centroids"], data["assignments"], nprobe=int(data["nprobe"]), trained_rows=trained_rows)
+
+
+class HNSWIndex:
+    """HNSW graph index backed by the optional `hnswlib` package.
+
+    Labels are assigned in insertion order and mapped to matrix row numbers
+    by `label_rows`. Removed rows are marked deleted in the graph and their
+    labels mapped to -1, so a delete does not rebuild it; `drifted` says
+    when deleted entries outnumber live ones. `ef_search` trades latency for
+    recall; `M` and `ef_construction` control graph quality at build time.
+    """
+
+    kind = "hnsw"
+
+    def __init__(self, index: Any, ef_search: int = 64, label_rows: Optional[np.ndarray] = None):
+        self.index = index
+        self.ef_search = ef_search
+        self.index.set_ef(ef_search)
+        if label_rows is None:
+            label_rows = np.arange(index.get_current_count(), dtype=np.int64)
+        self.label_rows = label_rows.astype(np.int64, copy=False)
+        self._live = int((self.label_rows >= 0).sum())
+
+    @classmethod
+    def train(
+        cls,
+        matrix: np.ndarray,
+        M: int = 16,
+        ef_construction: int = 200,
+        ef_search: int = 64
+    ) -> "HNSWIndex":
+        """Build a graph over every row of a (normalised) matrix."""
+        import hnswlib
+
+        index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+        index.init_index(max_elements=max(len(matrix), 1), ef_construction=ef_construction, M=M)
+        hnsw = cls(index, ef_search=ef_search)
+        hnsw.add(matrix)
+        logger.info(f"Built HNSW index over {len(matrix)} vectors")
+        return hnsw
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Insert newly appended matrix rows."""
+        if len(vectors) == 0:
+            return
+        start = self.index.get_current_count()
+        if start + len(vectors) > self.index.get_max_elements():
+            self.index.resize_index(max(start + len(vectors), 2 * self.index.get_max_elements()))
+        self.index.add_items(np.asarray(vectors, dtype=np.float32), np.arange(start, start + len(vectors)))
+        self.label_rows = np.concatenate([self.label_rows, np.arange(self._live, self._live + len(vectors))])
+        self._live += len(vectors)
+
+    def remove(self, keep: np.ndarray) -> None:
+        """Drop matrix rows; `keep` is a boolean mask over the current rows."""
+        live = self.label_rows >= 0
+        rows = self.label_rows[live]
+        labels = np.nonzero(live)[0]
+        for label in labels[~keep[rows]]:
+            self.index.mark_deleted(int(label))
+        # Surviving rows move up by the number of removed rows before them
+        new_rows = np.cumsum(keep) - 1
+        self.label_rows[labels] = np.where(keep[rows], new_rows[rows], -1)
+        self._live = int(keep.sum())
+
+    def drifted(self) -> bool:
+        """Whether deleted entries outnumber live ones, so the graph should be rebuilt."""
+        return len(self.label_rows) - self._live > self._live
+
+    def __len__(self) -> int:
+        return self._live
+
+    def search(self, matrix: np.ndarray, query: np.ndarray, k: int, ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k rows by inner product, best first."""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        self.index.set_ef(max(ef_search or self.ef_search, k))
+        labels, distances = self.index.knn_query(query.reshape(1, -1), k=k)
+        return self.label_rows[labels[0].astype(np.int64)], 1.0 - distances[0]
+
+    def save(self, path: str) -> None:
+        """Save the graph, and its label-to-row map next to it."""
+        tmp_path = f"{path}.tmp"
+        self.index.save_index(tmp_path)
+        with open(f"{path}.rows.tmp", "wb") as f:
+            np.save(f, self.label_rows)
+        os.replace(f"{path}.rows.tmp", f"{path}.rows.npy")
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, dim: int, ef_search: int = 64) -> "HNSWIndex":
+        import hnswlib
+
+        index = hnswlib.Index(space="ip", dim=dim)
+        index.load_index(path)
+        # Graphs saved before rows could be removed have one label per row
+        rows_path = f"{path}.rows.npy"
+        label_rows = np.load(rows_path) if os.path.exists(rows_path) else None
+        if label_rows is not None and len(label_rows) != index.get_current_count():
+            label_rows = None
+        return cls(index, ef_search=ef_search, label_rows=label_rows)
+
+
+def hnswlib_available() -> bool:
+    """Whether the optional hnswlib dependency is installed."""
+    try:
+        import hnswlib  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def train_ann_index(kind: str, matrix: np.ndarray, **params: Any):
+    """
+    Build an ANN index of the given kind over a matrix.
+
+    Args:
+        kind: "ivf" or "hnsw" (falls back to "ivf" if hnswlib is missing)
+        matrix: Row-normalised float32 vectors
+        params: Index-specific build parameters
+
+    Returns:
+        The trained index
+    """
+    if kind == "hnsw":
+        if hnswlib_available():
+            return HNSWIndex.train(matrix, **{k: v for k, v in params.items() if k in ("M", "ef_construction", "ef_search")})
+        logger.warning("hnswlib is not installed, falling back to an IVF index")
+    return IVFFlatIndex.train(matrix, **{k: v for k, v in params.items() if k in ("nlist", "nprobe")})
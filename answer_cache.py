@@ -0,0 +1,269 @@
+import os
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from index_cache import persist_dir_fingerprint
+from telemetry import traced
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query_text: str) -> str:
+    """Lower-case a query, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", query_text).strip().lower().rstrip("?!. ")
+
+
+def index_version(persist_dir: str) -> int:
+    """Version of a persisted index, which changes whenever its files are rewritten."""
+    try:
+        return hash(persist_dir_fingerprint(persist_dir))
+    except FileNotFoundError:
+        return 0
+
+
+class _EmbeddingMatrix:
+    """Normalised query embeddings of the cached answers in one scope.
+
+    Rows live in a preallocated matrix that grows by doubling, and a removed
+    row is filled with the last one, so lookups score a contiguous slice
+    without restacking the embeddings.
+    """
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.keys: List[Tuple[str, int, str, str]] = []
+        self.rows: Dict[Tuple[str, int, str, str], int] = {}
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def add(self, key: Tuple[str, int, str, str], embedding: np.ndarray) -> None:
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self.matrix):
+                grown = np.zeros((2 * len(self.matrix), self.matrix.shape[1]), dtype=np.float32)
+                grown[:row] = self.matrix
+                self.matrix = grown
+            self.rows[key] = row
+            self.keys.append(key)
+        self.matrix[row] = embedding
+
+    def remove(self, key: Tuple[str, int, str, str]) -> None:
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        last_key = self.keys.pop()
+        if last_key != key:
+            self.matrix[row] = self.matrix[len(self.keys)]
+            self.keys[row] = last_key
+            self.rows[last_key] = row
+
+    def scores(self, embedding: np.ndarray) -> np.ndarray:
+        return self.matrix[:len(self.keys)] @ embedding
+
+
+class AnswerCache:
+    """LRU cache of query answers keyed by (persist dir, index version, query).
+
+    Queries are normalised before lookup, so case, spacing and a trailing
+    question mark do not cause misses. When `similarity_threshold` and
+    `embed_query` are set, an exact miss falls back to a semantic tier that
+    reuses the answer of a cached query on the same index whose embedding has
+    a cosine similarity of at least the threshold. Entries expire after
+    `ttl_seconds`, and entries for an index stop matching as soon as its
+    files change on disk.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: Optional[float] = 86400,
+        similarity_threshold: Optional[float] = None,
+        embed_query: Optional[Callable[[str], List[float]]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.embed_query = embed_query
+        self._entries: "OrderedDict[Tuple[str, int, str, str], Dict[str, Any]]" = OrderedDict()
+        # Embeddings of the entries that have one, by (persist dir, version, scope)
+        self._embeddings: Dict[Tuple[str, int, str], _EmbeddingMatrix] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def semantic(self) -> bool:
+        return bool(self.similarity_threshold) and self.embed_query is not None
+
+    def _key(self, persist_dir: str, query_text: str, scope: str) -> Tuple[str, int, str, str]:
+        key_dir = os.path.abspath(persist_dir)
+        return (key_dir, index_version(key_dir), scope, normalize_query(query_text))
+
+    def _drop(self, key: Tuple[str, int, str, str]) -> None:
+        """Remove an entry and its embedding row; called with the lock held."""
+        entry = self._entries.pop(key)
+        if entry["embedding"] is not None:
+            embeddings = self._embeddings[key[:3]]
+            embeddings.remove(key)
+            if not len(embeddings):
+                del self._embeddings[key[:3]]
+
+    @traced("answer_cache")
+    def lookup(
+        self,
+        persist_dir: str,
+        query_text: str,
+        scope: str = "",
+        embedding: Optional[List[float]] = None
+    ) -> Tuple[Any, Optional[np.ndarray]]:
+        """
+        Find a cached answer for a query against an index.
+
+        Args:
+            persist_dir: Directory of the index being queried
+            query_text: The query text
+            scope: Extra key component for queries that differ beyond their
+                text (e.g. the file filter of a library query)
+            embedding: The query's embedding, if the caller already has it
+                (otherwise the semantic tier embeds the query itself)
+
+        Returns:
+            (answer or None, query embedding or None). Pass the embedding to
+            `put` so a miss does not embed the query twice.
+        """
+        key = self._key(persist_dir, query_text, scope)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry["expires"] is not None and entry["expires"] <= now:
+                    self._drop(key)
+                    self.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry["answer"], None
+
+        if not self.semantic:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        # Embed outside the lock so a slow embedding call does not block other queries
+        if embedding is None:
+            embedding = self.embed_query(query_text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        if norm > 0:
+            embedding = embedding / norm
+
+        with self._lock:
+            embeddings = self._embeddings.get(key[:3])
+            scores = embeddings.scores(embedding) if embeddings is not None else np.zeros(0, dtype=np.float32)
+            answer, expired = None, []
+            while len(scores):
+                best = int(np.argmax(scores))
+                if scores[best] < self.similarity_threshold:
+                    break
+                candidate_key = embeddings.keys[best]
+                entry = self._entries[candidate_key]
+                if entry["expires"] is not None and entry["expires"] <= now:
+                    # Dropped after the scan, as dropping moves rows; try the next best
+                    expired.append(candidate_key)
+                    scores[best] = -np.inf
+                    continue
+                self._entries.move_to_end(candidate_key)
+                self.semantic_hits += 1
+                logger.info(f"Semantic answer cache hit (similarity {scores[best]:.3f})")
+                answer = entry["answer"]
+                break
+            for expired_key in expired:
+                self._drop(expired_key)
+            self.expirations += len(expired)
+            if answer is None:
+                self.misses += 1
+        return answer, embedding
+
+    def get(self, persist_dir: str, query_text: str, scope: str = "") -> Any:
+        """Return the cached answer for a query, or None."""
+        return self.lookup(persist_dir, query_text, scope)[0]
+
+    def put(
+        self,
+        persist_dir: str,
+        query_text: str,
+        answer: Any,
+        scope: str = "",
+        embedding: Optional[np.ndarray] = None
+    ) -> None:
+        """
+        Cache the answer to a query against an index.
+
+        Args:
+            persist_dir: Directory of the index that was queried
+            query_text: The query text
+            answer: The answer to cache
+            scope: Extra key component, as passed to `lookup`
+            embedding: Normalised query embedding returned by `lookup`
+        """
+        key = self._key(persist_dir, query_text, scope)
+        expires = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {"answer": answer, "expires": expires, "embedding": embedding}
+            if embedding is not None:
+                if key[:3] not in self._embeddings:
+                    self._embeddings[key[:3]] = _EmbeddingMatrix(len(embedding))
+                self._embeddings[key[:3]].add(key, embedding)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, persist_dir: str) -> None:
+        """Drop every cached answer for an index."""
+        key_dir = os.path.abspath(persist_dir)
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == key_dir]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+
+    def clear(self) -> None:
+        """Drop every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._embeddings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters and current occupancy."""
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold if self.semantic else None,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,169 @@
+"""ASGI entry point for production serving.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 4
+
+`POST /api/query` is served natively on the event loop: the query
+embedding and the LLM call are awaited, so hundreds of queries can be in
+flight per worker without a thread each. Every other route is the Flask
+app from server.py, run through asgiref's WSGI adapter on a pool of
+`WSGI_THREADS` threads.
+"""
+import os
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+import server
+from concurrency import ConcurrencyLimitExceeded
+from telemetry import REQUEST_SECONDS
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Largest query body accepted, in bytes
+MAX_QUERY_BODY = 1024 * 1024
+
+# Threads running Flask routes concurrently per worker
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "32"))
+
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="wsgi")
+
+
+# asgiref wraps WsgiToAsgiInstance.run_wsgi_app in sync_to_async; the
+# plain method is reached through the wrapper's `func` (asgiref is pinned
+# in requirements.txt for this reason)
+_run_wsgi_app = getattr(WsgiToAsgiInstance.__dict__.get("run_wsgi_app"), "func", None)
+if _run_wsgi_app is None:
+    raise ImportError(
+        "asgiref.wsgi.WsgiToAsgiInstance.run_wsgi_app is no longer a sync_to_async "
+        "wrapper with a `func` attribute; install the asgiref version pinned in requirements.txt"
+    )
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs the WSGI app thread-sensitively, i.e. every request on
+    # one shared thread; Flask routes are thread-safe, so use the pool
+    _run_wsgi_app = _run_wsgi_app
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=wsgi_executor)(body)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """asgiref's WSGI adapter, running requests in parallel on `wsgi_executor`."""
+
+    async def __call__(self, scope, receive, send):
+        await _PooledWsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+flask_app = PooledWsgiToAsgi(server.app)
+
+
+async def read_body(receive, limit: int = MAX_QUERY_BODY) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > limit:
+            raise ValueError("Request body too large")
+        if not message.get("more_body"):
+            return body
+
+
+async def send_json(send, data, status: int = 200, headers=None) -> None:
+    payload = json.dumps(data).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+            *(headers or []),
+        ],
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def stream_query(send, query_text: str, persist_dir: str) -> None:
+    """Stream the answer to a query as server-sent events."""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ],
+    })
+    start = time.perf_counter()
+    ttft_ms = None
+    try:
+        async for token in server.pdf_qa.astream_query_index(query_text, persist_dir, shard_pool=server.get_shard_pool()):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - start) * 1000
+            await send({"type": "http.response.body", "body": server.sse_event({"token": token}).encode(), "more_body": True})
+        event = server.sse_event({"ttft_ms": ttft_ms, "total_ms": (time.perf_counter() - start) * 1000}, event="done")
+    except Exception as e:
+        logger.error(f"Error streaming query: {str(e)}")
+        event = server.sse_event({"error": str(e)}, event="error")
+    await send({"type": "http.response.body", "body": event.encode()})
+
+
+async def handle_query(scope, receive, send) -> None:
+    """Async twin of server.query."""
+    try:
+        async with server.concurrency_limits["query"].aslot():
+            try:
+                data = json.loads(await read_body(receive) or b"null")
+            except ValueError as e:
+                return await send_json(send, {"error": str(e)}, 400)
+
+            headers = dict(scope["headers"])
+            plan, error = server.parse_query_request(data, headers.get(b"accept", b"").decode("latin-1"))
+            if error:
+                return await send_json(send, {"error": error[0]}, error[1])
+
+            try:
+                if plan["mode"] == "stream":
+                    return await stream_query(send, plan["query_text"], plan["persist_dir"])
+                if plan["mode"] == "library":
+                    return await send_json(send, await server.pdf_qa.aquery_library(plan["query_text"], plan["filenames"], shard_pool=server.get_shard_pool()))
+                return await send_json(send, {"response": await server.pdf_qa.aquery_index(plan["query_text"], plan["persist_dir"], shard_pool=server.get_shard_pool())})
+            except Exception as e:
+                logger.error(f"Error processing query: {str(e)}")
+                return await send_json(send, {"error": str(e)}, 500)
+
+    except ConcurrencyLimitExceeded:
+        await send_json(send, {"error": "Too many concurrent requests, try again shortly"}, 503, [(b"retry-after", b"1")])
+
+
+async def lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            server.pdf_database.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] == "http" and scope["path"] == "/api/query" and scope["method"] == "POST":
+        start = time.perf_counter()
+
+        async def send_timed(message):
+            # Same latency histogram as the Flask routes: time until the response headers
+            if message["type"] == "http.response.start":
+                REQUEST_SECONDS.observe(time.perf_counter() - start, method="POST", endpoint="/api/query", status=message["status"])
+            await send(message)
+
+        return await handle_query(scope, receive, send_timed)
+    await flask_app(scope, receive, send)
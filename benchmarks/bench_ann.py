@@ -0,0 +1,87 @@
+"""Recall and latency of approximate search against exact (brute-force) search.
+
+Uses a synthetic clustered corpus (real embeddings are far from uniform) and
+queries drawn near corpus points. Reports recall@k and p50/p99 latency for
+exact search, IVF at several nprobe settings and, if hnswlib is installed,
+HNSW at several ef_search settings.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_ann --vectors 200000 --dim 384
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+from ann_index import HNSWIndex, IVFFlatIndex, hnswlib_available
+from mmap_vector_store import normalize_rows, top_k_rows
+
+
+def make_corpus(vectors: int, dim: int, clusters: int, queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=vectors)
+    matrix = normalize_rows(centers[labels] + 0.6 * rng.normal(size=(vectors, dim)).astype(np.float32))
+    picks = rng.integers(0, vectors, size=queries)
+    query_vectors = normalize_rows(matrix[picks] + 0.3 * rng.normal(size=(queries, dim)).astype(np.float32))
+    return matrix, query_vectors
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def evaluate(name: str, search, queries: np.ndarray, truth, k: int) -> dict:
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        rows = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(rows[:k].tolist()) & expected)
+    result = {
+        "name": name,
+        f"recall@{k}": round(hits / (k * len(queries)), 4),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+    }
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    args = parser.parse_args()
+
+    matrix, queries = make_corpus(args.vectors, args.dim, args.clusters, args.queries)
+    k = args.k
+
+    exact = lambda query: top_k_rows(matrix @ query, k)
+    truth = [set(exact(query).tolist()) for query in queries]
+    evaluate("exact", exact, queries, truth, k)
+
+    start = time.perf_counter()
+    ivf = IVFFlatIndex.train(matrix)
+    print(json.dumps({"name": "ivf_build", "seconds": round(time.perf_counter() - start, 2), "lists": len(ivf.centroids)}))
+    for nprobe in (1, 4, 16, 64):
+        evaluate(f"ivf_nprobe{nprobe}", lambda q, n=nprobe: ivf.search(matrix, q, k, nprobe=n)[0], queries, truth, k)
+
+    if hnswlib_available():
+        start = time.perf_counter()
+        hnsw = HNSWIndex.train(matrix)
+        print(json.dumps({"name": "hnsw_build", "seconds": round(time.perf_counter() - start, 2)}))
+        for ef in (16, 64, 256):
+            evaluate(f"hnsw_ef{ef}", lambda q, e=ef: hnsw.search(matrix, q, k, ef_search=e)[0], queries, truth, k)
+    else:
+        print(json.dumps({"name": "hnsw", "skipped": "hnswlib is not installed"}))
+
+
+if __name__ == "__main__":
+    main()
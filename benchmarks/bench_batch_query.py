@@ -0,0 +1,77 @@
+"""Question sets answered one query at a time versus as one batch.
+
+Indexes one book, then answers --questions distinct questions about it
+twice against benchmarks/openai_stub.py: once with a query_index call per
+question, as clients of /api/query do, and once with query_batch. The
+answer cache is cleared in between. Reports the wall time, the time to the
+first answer, and the embedding and chat requests each way made to the stub.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_batch_query --questions 50
+"""
+import os
+import json
+import time
+import random
+import argparse
+import urllib.request
+
+from benchmarks.bench_pipeline import CORPUS_DIR, sample_questions
+from benchmarks.bench_retrieval import prepare_environment
+
+
+def stub_counts(base_url: str) -> dict:
+    with urllib.request.urlopen(base_url.rsplit("/v1", 1)[0] + "/_stats") as response:
+        return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", default="Managing Oneself (Harvard Business Review) - Peter F. Drucker (1999).pdf")
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Stub: seconds before each answer")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Stub: seconds per embedding request")
+    parser.add_argument("--concurrency", type=int, default=8, help="BATCH_LLM_CONCURRENCY")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ["BATCH_LLM_CONCURRENCY"] = str(args.concurrency)
+    workdir = prepare_environment("stub", llm_latency=args.llm_latency, embed_latency=args.embed_latency, token_delay=0)
+    base_url = os.environ["OPENAI_API_BASE"]
+
+    import pdf_qa
+
+    persist_dir = os.path.join(workdir, args.pdf)
+    os.makedirs(persist_dir)
+    pdf_qa.create_index(os.path.join(CORPUS_DIR, args.pdf), persist_dir)
+    questions = sample_questions(pdf_qa.get_index(persist_dir), args.questions, random.Random(args.seed))
+
+    def run(name, answer_all):
+        pdf_qa.answer_cache.clear()
+        before = stub_counts(base_url)
+        start = time.perf_counter()
+        first = None
+        for _ in answer_all():
+            first = first or time.perf_counter() - start
+        seconds = time.perf_counter() - start
+        after = stub_counts(base_url)
+        result = {
+            "mode": name,
+            "questions": len(questions),
+            "total_s": round(seconds, 2),
+            "first_answer_s": round(first, 2),
+            "questions_per_s": round(len(questions) / seconds, 1),
+        }
+        for counter in ("embedding_requests", "chat_requests"):
+            result[counter] = after.get(counter, 0) - before.get(counter, 0)
+        print(json.dumps(result), flush=True)
+        return result
+
+    sequential = run("sequential", lambda: (pdf_qa.query_index(question, persist_dir) for question in questions))
+    batch = run("batch", lambda: pdf_qa.query_batch(questions, [persist_dir]))
+    print(json.dumps({"speedup": round(sequential["total_s"] / batch["total_s"], 2)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Prompt size, latency and relevance with and without context packing.
+
+Answers every question of the labelled eval set (see bench_retrieval) twice,
+once sending the retrieved chunks as they are and once through the
+ContextPacker with --budget tokens, and reports per query and overall the
+context tokens sent to the LLM, end-to-end query latency and whether a
+labelled page is still in the context.
+
+With --api stub (the default) the OpenAI API is benchmarks/openai_stub.py,
+whose completion delay grows with the prompt by --prompt-latency seconds per
+1000 tokens as a stand-in for prompt processing time; with --api openai the
+latencies are real.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_context_packing --budget 2000
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+from benchmarks.bench_retrieval import DEFAULT_EVAL, build_indexes, load_cases, prepare_environment
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--eval", default=DEFAULT_EVAL)
+    parser.add_argument("--budget", type=int, default=2000)
+    parser.add_argument("--api", choices=["openai", "stub"], default="stub")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Stub: seconds before the answer")
+    parser.add_argument("--prompt-latency", type=float, default=0.15, help="Stub: extra seconds per 1000 prompt tokens")
+    args = parser.parse_args()
+
+    workdir = prepare_environment(args.api, llm_latency=args.llm_latency, prompt_latency=args.prompt_latency)
+
+    import pdf_qa
+    from context_packing import ContextPacker
+    from llama_index.core.utils import get_tokenizer
+
+    tokenizer = get_tokenizer()
+    cases = load_cases(args.eval)
+    indexes = build_indexes(cases, workdir)
+    packer = ContextPacker(token_budget=args.budget)
+
+    results = {"full": [], "packed": []}
+    for case in cases:
+        index = indexes[case["pdf"]]
+        row = {"query": case["query"]}
+        for name, context_packer in (("full", None), ("packed", packer)):
+            pdf_qa.context_packer = context_packer
+            query_engine = pdf_qa._build_query_engine(index)
+            start = time.perf_counter()
+            response = query_engine.query(case["query"])
+            seconds = time.perf_counter() - start
+            tokens = sum(len(tokenizer(source.node.get_content())) for source in response.source_nodes)
+            relevant = any(source.node.metadata.get("page_label") in case["pages"] for source in response.source_nodes)
+            results[name].append({"tokens": tokens, "seconds": seconds, "relevant": relevant})
+            row[name] = {"context_tokens": tokens, "ms": round(seconds * 1000), "relevant_page": relevant}
+        print(json.dumps(row), flush=True)
+
+    summary = {"budget": args.budget, "api": args.api, "queries": len(cases)}
+    for name, rows in results.items():
+        summary[name] = {
+            "avg_context_tokens": round(float(np.mean([r["tokens"] for r in rows]))),
+            "p50_ms": round(float(np.percentile([r["seconds"] for r in rows], 50)) * 1000),
+            "p95_ms": round(float(np.percentile([r["seconds"] for r in rows], 95)) * 1000),
+            "relevant_page_rate": round(float(np.mean([r["relevant"] for r in rows])), 3),
+        }
+    summary["tokens_saved_ratio"] = round(1 - summary["packed"]["avg_context_tokens"] / summary["full"]["avg_context_tokens"], 3)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compare the JSON SimpleDocumentStore with the compact docstore.
+
+Splits the books in remainder_pdfs/ into chunks with the splitter
+create_index uses, stores them (--copies times, under new ids, to model a
+larger library) in a JSON docstore and converts it with migrate_docstore.
+Each format is then opened in a fresh subprocess, so load time and resident
+memory are not affected by the other one, and asked for --top-k random
+nodes at a time, as a retriever does.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_docstore --copies 10
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from benchmarks.bench_pipeline import CORPUS_DIR
+from benchmarks.bench_retrieval import prepare_environment
+from benchmarks.bench_vector_store import rss_mb
+
+
+def build(directory: str, books: int, copies: int) -> int:
+    """Write a JSON docstore to <directory>/json and its compact copy to <directory>/compact."""
+    prepare_environment("openai")
+    import pdf_qa
+    from llama_index.core import Document
+    from llama_index.core.storage.docstore import SimpleDocumentStore
+    from migrate_docstore import migrate_persist_dir
+    from pdf_ingest import iter_node_batches, iter_pdf_documents
+
+    pdfs = sorted((os.path.join(CORPUS_DIR, name) for name in os.listdir(CORPUS_DIR) if name.endswith(".pdf")), key=os.path.getsize)
+    pdfs = pdfs[:books] if books else pdfs
+    node_parser = pdf_qa.create_node_parser()
+    docstore = SimpleDocumentStore()
+    for pdf in pdfs:
+        pages = list(iter_pdf_documents(pdf, max_workers=pdf_qa.PARSE_WORKERS))
+        for copy in range(copies):
+            file_name = f"{copy}-{os.path.basename(pdf)}"
+            documents = [
+                Document(id_=f"{file_name}#page={number}", text=page.text, metadata={**page.metadata, "file_name": file_name})
+                for number, page in enumerate(pages, start=1)
+            ]
+            for nodes in iter_node_batches(documents, node_parser, 1024):
+                docstore.add_documents(nodes)
+    for backend in ("json", "compact"):
+        os.makedirs(os.path.join(directory, backend))
+        docstore.persist(os.path.join(directory, backend, "docstore.json"))
+    migrate_persist_dir(os.path.join(directory, "compact"))
+    return len(docstore.docs)
+
+
+def measure(backend: str, directory: str, top_k: int, lookups: int) -> dict:
+    from llama_index.core.storage.docstore import SimpleDocumentStore
+    from compact_docstore import CompactDocumentStore
+
+    persist_dir = os.path.join(directory, backend)
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    if backend == "json":
+        docstore = SimpleDocumentStore.from_persist_dir(persist_dir)
+    else:
+        docstore = CompactDocumentStore.from_persist_dir(persist_dir)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    # Node ids from the hashes, which both formats keep in memory
+    node_ids = list(docstore.get_all_document_hashes().values())
+    rng = random.Random(0)
+    latencies = []
+    for _ in range(lookups):
+        wanted = rng.sample(node_ids, top_k)
+        start = time.perf_counter()
+        docstore.get_nodes(wanted)
+        latencies.append(time.perf_counter() - start)
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+
+    return {
+        "backend": backend,
+        "disk_bytes": sum(os.path.getsize(os.path.join(persist_dir, name)) for name in os.listdir(persist_dir)),
+        "load_ms": round(load_seconds * 1000, 1),
+        "rss_mb": round(rss_loaded - rss_before, 1),
+        "get_nodes_p50_ms": round(p50, 3),
+        "get_nodes_p99_ms": round(p99, 3),
+        "rss_after_lookups_mb": round(rss_mb() - rss_before, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=None, help="Only the N smallest books (default: all)")
+    parser.add_argument("--copies", type=int, default=1, help="Times the books are stored, under new ids")
+    parser.add_argument("--top-k", type=int, default=8, help="Nodes fetched per lookup")
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--measure", choices=["json", "compact"], help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.dir, args.top_k, args.lookups)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        nodes = build(directory, args.books, args.copies)
+        print(json.dumps({"nodes": nodes, "copies": args.copies}), flush=True)
+        for backend in ("json", "compact"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_docstore", "--measure", backend, "--dir", directory,
+                 "--top-k", str(args.top_k), "--lookups", str(args.lookups)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            print(output.strip().splitlines()[-1], flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Embedding throughput benchmark against a local fake embedding server.
+
+Compares the previous ingestion path (sequential requests of 10 texts, the
+LlamaIndex default batch size) with EmbeddingPipeline (large batches sent
+concurrently under a rate limit). The fake server mimics the OpenAI
+`/v1/embeddings` endpoint with a fixed per-request latency plus a small
+per-input cost, and can answer a fraction of requests with 429.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_embedding_pipeline --chunks 5000
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from embedding_pipeline import EmbeddingPipeline, RateLimiter
+
+
+class RateLimitedHTTPError(urllib.error.HTTPError):
+    """HTTPError exposing `status_code` like the OpenAI client's errors."""
+
+    @property
+    def status_code(self) -> int:
+        return self.code
+
+
+def make_handler(latency: float, per_input: float, error_rate: float, dim: int):
+    class FakeEmbeddingHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            inputs = body["input"]
+            time.sleep(latency + per_input * len(inputs))
+
+            if random.random() < error_rate:
+                self.send_response(429)
+                self.send_header("Retry-After", "0.05")
+                self.end_headers()
+                return
+
+            data = []
+            for i, text in enumerate(inputs):
+                seed = hashlib.sha256(text.encode()).digest()
+                data.append({"index": i, "embedding": [b / 255.0 for b in seed[:dim]]})
+            payload = json.dumps({"data": data}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return FakeEmbeddingHandler
+
+
+def make_client(url: str):
+    def embed_batch(texts: List[str]) -> List[List[float]]:
+        request = urllib.request.Request(
+            url,
+            data=json.dumps({"input": texts, "model": "fake"}).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                data = json.loads(response.read())["data"]
+        except urllib.error.HTTPError as e:
+            raise RateLimitedHTTPError(e.url, e.code, e.msg, e.hdrs, None) from None
+        return [item["embedding"] for item in sorted(data, key=lambda item: item["index"])]
+
+    return embed_batch
+
+
+def run(name: str, embed, texts: List[str]) -> dict:
+    start = time.perf_counter()
+    embeddings = embed(texts)
+    elapsed = time.perf_counter() - start
+    assert len(embeddings) == len(texts)
+    result = {
+        "name": name,
+        "chunks": len(texts),
+        "seconds": round(elapsed, 3),
+        "chunks_per_sec": round(len(texts) / elapsed, 1),
+    }
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Per-request latency (s)")
+    parser.add_argument("--per-input", type=float, default=0.0002, help="Per-input latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of 429 responses")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rpm", type=float, default=3000)
+    parser.add_argument("--tpm", type=float, default=5_000_000)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0),
+        make_handler(args.latency, args.per_input, args.error_rate, dim=32)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    embed_batch = make_client(f"http://127.0.0.1:{server.server_port}/v1/embeddings")
+
+    # Chunks about the size SentenceSplitter(chunk_size=1024) produces
+    texts = [f"chunk {i} " + "lorem ipsum dolor sit amet " * 150 for i in range(args.chunks)]
+
+    baseline = EmbeddingPipeline(embed_batch, batch_size=10, max_workers=1, backoff_base=0.05)
+    pipeline = EmbeddingPipeline(
+        embed_batch,
+        batch_size=args.batch_size,
+        max_workers=args.workers,
+        limiter=RateLimiter(args.rpm, args.tpm),
+        backoff_base=0.05
+    )
+
+    before = run("sequential_batch10", baseline.embed, texts)
+    after = run(f"pipeline_batch{args.batch_size}_workers{args.workers}", pipeline.embed, texts)
+    print(json.dumps({
+        "speedup": round(after["chunks_per_sec"] / before["chunks_per_sec"], 2),
+        "rate_limited_retries": baseline.rate_limited + pipeline.rate_limited
+    }))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Offline benchmark of the ingest and query pipelines over the sample books.
+
+The OpenAI API is replaced by benchmarks/openai_stub.py, which returns
+deterministic hash-seeded embeddings and a fixed-length answer with no
+delay. The numbers therefore depend only on this code and the machine.
+Runs over the books in remainder_pdfs/ (or the --books smallest of them)
+and measures:
+
+- parse: page extraction throughput
+- chunk: splitting throughput over the parsed pages
+- build: create_index time per book, embedding requests included
+- size: bytes persisted per index, and for the library index
+- load: time to load each index from disk, bypassing the index cache
+- query: end-to-end query_index latency percentiles over unique questions
+  (so the answer cache never hits), and the median time in each stage
+- peak RSS of the benchmark process and of the parser processes
+
+Each phase prints one JSON line. The last line is a flat summary of every
+metric, which --output also writes with the run's metadata. Pass
+--baseline with an earlier --output file to print how every metric moved:
+
+    python -m benchmarks.bench_pipeline --output bench.json
+    python -m benchmarks.bench_pipeline --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+
+import numpy as np
+
+from benchmarks.bench_retrieval import REPO_DIR, prepare_environment
+
+CORPUS_DIR = os.path.join(REPO_DIR, "remainder_pdfs")
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    """Peak resident set size so far, in MB (ru_maxrss is in KB on Linux)."""
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def percentiles(samples, prefix: str) -> dict:
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99]) * 1000
+    return {f"{prefix}_p50_ms": round(p50, 2), f"{prefix}_p95_ms": round(p95, 2), f"{prefix}_p99_ms": round(p99, 2)}
+
+
+def emit(phase: str, **metrics) -> dict:
+    print(json.dumps({"phase": phase, **metrics}), flush=True)
+    return metrics
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def sample_questions(index, count: int, rng: random.Random) -> list:
+    """Questions made of a short run of words from random chunks of the book, numbered to be unique."""
+    texts = [node.get_content() for node in index.docstore.docs.values()]
+    questions = []
+    for i in range(count):
+        words = rng.choice(texts).split()
+        start = rng.randrange(max(1, len(words) - 8))
+        questions.append(f"{i}. What does the book say about {' '.join(words[start:start + 8])}?")
+    return questions
+
+
+def compare(summary: dict, baseline_path: str) -> None:
+    """Print the relative change of every metric present in both runs."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["metrics"]
+    for name, value in summary.items():
+        before = baseline.get(name)
+        if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+            print(json.dumps({"metric": name, "baseline": before, "current": value, "change": round(value / before - 1, 4)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=None, help="Only the N smallest books (default: all)")
+    parser.add_argument("--queries", type=int, default=20, help="Questions per book")
+    parser.add_argument("--load-repeat", type=int, default=3, help="Loads of each index from disk")
+    parser.add_argument("--dim", type=int, default=1536, help="Embedding dimension returned by the stub")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the summary and run metadata to this JSON file")
+    parser.add_argument("--baseline", help="Compare with the --output file of an earlier run")
+    args = parser.parse_args()
+
+    workdir = prepare_environment("stub", dim=args.dim, tokens=20, token_delay=0)
+    # Always start from an empty embedding cache so builds embed every chunk
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.sqlite3")
+
+    import pdf_qa
+    from pdf_ingest import iter_node_batches, iter_pdf_documents
+    from telemetry import current_trace, trace
+
+    pdfs = sorted((os.path.join(CORPUS_DIR, name) for name in os.listdir(CORPUS_DIR) if name.endswith(".pdf")), key=os.path.getsize)
+    pdfs = pdfs[:args.books] if args.books else pdfs
+    summary = {"books": len(pdfs), "pdf_bytes": sum(os.path.getsize(pdf) for pdf in pdfs)}
+
+    # Parse: extract every page of every book
+    pages = {}
+    start = time.perf_counter()
+    for pdf in pdfs:
+        pages[pdf] = list(iter_pdf_documents(pdf, file_name=os.path.basename(pdf), max_workers=pdf_qa.PARSE_WORKERS))
+    seconds = time.perf_counter() - start
+    page_count = sum(len(documents) for documents in pages.values())
+    summary.update(emit(
+        "parse",
+        parse_pages=page_count,
+        parse_s=round(seconds, 2),
+        parse_pages_per_s=round(page_count / seconds, 1),
+        parse_mb_per_s=round(summary["pdf_bytes"] / seconds / 2**20, 2),
+        peak_rss_after_parse_mb=peak_rss_mb(),
+        parser_peak_rss_mb=peak_rss_mb(resource.RUSAGE_CHILDREN),
+    ))
+
+    # Chunk: split the parsed pages with the splitter create_index uses
+    node_parser = pdf_qa.create_node_parser()
+    start = time.perf_counter()
+    chunk_count = sum(len(batch) for documents in pages.values() for batch in iter_node_batches(documents, node_parser, 1024))
+    seconds = time.perf_counter() - start
+    del pages
+    summary.update(emit(
+        "chunk",
+        chunks=chunk_count,
+        chunk_s=round(seconds, 2),
+        chunk_chunks_per_s=round(chunk_count / seconds, 1),
+        chunk_pages_per_s=round(page_count / seconds, 1),
+    ))
+
+    # Build: index each book from its PDF, as an upload does
+    persist_dirs, build_seconds = {}, []
+    for pdf in pdfs:
+        persist_dir = persist_dirs[pdf] = os.path.join(workdir, os.path.basename(pdf))
+        os.makedirs(persist_dir, exist_ok=True)
+        start = time.perf_counter()
+        counts = pdf_qa.create_index(pdf, persist_dir)
+        build_seconds.append(time.perf_counter() - start)
+        emit("build_book", pdf=os.path.basename(pdf), chunks=counts["added"], build_s=round(build_seconds[-1], 2))
+    summary.update(emit(
+        "build",
+        build_s=round(sum(build_seconds), 2),
+        build_chunks_per_s=round(chunk_count / sum(build_seconds), 1),
+        build_book_max_s=round(max(build_seconds), 2),
+        peak_rss_after_build_mb=peak_rss_mb(),
+    ))
+
+    # Size: bytes on disk per index and for the library
+    index_bytes = [dir_size(persist_dir) for persist_dir in persist_dirs.values()]
+    summary.update(emit(
+        "size",
+        index_bytes_total=sum(index_bytes),
+        index_bytes_per_chunk=round(sum(index_bytes) / max(chunk_count, 1), 1),
+        library_bytes=dir_size(pdf_qa.LIBRARY_PERSIST_DIR),
+    ))
+
+    # Load: read each index from disk, without the process-wide cache
+    load_seconds = []
+    for persist_dir in persist_dirs.values():
+        for _ in range(args.load_repeat):
+            start = time.perf_counter()
+            pdf_qa._load_index(persist_dir)
+            load_seconds.append(time.perf_counter() - start)
+    summary.update(emit("load", loads=len(load_seconds), **percentiles(load_seconds, "load")))
+
+    # Query: unique questions against each warm index, with the time of each stage
+    rng = random.Random(args.seed)
+    query_seconds, stage_seconds = [], {}
+    for persist_dir in persist_dirs.values():
+        index = pdf_qa.get_index(persist_dir)
+        for question in sample_questions(index, args.queries, rng):
+            with trace("bench_query"):
+                request = current_trace()
+                start = time.perf_counter()
+                pdf_qa.query_index(question, persist_dir)
+                query_seconds.append(time.perf_counter() - start)
+            for name in {span["name"] for span in request.spans}:
+                total = sum(span["duration_ms"] for span in request.spans if span["name"] == name)
+                stage_seconds.setdefault(name, []).append(total / 1000)
+    stages = {
+        f"stage_{name}_p50_ms": round(float(np.median(samples)) * 1000, 2)
+        for name, samples in sorted(stage_seconds.items()) if name != "query_index"
+    }
+    summary.update(emit(
+        "query",
+        queries=len(query_seconds),
+        **percentiles(query_seconds, "query"),
+        **stages,
+        peak_rss_mb=peak_rss_mb(),
+    ))
+
+    print(json.dumps({"phase": "summary", **summary}), flush=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "metadata": {
+                    "commit": git_commit(),
+                    "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "python": sys.version.split()[0],
+                    "platform": platform.platform(),
+                    "cpu_count": os.cpu_count(),
+                    "args": vars(args),
+                },
+                "metrics": summary,
+            }, f, indent=2)
+    if args.baseline:
+        compare(summary, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Retrieval quality and keyword-search latency: dense vs BM25 vs hybrid.
+
+Indexes the books named in a labelled eval set (benchmarks/retrieval_eval.jsonl
+by default; one JSON object per line with the `pdf` in remainder_pdfs/, the
+`query` and the `pages` that answer it) and reports, for each retriever,
+the share of queries with a relevant chunk in the top k (hit rate), the
+mean reciprocal rank of the first relevant chunk and the share of relevant
+pages retrieved. Also reports BM25 search latency over the same queries.
+
+Quality numbers need the real embedding model (OPENAI_API_KEY). With
+--embeddings stub the OpenAI API is replaced by benchmarks/openai_stub.py,
+whose random vectors make the dense and hybrid numbers meaningless but let
+the benchmark run offline.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_retrieval --top-k 8
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_EVAL = os.path.join(REPO_DIR, "benchmarks", "retrieval_eval.jsonl")
+
+
+def score(rankings, relevant):
+    """Hit, reciprocal rank and page recall of one ranked list of page labels."""
+    first = next((rank for rank, page in enumerate(rankings, start=1) if page in relevant), None)
+    return {
+        "hit": 1.0 if first else 0.0,
+        "mrr": 1.0 / first if first else 0.0,
+        "page_recall": len(relevant & set(rankings)) / len(relevant),
+    }
+
+
+def prepare_environment(embeddings: str, **stub_options) -> str:
+    """Point pdf_qa at a scratch library and embedding cache (and the stub API) before it is imported."""
+    workdir = tempfile.mkdtemp(prefix="bench-retrieval-")
+    # Keep the benchmark's indexes out of the real library and embedding cache
+    os.environ["LIBRARY_PERSIST_DIR"] = os.path.join(workdir, "_library")
+    os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(workdir, "embedding_cache.sqlite3"))
+    if embeddings == "stub":
+        from benchmarks.openai_stub import start_openai_stub
+
+        _, os.environ["OPENAI_API_BASE"] = start_openai_stub(**{"llm_latency": 0, "embed_latency": 0, **stub_options})
+    return workdir
+
+
+def load_cases(path: str):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_indexes(cases, workdir: str):
+    """Index every book named in the eval set; returns the loaded index per PDF."""
+    import pdf_qa
+
+    indexes = {}
+    for pdf in sorted({case["pdf"] for case in cases}):
+        persist_dir = os.path.join(workdir, pdf)
+        os.makedirs(persist_dir, exist_ok=True)
+        start = time.perf_counter()
+        pdf_qa.create_index(os.path.join(REPO_DIR, "remainder_pdfs", pdf), persist_dir)
+        indexes[pdf] = pdf_qa.get_index(persist_dir)
+        print(json.dumps({"pdf": pdf, "chunks": len(indexes[pdf].index_struct.nodes_dict), "index_s": round(time.perf_counter() - start, 1)}), flush=True)
+    return indexes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--eval", default=DEFAULT_EVAL)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--candidates", type=int, default=20, help="Chunks each side contributes to the fusion")
+    parser.add_argument("--embeddings", choices=["openai", "stub"], default="openai")
+    parser.add_argument("--repeat", type=int, default=200, help="Keyword searches per query for the latency numbers")
+    args = parser.parse_args()
+
+    workdir = prepare_environment(args.embeddings)
+
+    import pdf_qa
+    from keyword_index import HybridRetriever
+
+    cases = load_cases(args.eval)
+    indexes = {pdf: (index, pdf_qa._keyword_indexes[index]) for pdf, index in build_indexes(cases, workdir).items()}
+
+    totals = {"dense": [], "bm25": [], "hybrid": []}
+    latencies = []
+    for case in cases:
+        index, keyword_index = indexes[case["pdf"]]
+        relevant = set(case["pages"])
+        page_of = lambda node_id: index.docstore.get_node(node_id).metadata.get("page_label")
+
+        dense = index.as_retriever(similarity_top_k=args.candidates)
+        hybrid = HybridRetriever(dense, keyword_index, index.docstore, similarity_top_k=args.top_k, candidate_k=args.candidates)
+        dense_results = dense.retrieve(case["query"])[:args.top_k]
+        keyword_results = keyword_index.search(case["query"], args.top_k)
+        rankings = {
+            "dense": [result.node.metadata.get("page_label") for result in dense_results],
+            "bm25": [page_of(node_id) for node_id, _ in keyword_results],
+            "hybrid": [result.node.metadata.get("page_label") for result in hybrid.retrieve(case["query"])],
+        }
+        for name, pages in rankings.items():
+            totals[name].append(score(pages, relevant))
+
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            keyword_index.search(case["query"], args.candidates)
+            latencies.append(time.perf_counter() - start)
+
+    for name, scores in totals.items():
+        print(json.dumps({
+            "retriever": name,
+            "queries": len(scores),
+            f"hit@{args.top_k}": round(float(np.mean([s["hit"] for s in scores])), 3),
+            "mrr": round(float(np.mean([s["mrr"] for s in scores])), 3),
+            "page_recall": round(float(np.mean([s["page_recall"] for s in scores])), 3),
+            "embeddings": args.embeddings,
+        }))
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+    print(json.dumps({"bm25_search_us_p50": round(p50, 1), "bm25_search_us_p99": round(p99, 1)}))
+
+
+if __name__ == "__main__":
+    main()
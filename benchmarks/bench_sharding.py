@@ -0,0 +1,131 @@
+"""Measure dense search throughput in process and across shard workers.
+
+Builds a synthetic corpus of --indexes small stores (one per PDF) and one
+--library-vectors store, then runs --clients threads issuing queries for
+--seconds: each query searches either a random per-PDF store or the library
+store (--library-share of the queries), as /api/query does. It runs once in
+process, as the server does with SHARD_WORKERS=0, then once per --workers
+count through a ShardPool, with the library store split into partitions of
+--partition-rows vectors. Exact search is used throughout, so every run
+does the same arithmetic.
+
+Run from the repository root (the scaling needs as many cores as workers):
+
+    python -m benchmarks.bench_sharding --workers 1,2,4,8
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+
+def build(directory: str, indexes: int, vectors: int, library_vectors: int, dim: int) -> list:
+    """Write the stores and return their (persist dir, vector count)."""
+    from mmap_vector_store import MmapVectorStore, normalize_rows
+
+    rng = np.random.default_rng(0)
+    specs = [(os.path.join(directory, f"book-{i}.pdf"), vectors) for i in range(indexes)]
+    if library_vectors:
+        specs.append((os.path.join(directory, "_library"), library_vectors))
+    for persist_dir, rows in specs:
+        matrix = normalize_rows(rng.normal(size=(rows, dim)).astype(np.float32))
+        ids = [f"{os.path.basename(persist_dir)}-{i}" for i in range(rows)]
+        MmapVectorStore(
+            matrix=matrix,
+            ids=ids,
+            ref_doc_ids=[f"doc-{i // 50}" for i in range(rows)],
+            metadata=[{"file_name": f"book-{i % 20}.pdf"} for i in range(rows)]
+        ).persist_to_dir(persist_dir)
+    return specs
+
+
+def run(search, specs: list, clients: int, seconds: float, library_share: float, dim: int) -> dict:
+    """Call search(spec, embedding) from `clients` threads for `seconds`."""
+    library, books = ([specs[-1]], specs[:-1]) if library_share > 0 else ([], specs)
+    latencies = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(seed: int) -> None:
+        rng = random.Random(seed)
+        queries = np.random.default_rng(seed).normal(size=(64, dim)).astype(np.float32)
+        done = []
+        while time.perf_counter() < deadline:
+            spec = library[0] if library and rng.random() < library_share else rng.choice(books)
+            start = time.perf_counter()
+            search(spec, queries[len(done) % len(queries)].tolist())
+            done.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(done)
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {
+        "queries": len(latencies),
+        "qps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(p50, 2),
+        "p99_ms": round(p99, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--indexes", type=int, default=32, help="Per-PDF stores")
+    parser.add_argument("--vectors", type=int, default=2000, help="Vectors per per-PDF store")
+    parser.add_argument("--library-vectors", type=int, default=200000, help="Vectors in the library store (0: none)")
+    parser.add_argument("--library-share", type=float, default=0.25, help="Share of queries that search the library")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--partition-rows", type=int, default=50000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--top-k", type=int, default=8)
+    args = parser.parse_args()
+    if not args.library_vectors:
+        args.library_share = 0.0
+
+    from llama_index.core.vector_stores import VectorStoreQuery
+    from mmap_vector_store import MmapVectorStore
+    from shard_pool import ShardPool
+
+    with tempfile.TemporaryDirectory() as directory:
+        specs = build(directory, args.indexes, args.vectors, args.library_vectors, args.dim)
+        print(json.dumps({
+            "indexes": args.indexes, "vectors": args.vectors, "library_vectors": args.library_vectors,
+            "dim": args.dim, "clients": args.clients, "cpus": os.cpu_count()
+        }), flush=True)
+
+        stores = {persist_dir: MmapVectorStore.from_persist_dir(persist_dir) for persist_dir, _ in specs}
+
+        def in_process(spec, embedding):
+            stores[spec[0]].query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=args.top_k))
+
+        print(json.dumps({"mode": "in_process", **run(in_process, specs, args.clients, args.seconds, args.library_share, args.dim)}), flush=True)
+
+        for workers in (int(n) for n in args.workers.split(",")):
+            pool = ShardPool(workers, partition_rows=args.partition_rows, ann_kwargs={"ann_kind": None})
+            try:
+                pool.load([persist_dir for persist_dir, _ in specs])
+
+                def sharded(spec, embedding):
+                    pool.search([spec], embedding, args.top_k)
+
+                result = run(sharded, specs, args.clients, args.seconds, args.library_share, args.dim)
+                print(json.dumps({"mode": "sharded", "workers": workers, **result, "errors": pool.stats()["errors"]}), flush=True)
+            finally:
+                pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Startup time of the server: import, first query and import-time profile.
+
+Every case runs in a fresh subprocess, with the OpenAI API replaced by
+benchmarks/openai_stub.py and the GitHub backend kept in memory, against
+one small book indexed beforehand:
+
+- import: time to `import server`, and whether that imported the query pipeline
+- eager_import: the same with pdf_qa, llama_index and the GitHub client
+  imported up front, as the server did before they were deferred
+- first_query: time from the start of the import to the first answer
+- warm_query: the same with WARMUP_INDEXES set, querying once the warm-up
+  thread has loaded the index
+- profile: the modules with the largest cumulative `-X importtime`
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup --repeat 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import threading
+
+import numpy as np
+
+from benchmarks.bench_retrieval import REPO_DIR, prepare_environment
+
+BOOK = "Managing Oneself (Harvard Business Review) - Peter F. Drucker (1999).pdf"
+
+
+def run_case(case: str, filename: str) -> dict:
+    """Run one case in this process, which has not imported anything of the server yet."""
+    start = time.perf_counter()
+    if case == "eager_import":
+        import github  # noqa: F401
+        import llama_index.core  # noqa: F401
+        import pdf_qa  # noqa: F401
+    import server
+    imported = time.perf_counter() - start
+    result = {"import_s": round(imported, 3), "pipeline_loaded": server.pdf_qa.loaded}
+    if case in ("first_query", "warm_query"):
+        if case == "warm_query":
+            for thread in threading.enumerate():
+                if thread.name == "warm-up":
+                    thread.join()
+            result["warm_up_s"] = round(time.perf_counter() - start, 3)
+        query_start = time.perf_counter()
+        response = server.app.test_client().post("/api/query", json={"query": "What should I know about myself?", "filename": filename})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        result["query_s"] = round(time.perf_counter() - query_start, 3)
+        result["first_answer_s"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def import_profile(env: dict, cwd: str, top: int) -> list:
+    """Modules with the largest cumulative import time when importing the server."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=cwd, env=env, capture_output=True, text=True, check=True
+    ).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        modules.append({"module": name, "self_ms": round(int(self_us) / 1000, 1), "cumulative_ms": round(int(cumulative_us) / 1000, 1)})
+    return sorted(modules, key=lambda module: module["cumulative_ms"], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh processes per case")
+    parser.add_argument("--top", type=int, default=15, help="Modules listed in the import profile")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--filename", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.filename)))
+        return
+
+    workdir = prepare_environment("stub", dim=256, tokens=20, token_delay=0)
+    # The server keeps its indexes in ./storage, so each case runs from the scratch directory
+    persist_dir = os.path.join(workdir, "storage", BOOK)
+    os.makedirs(persist_dir)
+    subprocess.run(
+        [sys.executable, "-c", f"import pdf_qa; pdf_qa.create_index({os.path.join(REPO_DIR, 'remainder_pdfs', BOOK)!r}, {persist_dir!r})"],
+        cwd=workdir, env={**os.environ, "PYTHONPATH": REPO_DIR}, check=True, capture_output=True
+    )
+    env = {**os.environ, "PYTHONPATH": REPO_DIR, "GITHUB_BACKEND": "memory"}
+
+    for case in ("import", "eager_import", "first_query", "warm_query"):
+        case_env = {**env, "WARMUP_INDEXES": BOOK} if case == "warm_query" else env
+        results = []
+        for _ in range(args.repeat):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_startup", "--case", case, "--filename", BOOK],
+                cwd=workdir, env=case_env, check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+        summary = {"case": case, "runs": len(results), "pipeline_loaded": results[0]["pipeline_loaded"]}
+        for metric in ("import_s", "warm_up_s", "query_s", "first_answer_s"):
+            if metric in results[0]:
+                summary[f"{metric}_p50"] = round(float(np.median([result[metric] for result in results])), 3)
+        print(json.dumps(summary), flush=True)
+
+    print(json.dumps({"case": "profile", "modules": import_profile(env, workdir, args.top)}), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""Throughput, peak memory and connection use of the storage backends.
+
+Runs GitHubStorage and S3Storage against the local stub servers in
+benchmarks/storage_stubs.py, each server in its own process. Every case is
+measured in a fresh subprocess, so peak RSS reflects only that case. The
+"legacy" GitHub cases replay what the previous client did: bare
+`requests` calls with no session, the whole file base64-encoded in memory,
+and the repository re-checked before each upload and listing. The legacy
+S3 listing makes one ListObjectsV2 call and presigns every key.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_storage --size-mb 60
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+
+STUB_ENV = {
+    "AWS_ACCESS_KEY_ID": "stub",
+    "AWS_SECRET_ACCESS_KEY": "stub",
+    "AWS_REGION": "us-east-1",
+    "AWS_BUCKET_NAME": "bench",
+    # The stub does not implement aws-chunked trailing checksums
+    "AWS_REQUEST_CHECKSUM_CALCULATION": "when_required",
+    "AWS_RESPONSE_CHECKSUM_VALIDATION": "when_required",
+}
+
+HEADERS = {"Authorization": "token stub", "Accept": "application/vnd.github.v3+json"}
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def stub_stats(url: str) -> dict:
+    with urllib.request.urlopen(f"{url}/_stats") as response:
+        return json.loads(response.read())
+
+
+def legacy_github_upload(base_url: str, filename: str, path: str) -> None:
+    import requests
+
+    requests.get(base_url, headers=HEADERS)
+    requests.get(f"{base_url}/contents/pdfs", headers=HEADERS)
+    with open(path, "rb") as f:
+        content = f.read()
+    data = {"message": f"Upload {filename}", "content": base64.b64encode(content).decode("utf-8"), "branch": "main"}
+    response = requests.get(f"{base_url}/contents/{filename}", headers=HEADERS)
+    if response.status_code == 200:
+        data["sha"] = response.json()["sha"]
+    requests.put(f"{base_url}/contents/{filename}", headers=HEADERS, json=data).raise_for_status()
+
+
+def legacy_github_download(base_url: str, filename: str, dest: str) -> None:
+    import requests
+
+    content = requests.get(f"{base_url}/contents/{filename}", headers={**HEADERS, "Accept": "application/vnd.github.raw"}).content
+    with open(dest, "wb") as f:
+        f.write(content)
+
+
+def legacy_github_list(base_url: str) -> int:
+    import requests
+
+    requests.get(base_url, headers=HEADERS)
+    requests.get(f"{base_url}/contents/pdfs", headers=HEADERS)
+    return len(requests.get(f"{base_url}/contents/pdfs", headers=HEADERS).json())
+
+
+def legacy_s3_list(storage) -> int:
+    response = storage.s3_client.list_objects_v2(Bucket=storage.bucket_name, Prefix="pdfs/")
+    return len([storage.get_file_url(obj["Key"]) for obj in response.get("Contents", [])])
+
+
+def run_case(case: str, url: str, pdf: str, repeat: int) -> dict:
+    """Run one case in this process and report its time, memory and connections."""
+    from github_storage import GitHubStorage
+    from s3_storage import S3Storage
+
+    backend, _, action = case.partition(":")
+    size = os.path.getsize(pdf)
+    dest = os.path.join(tempfile.mkdtemp(), "download.pdf")
+    github = GitHubStorage("stub", "stub", "repo", api_url=url) if backend == "github" else None
+    s3 = S3Storage(endpoint_url=url) if backend == "s3" else None
+    base_url = f"{url}/repos/stub/repo"
+
+    actions = {
+        "legacy_upload": lambda: legacy_github_upload(base_url, "pdfs/bench.pdf", pdf),
+        "upload": lambda: github.upload_file("pdfs/bench.pdf", pdf),
+        "legacy_download": lambda: legacy_github_download(base_url, "pdfs/bench.pdf", dest),
+        "download": lambda: github.download_file("pdfs/bench.pdf", dest),
+        "legacy_list": lambda: legacy_github_list(base_url),
+        "list": lambda: len(github.list_files("pdfs")),
+    } if github else {
+        "upload": lambda: s3.upload_file("bench.pdf", pdf),
+        "download": lambda: s3.download_file(s3.list_files()[0]["key"], dest),
+        "legacy_list": lambda: legacy_s3_list(s3),
+        "list": lambda: len(s3.list_files()),
+    }
+
+    # Sample RSS while the case runs; ru_maxrss would include import-time peaks
+    samples = [rss_mb()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(0.005):
+            samples.append(rss_mb())
+
+    sampler = threading.Thread(target=sample)
+    before = stub_stats(url)
+    sampler.start()
+    start = time.perf_counter()
+    result = None
+    for _ in range(repeat):
+        result = actions[action]()
+    seconds = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    after = stub_stats(url)
+    rss_before, peak = samples[0], max(samples + [rss_mb()])
+
+    report = {
+        "case": case,
+        "seconds": round(seconds, 3),
+        "peak_rss_mb": round(peak - rss_before, 1),
+        # The stats request itself opens one connection
+        "connections": after["connections"] - before["connections"] - 1,
+        "requests": after["requests"] - before["requests"] - 1,
+    }
+    if action in ("upload", "legacy_upload", "download", "legacy_download"):
+        report["mb_per_s"] = round(size * repeat / seconds / 2 ** 20, 1)
+    else:
+        report["files"] = result
+    return report
+
+
+def seed_s3(url: str, objects: int) -> None:
+    """Fill the stub bucket with small objects so listing crosses page boundaries."""
+    from concurrent.futures import ThreadPoolExecutor
+    from s3_storage import S3Storage
+
+    storage = S3Storage(endpoint_url=url)
+    storage._ensure_bucket_exists()
+    with ThreadPoolExecutor(16) as executor:
+        list(executor.map(
+            lambda i: storage.s3_client.put_object(Bucket=storage.bucket_name, Key=f"pdfs/seed-{i:05d}.pdf", Body=b"%PDF"),
+            range(objects)
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=60)
+    parser.add_argument("--pdf", help="Benchmark with this file instead of a synthetic one")
+    parser.add_argument("--list-repeat", type=int, default=20)
+    parser.add_argument("--s3-objects", type=int, default=2500)
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    parser.add_argument("--repeat", type=int, default=1, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    os.environ.update(STUB_ENV)
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.url, args.pdf, args.repeat)))
+        return
+
+    pdf = args.pdf
+    if pdf is None:
+        pdf = os.path.join(tempfile.mkdtemp(), "bench.pdf")
+        with open(pdf, "wb") as f:
+            f.write(b"%PDF-1.4\n" + os.urandom(args.size_mb * 2 ** 20))
+    print(json.dumps({"pdf_mb": round(os.path.getsize(pdf) / 2 ** 20, 1)}))
+
+    cases = {
+        "github": ["legacy_upload", "upload", "legacy_download", "download", "legacy_list", "list"],
+        "s3": ["upload", "download", "legacy_list", "list"],
+    }
+    for backend, actions in cases.items():
+        stub = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.storage_stubs", backend],
+            stdout=subprocess.PIPE, text=True
+        )
+        try:
+            url = stub.stdout.readline().strip()
+            if backend == "s3":
+                seed_s3(url, args.s3_objects)
+            for action in actions:
+                repeat = args.list_repeat if action.endswith("list") else 1
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_storage", "--case", f"{backend}:{action}",
+                     "--url", url, "--pdf", pdf, "--repeat", str(repeat)],
+                    check=True, capture_output=True, text=True, env={**os.environ, **STUB_ENV}
+                ).stdout
+                print(output.strip().splitlines()[-1])
+        finally:
+            stub.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Compare the JSON SimpleVectorStore with the memory-mapped MmapVectorStore.
+
+Builds a synthetic persist dir in each format, then loads and queries each one
+in a fresh subprocess so load time, resident memory and query latency are not
+affected by the other backend.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_vector_store --vectors 20000 --dim 1536
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process in MB."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def build(directory: str, vectors: int, dim: int) -> None:
+    from migrate_vector_store import migrate_persist_dir
+
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(vectors, dim)).astype(np.float32)
+    ids = [f"node-{i}" for i in range(vectors)]
+    data = {
+        "embedding_dict": {node_id: row.tolist() for node_id, row in zip(ids, matrix)},
+        "text_id_to_ref_doc_id": {node_id: f"doc-{i // 50}" for i, node_id in enumerate(ids)},
+        "metadata_dict": {node_id: {"file_name": f"book-{i % 20}.pdf"} for i, node_id in enumerate(ids)},
+    }
+    for backend in ("json", "mmap"):
+        persist_dir = os.path.join(directory, backend)
+        os.makedirs(persist_dir)
+        with open(os.path.join(persist_dir, "default__vector_store.json"), "w") as f:
+            json.dump(data, f)
+    migrate_persist_dir(os.path.join(directory, "mmap"))
+    np.save(os.path.join(directory, "queries.npy"), rng.normal(size=(200, dim)).astype(np.float32))
+
+
+def measure(backend: str, directory: str, top_k: int) -> dict:
+    from llama_index.core.vector_stores import SimpleVectorStore
+    from llama_index.core.vector_stores.types import VectorStoreQuery
+    from mmap_vector_store import MmapVectorStore
+
+    queries = np.load(os.path.join(directory, "queries.npy"))
+    persist_dir = os.path.join(directory, backend)
+    rss_before = rss_mb()
+
+    start = time.perf_counter()
+    if backend == "json":
+        store = SimpleVectorStore.from_persist_dir(persist_dir, namespace="default")
+    else:
+        store = MmapVectorStore.from_persist_dir(persist_dir)
+    load_seconds = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        store.query(VectorStoreQuery(query_embedding=query.tolist(), similarity_top_k=top_k))
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    return {
+        "backend": backend,
+        "load_ms": round(load_seconds * 1000, 1),
+        "rss_mb": round(rss_mb() - rss_before, 1),
+        "query_p50_ms": round(latencies[len(latencies) // 2], 3),
+        "query_p99_ms": round(latencies[int(len(latencies) * 0.99)], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=10000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--measure", choices=["json", "mmap"], help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.dir, args.top_k)))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        build(directory, args.vectors, args.dim)
+        sizes = {
+            "json_bytes": os.path.getsize(os.path.join(directory, "json", "default__vector_store.json")),
+            "mmap_bytes": sum(
+                os.path.getsize(os.path.join(directory, "mmap", name))
+                for name in os.listdir(os.path.join(directory, "mmap"))
+            ),
+        }
+        print(json.dumps({"vectors": args.vectors, "dim": args.dim, **sizes}))
+        for backend in ("json", "mmap"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_vector_store", "--measure", backend,
+                 "--dir", directory, "--top-k", str(args.top_k)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            print(output.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
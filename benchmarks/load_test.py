@@ -0,0 +1,239 @@
+"""Load test the API under the Flask dev server and under uvicorn.
+
+Starts benchmarks/openai_stub.py as the OpenAI API, indexes one PDF in a
+scratch directory, then for each server mode sends requests from N
+concurrent clients for a fixed time. Each request picks a route from
+--mix by weight: `query` (POST /api/query, served natively under
+uvicorn), `batch` (a two-question POST /api/query/batch), `pdfs`
+(GET /api/pdfs), `stats` (GET /api/stats) and `metrics` (GET /metrics);
+the last four are Flask routes under both servers. Questions are unique,
+so the answer cache never hits. Reports requests per second, latency
+percentiles and status codes overall and per route, and the server's peak
+thread count and RSS, one JSON line per mode and concurrency level:
+
+    python -m benchmarks.load_test --concurrency 16 64 256 --duration 20
+
+Use --stream to request server-sent events instead of JSON answers, and
+--mix query=1 to load /api/query alone.
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from collections import Counter
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PDF = os.path.join(REPO_DIR, "remainder_pdfs", "Managing Oneself (Harvard Business Review) - Peter F. Drucker (1999).pdf")
+PDF_NAME = "bench.pdf"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def proc_status(pid: int) -> dict:
+    status = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                status[name] = value.split()[0] if value.split() else ""
+    except FileNotFoundError:
+        pass
+    return status
+
+
+def wait_for(port: int, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/api/stats")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start")
+
+
+def server_command(mode: str, port: int):
+    if mode == "flask":
+        code = f"import server; server.app.run(host='127.0.0.1', port={port}, threaded=True)"
+        return [sys.executable, "-c", code]
+    return [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning", "--no-access-log"]
+
+
+def route_request(route: str, stream: bool, question: str):
+    """(method, path, body, headers) of one request to a route."""
+    headers = {"Content-Type": "application/json"}
+    if route == "query":
+        if stream:
+            headers["Accept"] = "text/event-stream"
+        return "POST", "/api/query", json.dumps({"query": question, "filename": PDF_NAME}), headers
+    if route == "batch":
+        body = json.dumps({"questions": [question, f"{question} Give an example."], "filename": PDF_NAME})
+        return "POST", "/api/query/batch", body, headers
+    return "GET", ROUTE_PATHS[route], None, {}
+
+
+ROUTE_PATHS = {"pdfs": "/api/pdfs", "stats": "/api/stats", "metrics": "/metrics"}
+ROUTES = ("query", "batch", *ROUTE_PATHS)
+
+
+def parse_mix(mix: str) -> dict:
+    """Parse "query=6,batch=1,..." into route weights."""
+    weights = {}
+    for part in mix.split(","):
+        route, _, weight = part.partition("=")
+        if route not in ROUTES:
+            raise argparse.ArgumentTypeError(f"Unknown route {route!r}; choose from {', '.join(ROUTES)}")
+        weights[route] = float(weight or 1)
+    return weights
+
+
+def client(port: int, stream: bool, mix: dict, deadline: float, worker: int, latencies: dict, statuses: dict, lock) -> None:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    rng = random.Random(worker)
+    routes, weights = list(mix), list(mix.values())
+    i = 0
+    while time.time() < deadline:
+        route = rng.choices(routes, weights)[0]
+        method, path, body, headers = route_request(route, stream, f"What does the author say about topic {worker}-{i}?")
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            if response.getheader("Connection", "").lower() == "close":
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+            status = "error"
+        elapsed = time.perf_counter() - start
+        with lock:
+            statuses[route][status] += 1
+            if status == 200:
+                latencies[route].append(elapsed)
+        if status == 503:
+            # Honour Retry-After loosely so rejected clients do not spin
+            time.sleep(0.05)
+    conn.close()
+
+
+def summarize(latencies: list, statuses: Counter, seconds: float) -> dict:
+    report = {
+        "requests": sum(statuses.values()),
+        "ok": statuses.get(200, 0),
+        "rps": round(statuses.get(200, 0) / seconds, 1),
+        "statuses": {str(k): v for k, v in statuses.items()},
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+        report.update({"p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1),
+                       "max_ms": round(max(latencies) * 1000, 1)})
+    return report
+
+
+def run_load(port: int, pid: int, concurrency: int, duration: float, stream: bool, mix: dict) -> dict:
+    latencies = {route: [] for route in mix}
+    statuses = {route: Counter() for route in mix}
+    lock = threading.Lock()
+    deadline = time.time() + duration
+    threads = [
+        threading.Thread(target=client, args=(port, stream, mix, deadline, worker, latencies, statuses, lock))
+        for worker in range(concurrency)
+    ]
+    peak_threads, peak_rss = 0, 0
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        status = proc_status(pid)
+        peak_threads = max(peak_threads, int(status.get("Threads", 0) or 0))
+        peak_rss = max(peak_rss, int(status.get("VmRSS", 0) or 0))
+        time.sleep(0.1)
+    seconds = time.perf_counter() - start
+
+    report = {
+        "concurrency": concurrency,
+        **summarize(sum(latencies.values(), []), sum(statuses.values(), Counter()), seconds),
+        "server_peak_threads": peak_threads,
+        "server_peak_rss_mb": round(peak_rss / 1024, 1),
+    }
+    if len(mix) > 1:
+        report["routes"] = {route: summarize(latencies[route], statuses[route], seconds) for route in mix}
+    return report
+
+
+def build_index(workdir: str, env: dict, pdf: str) -> None:
+    code = (
+        "import os, pdf_qa; persist_dir = os.path.join('storage', %r); os.makedirs(persist_dir, exist_ok=True); "
+        "print(pdf_qa.create_index(%r, persist_dir))" % (PDF_NAME, pdf)
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=workdir, env=env, check=True, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["flask", "asgi"], choices=["flask", "asgi"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[16, 64, 256])
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--mix", type=parse_mix, default="query=6,batch=1,pdfs=1,stats=1,metrics=1",
+                        help="Route weights, e.g. query=6,batch=1,pdfs=1,stats=1,metrics=1")
+    parser.add_argument("--pdf", default=DEFAULT_PDF)
+    parser.add_argument("--query-concurrency", type=int, default=1024,
+                        help="QUERY_CONCURRENCY for the server; lower it to see 503s")
+    args = parser.parse_args()
+
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.openai_stub", "--llm-latency", str(args.llm_latency)],
+        cwd=REPO_DIR, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        workdir = tempfile.mkdtemp(prefix="load-test-")
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])),
+            "OPENAI_API_BASE": stub.stdout.readline().strip(),
+            "GITHUB_BACKEND": "memory",
+            "QUERY_CONCURRENCY": str(args.query_concurrency),
+        }
+        build_index(workdir, env, args.pdf)
+
+        for mode in args.modes:
+            port = free_port()
+            server = subprocess.Popen(server_command(mode, port), cwd=workdir, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_for(port, server)
+                for concurrency in args.concurrency:
+                    report = run_load(port, server.pid, concurrency, args.duration, args.stream, args.mix)
+                    print(json.dumps({"mode": mode, "stream": args.stream, **report}), flush=True)
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.kill()
+
+
+if __name__ == "__main__":
+    main()
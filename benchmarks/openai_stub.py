@@ -0,0 +1,174 @@
+"""Local stand-in for the OpenAI embeddings and chat completions APIs.
+
+Embeddings are deterministic pseudo-random unit vectors derived from the
+input text. Chat completions answer with a fixed number of tokens after a
+configurable delay, plus an optional delay per 1000 prompt tokens to model
+prompt processing, streamed as server-sent events when asked. Point the
+app at it with OPENAI_API_BASE:
+
+    python -m benchmarks.openai_stub --llm-latency 0.5 --port 8100
+    OPENAI_API_BASE=http://127.0.0.1:8100/v1 uvicorn asgi:app
+"""
+import json
+import time
+import base64
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8", "surrogatepass")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def make_handler(options):
+    class OpenAIStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, data, status=200):
+            payload = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == "/_stats":
+                return self.send_json(self.server.counts)
+            self.send_json({"error": {"message": "Not found"}}, 404)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.endswith("/embeddings"):
+                return self.embeddings(body)
+            if self.path.endswith("/chat/completions"):
+                return self.chat(body)
+            self.send_json({"error": {"message": "Not found"}}, 404)
+
+        def count(self, name, amount=1):
+            with self.server.lock:
+                self.server.counts[name] = self.server.counts.get(name, 0) + amount
+
+        def embeddings(self, body):
+            inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+            self.count("embedding_requests")
+            self.count("embedding_inputs", len(inputs))
+            time.sleep(options.embed_latency)
+            data = []
+            for i, text in enumerate(inputs):
+                vector = fake_embedding(str(text), options.dim)
+                if body.get("encoding_format") == "base64":
+                    embedding = base64.b64encode(vector.tobytes()).decode()
+                else:
+                    embedding = vector.tolist()
+                data.append({"object": "embedding", "index": i, "embedding": embedding})
+            self.send_json({
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "stub"),
+                "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+            })
+
+        def chat(self, body):
+            self.count("chat_requests")
+            prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+            self.count("prompt_chars", prompt_chars)
+            tokens = [f"token{i} " for i in range(options.tokens)]
+            # About four characters per token
+            time.sleep(options.llm_latency + options.prompt_latency * prompt_chars / 4000)
+            created = int(time.time())
+
+            if not body.get("stream"):
+                return self.send_json({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": body.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(tokens)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(tokens), "total_tokens": prompt_chars // 4 + len(tokens)},
+                })
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write_event(data):
+                chunk = f"data: {data}\n\n".encode()
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(options.token_delay)
+                write_event(json.dumps({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body.get("model", "stub"),
+                    "choices": [{"index": 0, "delta": {"role": "assistant", "content": token} if i == 0 else {"content": token}, "finish_reason": None}],
+                }))
+            write_event(json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }))
+            write_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return OpenAIStubHandler
+
+
+def start_openai_stub(port: int = 0, dim: int = 256, llm_latency: float = 0.5, token_delay: float = 0.01,
+                      tokens: int = 20, embed_latency: float = 0.02, prompt_latency: float = 0.0):
+    """
+    Start the stub in a background thread.
+
+    Returns:
+        (server, base URL ending in /v1)
+    """
+    options = argparse.Namespace(dim=dim, llm_latency=llm_latency, token_delay=token_delay, tokens=tokens,
+                                 embed_latency=embed_latency, prompt_latency=prompt_latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(options))
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    server.lock = threading.Lock()
+    server.counts = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--prompt-latency", type=float, default=0.0, help="Extra seconds per 1000 prompt tokens")
+    args = parser.parse_args()
+
+    server, url = start_openai_stub(args.port, args.dim, args.llm_latency, args.token_delay, args.tokens,
+                                    args.embed_latency, args.prompt_latency)
+    print(url, flush=True)
+    threading.Event().wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""Local stand-ins for the GitHub contents API and S3, for offline tests and benchmarks.
+
+Both servers speak HTTP/1.1 with keep-alive, store files in a temporary
+directory and count the connections they accept, so connection pooling
+shows up in the numbers. Only the calls made by GitHubStorage and
+S3Storage are implemented.
+
+    server, url = start_stub("github")   # or "s3"
+    ...
+    server.shutdown()
+
+or, to keep the server out of the client's process (GET /_stats returns
+the connection and request counts):
+
+    python -m benchmarks.storage_stubs github
+"""
+import os
+import json
+import base64
+import hashlib
+import tempfile
+import threading
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+from xml.sax.saxutils import escape
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.root = tempfile.mkdtemp(prefix="storage-stub-")
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha1(key.encode()).hexdigest())
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, keep-alive
+    # requests stall on Nagle's algorithm and the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def parse_request(self):
+        ok = super().parse_request()
+        if ok:
+            with self.server.lock:
+                self.server.requests += 1
+        return ok
+
+    def send_stats(self):
+        stats = {"connections": self.server.connections, "requests": self.server.requests}
+        self.send(200, json.dumps(stats).encode())
+
+    def read_body_to(self, f) -> int:
+        remaining = int(self.headers.get("Content-Length", 0))
+        total = remaining
+        while remaining:
+            chunk = self.rfile.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            f.write(chunk)
+            remaining -= len(chunk)
+        return total
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def send(self, status: int, body: bytes = b"", content_type: str = "application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def send_file(self, path: str, start: int = 0, end=None, status: int = 200, headers=None):
+        size = os.path.getsize(path)
+        end = size - 1 if end is None else min(end, size - 1)
+        self.send_response(status)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Content-Type", "application/octet-stream")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+class GitHubStubHandler(StubHandler):
+    """The repository and contents endpoints of the GitHub REST API."""
+
+    def contents_path(self):
+        parts = urlparse(self.path).path.split("/contents", 1)
+        return unquote(parts[1].lstrip("/")) if len(parts) == 2 else None
+
+    def entry(self, path: str) -> dict:
+        meta = self.server.files[path]
+        return {
+            "type": "file",
+            "name": path.rsplit("/", 1)[-1],
+            "path": path,
+            "sha": meta["sha"],
+            "size": meta["size"],
+            "download_url": f"http://{self.headers['Host']}/raw/{quote(path)}",
+        }
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            return self.send_stats()
+        path = self.contents_path()
+        if path is None:
+            return self.send(200, json.dumps({"full_name": "stub/repo"}).encode())
+        files = self.server.files
+        if path in files:
+            if "raw" in self.headers.get("Accept", ""):
+                return self.send_file(self.server.path_for(path))
+            return self.send(200, json.dumps(self.entry(path)).encode())
+        prefix = f"{path}/" if path else ""
+        listing = [self.entry(name) for name in files if name.startswith(prefix) and "/" not in name[len(prefix):]]
+        if listing or path in ("", "pdfs"):
+            return self.send(200, json.dumps(listing).encode())
+        self.send(404, b'{"message": "Not Found"}')
+
+    def do_PUT(self):
+        path = self.contents_path()
+        body = json.loads(self.read_body())
+        existing = self.server.files.get(path)
+        if existing is not None and body.get("sha") != existing["sha"]:
+            return self.send(409, b'{"message": "sha does not match"}')
+        content = base64.b64decode(body["content"])
+        with open(self.server.path_for(path), "wb") as f:
+            f.write(content)
+        self.server.files[path] = {
+            "sha": hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest(),
+            "size": len(content),
+        }
+        self.send(201 if existing is None else 200, json.dumps({"content": self.entry(path)}).encode())
+
+    def do_DELETE(self):
+        path = self.contents_path()
+        self.read_body()
+        if self.server.files.pop(path, None) is None:
+            return self.send(404, b'{"message": "Not Found"}')
+        os.remove(self.server.path_for(path))
+        self.send(200, b'{"commit": {}}')
+
+
+class S3StubHandler(StubHandler):
+    """Path-style S3: buckets, objects, ranged reads, multipart uploads and ListObjectsV2."""
+
+    def split(self):
+        url = urlparse(self.path)
+        bucket, _, key = url.path.lstrip("/").partition("/")
+        return bucket, unquote(key), {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+
+    def object_headers(self, key: str) -> dict:
+        meta = self.server.files[key]
+        return {"ETag": f'"{meta["etag"]}"', "Last-Modified": formatdate(meta["mtime"], usegmt=True), "Accept-Ranges": "bytes"}
+
+    def store(self, key: str, path: str) -> None:
+        self.server.files[key] = {
+            "size": os.path.getsize(path),
+            "etag": uuid.uuid4().hex,
+            "mtime": os.path.getmtime(path),
+        }
+
+    def do_HEAD(self):
+        bucket, key, _ = self.split()
+        if not key:
+            return self.send(200)
+        if key not in self.server.files:
+            return self.send(404)
+        meta = self.server.files[key]
+        self.send_response(200)
+        self.send_header("Content-Length", str(meta["size"]))
+        for name, value in self.object_headers(key).items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            return self.send_stats()
+        bucket, key, query = self.split()
+        if not key:
+            return self.list_objects(bucket, query)
+        if key not in self.server.files:
+            return self.send(404, b"<Error><Code>NoSuchKey</Code></Error>", "application/xml")
+        path = self.server.path_for(key)
+        byte_range = self.headers.get("Range")
+        if byte_range:
+            start, _, end = byte_range.split("=", 1)[1].partition("-")
+            size = self.server.files[key]["size"]
+            end = int(end) if end else size - 1
+            headers = {**self.object_headers(key), "Content-Range": f"bytes {start}-{min(end, size - 1)}/{size}"}
+            return self.send_file(path, int(start), end, status=206, headers=headers)
+        self.send_file(path, headers=self.object_headers(key))
+
+    def list_objects(self, bucket: str, query: dict):
+        prefix = query.get("prefix", "")
+        max_keys = min(int(query.get("max-keys", 1000)), 1000)
+        keys = sorted(key for key in self.server.files if key.startswith(prefix))
+        after = query.get("continuation-token") or query.get("start-after") or ""
+        keys = [key for key in keys if key > after]
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+        contents = "".join(
+            f"<Contents><Key>{escape(key)}</Key><Size>{self.server.files[key]['size']}</Size>"
+            f"<LastModified>2024-01-01T00:00:00.000Z</LastModified><ETag>\"{self.server.files[key]['etag']}\"</ETag></Contents>"
+            for key in page
+        )
+        token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ""
+        body = (
+            f'<?xml version="1.0" encoding="UTF-8"?><ListBucketResult><Name>{bucket}</Name><Prefix>{escape(prefix)}</Prefix>'
+            f"<KeyCount>{len(page)}</KeyCount><MaxKeys>{max_keys}</MaxKeys><IsTruncated>{str(truncated).lower()}</IsTruncated>"
+            f"{token}{contents}</ListBucketResult>"
+        )
+        self.send(200, body.encode(), "application/xml")
+
+    def do_PUT(self):
+        bucket, key, query = self.split()
+        if not key:
+            self.read_body()
+            return self.send(200)
+        if "uploadId" in query:
+            part_path = f"{self.server.path_for(query['uploadId'])}.{int(query['partNumber']):05d}"
+            with open(part_path, "wb") as f:
+                self.read_body_to(f)
+            return self.send(200, headers={"ETag": f'"{uuid.uuid4().hex}"'})
+        path = self.server.path_for(key)
+        with open(path, "wb") as f:
+            self.read_body_to(f)
+        self.store(key, path)
+        self.send(200, headers={"ETag": f'"{self.server.files[key]["etag"]}"'})
+
+    def do_POST(self):
+        bucket, key, query = self.split()
+        self.read_body()
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            body = (
+                f"<InitiateMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{escape(key)}</Key>"
+                f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            )
+            return self.send(200, body.encode(), "application/xml")
+        # CompleteMultipartUpload: concatenate the parts in order
+        prefix = self.server.path_for(query["uploadId"])
+        parts = sorted(p for p in os.listdir(self.server.root) if p.startswith(os.path.basename(prefix) + "."))
+        path = self.server.path_for(key)
+        with open(path, "wb") as out:
+            for part in parts:
+                part_path = os.path.join(self.server.root, part)
+                with open(part_path, "rb") as f:
+                    while True:
+                        chunk = f.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        out.write(chunk)
+                os.remove(part_path)
+        self.store(key, path)
+        body = (
+            f"<CompleteMultipartUploadResult><Bucket>{bucket}</Bucket><Key>{escape(key)}</Key>"
+            f"<ETag>\"{self.server.files[key]['etag']}\"</ETag></CompleteMultipartUploadResult>"
+        )
+        self.send(200, body.encode(), "application/xml")
+
+    def do_DELETE(self):
+        bucket, key, _ = self.split()
+        if self.server.files.pop(key, None) is not None:
+            os.remove(self.server.path_for(key))
+        self.send(204)
+
+
+def start_stub(kind: str):
+    """
+    Start a stub server in a background thread.
+
+    Args:
+        kind: "github" or "s3"
+
+    Returns:
+        (server, base URL)
+    """
+    handler = GitHubStubHandler if kind == "github" else S3StubHandler
+    server = StubServer(handler)
+    server.files = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import sys
+
+    server, url = start_stub(sys.argv[1] if len(sys.argv) > 1 else "github")
+    print(url, flush=True)
+    threading.Event().wait()
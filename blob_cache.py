@@ -0,0 +1,213 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Callable, Dict, Optional, Tuple
+
+from telemetry import traced
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class _HashingWriter:
+    """Writable file wrapper that hashes and counts what passes through it."""
+
+    def __init__(self, f: BinaryIO):
+        self._f = f
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.digest.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+
+class BlobCache:
+    """Size-capped on-disk LRU cache of files fetched from a storage backend.
+
+    Each blob is a file in `cache_dir`, named by the hash of its key, with a
+    JSON sidecar holding the key, size and ETag (the SHA-256 of the
+    content), so the cache survives restarts. Misses are fetched once even
+    when several requests ask for the same key at the same time. Files are
+    evicted least recently used first once the total exceeds `max_bytes`; a
+    file being served when it is evicted stays readable through its open
+    handle.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 2 * 1024**3):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_fetched = 0
+        self.bytes_served = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.blob"), os.path.join(self.cache_dir, f"{name}.json")
+
+    def _load(self) -> None:
+        """Adopt the blobs left by an earlier process, least recently used first."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.cache_dir, name)) as f:
+                    entry = json.load(f)
+                blob_path, _ = self._paths(entry["key"])
+                entries.append((os.stat(blob_path).st_atime, entry))
+            except (OSError, ValueError, KeyError):
+                continue
+        for _, entry in sorted(entries, key=lambda item: item[0]):
+            self._entries[entry["key"]] = entry
+            self._total_bytes += entry["size"]
+        if entries:
+            logger.info(f"Blob cache holds {len(entries)} files, {self._total_bytes} bytes")
+
+    def get(self, key: str, fetch: Callable[[BinaryIO], Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Return the local path of a blob, fetching it on a miss.
+
+        Args:
+            key: Key of the blob in the storage backend
+            fetch: Called on a miss with a writable binary file to stream the blob into
+
+        Returns:
+            (path of the cached file, entry with "key", "size" and "etag")
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            return self._paths(key)[0], entry
+
+        with self._key_lock(key):
+            # Another request may have fetched it while this one waited
+            entry = self._lookup(key, count=False)
+            if entry is not None:
+                return self._paths(key)[0], entry
+            with self._lock:
+                self.misses += 1
+            entry = self._fetch(key, fetch)
+            return self._paths(key)[0], entry
+
+    def put(self, key: str, source_path: str) -> Dict[str, Any]:
+        """
+        Store a local file under a key (e.g. a PDF that was just uploaded).
+
+        Args:
+            key: Key of the blob in the storage backend
+            source_path: File to copy into the cache
+
+        Returns:
+            The cache entry
+        """
+        def fetch(f: BinaryIO) -> None:
+            with open(source_path, "rb") as source:
+                shutil.copyfileobj(source, f)
+
+        with self._key_lock(key):
+            return self._fetch(key, fetch, count=False)
+
+    def invalidate(self, key: str) -> None:
+        """Drop a blob, e.g. after it changed in the storage backend."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry["size"]
+                self._remove_files(key)
+
+    def served(self, size: int) -> None:
+        """Count bytes sent to a client from the cache."""
+        with self._lock:
+            self.bytes_served += size
+
+    def _lookup(self, key: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not os.path.exists(self._paths(key)[0]):
+                # Removed behind the cache's back
+                del self._entries[key]
+                self._total_bytes -= entry["size"]
+                return None
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    @traced("blob_cache.fetch")
+    def _fetch(self, key: str, fetch: Callable[[BinaryIO], Any], count: bool = True) -> Dict[str, Any]:
+        blob_path, meta_path = self._paths(key)
+        tmp_path = f"{blob_path}.part"
+        try:
+            with open(tmp_path, "wb") as f:
+                writer = _HashingWriter(f)
+                fetch(writer)
+            entry = {"key": key, "size": writer.size, "etag": writer.digest.hexdigest()}
+            os.replace(tmp_path, blob_path)
+            with open(f"{meta_path}.part", "w") as f:
+                json.dump(entry, f)
+            os.replace(f"{meta_path}.part", meta_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old["size"]
+            self._entries[key] = entry
+            self._total_bytes += entry["size"]
+            if count:
+                self.bytes_fetched += entry["size"]
+            self._evict()
+        return entry
+
+    def _evict(self) -> None:
+        # Keep at least the newest entry, even if it alone is over the cap
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry["size"]
+            self._remove_files(key)
+            self.evictions += 1
+
+    def _remove_files(self, key: str) -> None:
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit-ratio statistics, bytes fetched and served, and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "bytes_fetched": self.bytes_fetched,
+                "bytes_served": self.bytes_served,
+            }
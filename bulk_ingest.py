@@ -0,0 +1,319 @@
+"""Index a directory of PDFs in bulk.
+
+    python bulk_ingest.py remainder_pdfs/ --workers 4
+
+Each PDF gets its own index in the storage directory, under the same name
+an upload would give it. Files are indexed by a pool of worker threads,
+which share the embedding rate limits and the embedding cache. Once they
+are done, every PDF indexed is added to the library index in one update.
+
+Progress is checkpointed to a JSON file in the storage directory, per file
+and per embedded batch. Rerunning the same command after an interruption
+resumes it: files already indexed with the same content hash are skipped
+(but still added to the library if the run stopped before that), and the batches a file had finished are served from the embedding cache
+instead of the API. Files with the same content as one already indexed are
+skipped as duplicates.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from werkzeug.utils import secure_filename
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STORAGE_DIR = "storage"
+CHECKPOINT_FILE = "_bulk_ingest.json"
+
+# File states recorded in the checkpoint
+INDEXING = "indexing"
+INDEXED = "indexed"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Content hash of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """Per-file ingestion state, rewritten atomically on every change."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.files: Dict[str, Dict[str, Any]] = json.load(f)
+        except FileNotFoundError:
+            self.files = {}
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self.files.get(filename)
+            return dict(record) if record is not None else None
+
+    def indexed_hashes(self) -> Dict[str, str]:
+        """Content hash -> filename of every file indexed so far."""
+        with self._lock:
+            return {record["sha256"]: filename for filename, record in self.files.items() if record["state"] == INDEXED}
+
+    def library_pending(self) -> List[str]:
+        """Files indexed but not yet added to the library."""
+        with self._lock:
+            return sorted(
+                filename for filename, record in self.files.items()
+                if record["state"] == INDEXED and record.get("library") is False
+            )
+
+    def update(self, filename: str, **fields: Any) -> None:
+        self.update_many([filename], **fields)
+
+    def update_many(self, filenames: List[str], **fields: Any) -> None:
+        with self._lock:
+            updated_at = datetime.now().isoformat()
+            for filename in filenames:
+                self.files.setdefault(filename, {}).update(fields, updated_at=updated_at)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.files, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+class Progress:
+    """Files, bytes and chunks done so far, logged as each file finishes."""
+
+    def __init__(self, total_files: int, total_bytes: int):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.chunks = 0
+        self.embedded = 0
+        self.states: Dict[str, int] = {}
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_chunks(self, count: int) -> None:
+        with self._lock:
+            self.chunks += count
+
+    def file_done(self, filename: str, state: str, size: int, counts: Optional[Dict[str, int]] = None) -> None:
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            self.states[state] = self.states.get(state, 0) + 1
+            if counts:
+                self.embedded += counts["embedded"]
+            elapsed = time.perf_counter() - self.start
+            rate = self.bytes / elapsed if elapsed else 0.0
+            eta = (self.total_bytes - self.bytes) / rate if rate else 0.0
+            logger.info(
+                f"[{self.files}/{self.total_files}] {filename}: {state} | "
+                f"{self.chunks / elapsed:.1f} chunks/s, {rate / 2**20:.2f} MB/s, ETA {eta:.0f}s"
+            )
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.start
+        return {
+            "files": self.files,
+            **self.states,
+            "bytes": self.bytes,
+            "chunks": self.chunks,
+            "embedded": self.embedded,
+            "seconds": round(elapsed, 2),
+            "chunks_per_s": round(self.chunks / elapsed, 1) if elapsed else 0.0,
+            "mb_per_s": round(self.bytes / elapsed / 2**20, 2) if elapsed else 0.0,
+        }
+
+
+def database_remote():
+    """
+    The GitHub copy of the PDF database, configured as the server configures
+    it, or None without GitHub credentials in the environment.
+    """
+    token, username, repo_name = os.getenv('GITHUB_TOKEN'), os.getenv('GITHUB_USERNAME'), os.getenv('GITHUB_REPO')
+    if os.getenv('GITHUB_BACKEND', 'github') != 'github' or not (token and username and repo_name):
+        return None
+    from pdf_database import GitHubDatabaseRemote
+
+    repo = []
+
+    def get_repo():
+        if not repo:
+            from github import Github
+            repo.append(Github(token).get_user(username).get_repo(repo_name))
+        return repo[0]
+
+    return GitHubDatabaseRemote(get_repo, "pdf_database.json")
+
+
+def ingest_directory(
+    source_dir: str,
+    storage_dir: str = STORAGE_DIR,
+    workers: int = 2,
+    checkpoint_path: Optional[str] = None,
+    force: bool = False,
+    register: bool = True
+) -> Dict[str, Any]:
+    """
+    Index every PDF in a directory, resuming from the checkpoint of an earlier run.
+
+    Args:
+        source_dir: Directory holding the PDFs (not searched recursively)
+        storage_dir: Directory the indexes are written to, one per PDF
+        workers: PDFs indexed at once
+        checkpoint_path: Checkpoint file (defaults to _bulk_ingest.json in storage_dir)
+        force: Re-index files even if the checkpoint has them with the same content
+        register: Also add the PDFs to the local PDF database. A running
+            server lists them on its next read of the database. With GitHub
+            credentials in the environment they are pushed to GitHub when
+            the run ends, otherwise with the server's next sync.
+
+    Returns:
+        Counts of files per outcome, bytes, chunks, embedding cache hits and throughput
+    """
+    import pdf_qa
+
+    os.makedirs(storage_dir, exist_ok=True)
+    checkpoint = Checkpoint(checkpoint_path or os.path.join(storage_dir, CHECKPOINT_FILE))
+    pdf_database = None
+    if register:
+        from pdf_database import PdfDatabase
+        pdf_database = PdfDatabase(
+            os.getenv('PDF_DATABASE_PATH', os.path.join(storage_dir, "_pdf_database.sqlite3")),
+            remote=database_remote(),
+            sync_interval=float(os.getenv('PDF_DATABASE_SYNC_INTERVAL', '2'))
+        )
+
+    paths = sorted(
+        os.path.join(source_dir, name) for name in os.listdir(source_dir)
+        if name.lower().endswith(".pdf") and os.path.isfile(os.path.join(source_dir, name))
+    )
+
+    # Decide what each file needs before any worker starts, so that duplicates
+    # are resolved in a stable order
+    todo: List[tuple] = []
+    passed: Dict[str, int] = {}
+    indexed = checkpoint.indexed_hashes()
+    for path in paths:
+        filename = secure_filename(os.path.basename(path))
+        size = os.path.getsize(path)
+        sha256 = file_sha256(path)
+        persist_dir = os.path.join(storage_dir, filename)
+        record = checkpoint.get(filename)
+        if not force and record and record["state"] == INDEXED and record["sha256"] == sha256 \
+                and os.path.exists(os.path.join(persist_dir, "docstore.json")):
+            passed["skipped"] = passed.get("skipped", 0) + 1
+            continue
+        original = indexed.get(sha256)
+        if original is not None and original != filename:
+            checkpoint.update(filename, state=DUPLICATE, sha256=sha256, duplicate_of=original)
+            logger.info(f"{filename}: same content as {original}, skipped")
+            passed[DUPLICATE] = passed.get(DUPLICATE, 0) + 1
+            continue
+        indexed[sha256] = filename
+        if record and record["state"] == INDEXING and record["sha256"] == sha256:
+            logger.info(f"Resuming {filename} after {record.get('batches', 0)} batches")
+        todo.append((path, filename, persist_dir, size, sha256))
+    logger.info(f"{len(todo)} of {len(paths)} PDFs to index, {passed.get('skipped', 0)} already indexed")
+    progress = Progress(len(todo), sum(item[3] for item in todo))
+    cache_hits = pdf_qa.embedding_cache.stats()["hits"]
+
+    def ingest(path: str, filename: str, persist_dir: str, size: int, sha256: str) -> None:
+        batches = {"batches": 0, "chunks": 0}
+
+        def on_batch(chunks: int) -> None:
+            batches["batches"] += 1
+            batches["chunks"] += chunks
+            progress.add_chunks(chunks)
+            checkpoint.update(filename, **batches)
+
+        checkpoint.update(filename, state=INDEXING, sha256=sha256, source=os.path.abspath(path), error=None, library=False, **batches)
+        try:
+            os.makedirs(persist_dir, exist_ok=True)
+            start = time.perf_counter()
+            # The library is updated once for every file, after the workers are done
+            counts = pdf_qa.create_index(path, persist_dir, on_batch=on_batch, update_library=False)
+            if pdf_database is not None:
+                pdf_database.upsert(filename, {
+                    "filename": filename,
+                    "upload_date": datetime.now().isoformat(),
+                    "size": size
+                })
+            checkpoint.update(filename, state=INDEXED, counts=counts, seconds=round(time.perf_counter() - start, 2))
+            progress.file_done(filename, INDEXED, size, counts)
+        except Exception as e:
+            logger.error(f"Error indexing {filename}: {str(e)}")
+            checkpoint.update(filename, state=FAILED, error=str(e))
+            progress.file_done(filename, FAILED, size)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ingest")
+    try:
+        for future in as_completed([executor.submit(ingest, *item) for item in todo]):
+            future.result()
+        library_pending = checkpoint.library_pending()
+        if library_pending:
+            logger.info(f"Adding {len(library_pending)} PDFs to the library")
+            pdf_qa.add_indexes_to_library([os.path.join(storage_dir, filename) for filename in library_pending])
+            checkpoint.update_many(library_pending, library=True)
+            passed["library"] = len(library_pending)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted: finishing the files in progress, rerun the same command to resume")
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        if pdf_database is not None:
+            pdf_database.close()
+
+    # Chunks of resumed batches come back from the embedding cache
+    summary = {**progress.summary(), **passed, "embedding_cache_hits": pdf_qa.embedding_cache.stats()["hits"] - cache_hits}
+    logger.info(f"Bulk ingestion finished: {summary}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source_dir", help="Directory of PDFs to index")
+    parser.add_argument("--storage-dir", default=STORAGE_DIR, help="Where the indexes are written (default: storage)")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("INGEST_WORKERS", "2")), help="PDFs indexed at once")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <storage-dir>/_bulk_ingest.json)")
+    parser.add_argument("--force", action="store_true", help="Re-index files already indexed with the same content")
+    parser.add_argument("--no-register", action="store_true", help="Do not add the PDFs to the PDF database")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.source_dir):
+        parser.error(f"{args.source_dir} is not a directory")
+    try:
+        summary = ingest_directory(
+            args.source_dir,
+            storage_dir=args.storage_dir,
+            workers=args.workers,
+            checkpoint_path=args.checkpoint,
+            force=args.force,
+            register=not args.no_register
+        )
+    except KeyboardInterrupt:
+        sys.exit(130)
+    print(json.dumps(summary))
+    sys.exit(1 if summary.get(FAILED) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from typing import Any, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from embedding_cache import EmbeddingCache
+from embedding_pipeline import estimate_tokens
+from telemetry import TOKENS, span
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that consults an EmbeddingCache before the API.
+
+    Text (chunk) embeddings go through the cache; query embeddings are passed
+    straight to the wrapped model.
+    """
+
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, embed_model: BaseEmbedding, cache: EmbeddingCache, **kwargs: Any) -> None:
+        super().__init__(
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs
+        )
+        self._embed_model = embed_model
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed_model._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return await self._embed_model._aget_query_embedding(query)
+
+    def get_cached_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Cached embeddings of texts, without calling the API.
+
+        Used to take cache hits out of a batch before it is rate limited;
+        the misses are counted when the rest of the batch is embedded.
+
+        Returns:
+            One embedding per text, or None where the text is not cached
+        """
+        return self._cache.get_many(self.model_name, texts, count_misses=False)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self._cache.get_many(self.model_name, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            # Embed each distinct passage once, even if it repeats within the batch
+            missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+            with span("embedding_api", chunks=len(missing_texts)):
+                new_embeddings = self._embed_model._get_text_embeddings(missing_texts)
+            TOKENS.inc(sum(estimate_tokens(text) for text in missing_texts), kind="embedding")
+            self._cache.put_many(self.model_name, missing_texts, new_embeddings)
+            by_text = dict(zip(missing_texts, new_embeddings))
+            for i in missing:
+                embeddings[i] = by_text[texts[i]]
+        return embeddings
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self._cache.get_many(self.model_name, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            # Embed each distinct passage once, even if it repeats within the batch
+            missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+            with span("embedding_api", chunks=len(missing_texts)):
+                new_embeddings = await self._embed_model._aget_text_embeddings(missing_texts)
+            TOKENS.inc(sum(estimate_tokens(text) for text in missing_texts), kind="embedding")
+            self._cache.put_many(self.model_name, missing_texts, new_embeddings)
+            by_text = dict(zip(missing_texts, new_embeddings))
+            for i in missing:
+                embeddings[i] = by_text[texts[i]]
+        return embeddings
@@ -0,0 +1,314 @@
+import os
+import json
+import zlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.docstore.types import DEFAULT_PERSIST_FNAME, DEFAULT_PERSIST_PATH
+from llama_index.core.storage.kvstore.types import DEFAULT_COLLECTION, BaseInMemoryKVStore
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# The sidecar keeps the name of the JSON docstore, so it is written where
+# `StorageContext.persist` puts the docstore and marks the dir as an index
+FORMAT = "compact-docstore/1"
+NODES_PREFIX = "docstore.nodes-"
+NODES_SUFFIX = ".bin"
+
+# Uncompressed bytes per compressed block: adjacent chunks share their
+# overlap, which a block of several chunks compresses away, but every node
+# read decompresses its whole block
+BLOCK_BYTES = 16 * 1024
+# Decompressed blocks kept per store (the top-k of a query often shares blocks)
+BLOCK_CACHE_SIZE = 16
+
+DEFAULT_NAMESPACE = "docstore"
+DATA_SUFFIX = "/data"
+
+# (offset of the compressed block, its length, start of the record in the
+# decompressed block, length of the record)
+Location = Tuple[int, int, int, int]
+
+
+def has_compact_docstore(persist_dir: str) -> bool:
+    """Whether a persist dir holds a compact docstore (rather than a JSON one)."""
+    try:
+        with open(os.path.join(persist_dir, DEFAULT_PERSIST_FNAME), "rb") as f:
+            head = f.read(64)
+    except FileNotFoundError:
+        return False
+    return f'{{"format": "{FORMAT}"'.encode() in head
+
+
+def remove_compact_docstore_files(persist_dir: str, keep: Optional[str] = None) -> None:
+    """Remove node files of a compact docstore from a persist dir, except `keep`."""
+    for name in os.listdir(persist_dir):
+        if name.startswith(NODES_PREFIX) and name != keep:
+            os.remove(os.path.join(persist_dir, name))
+
+
+class CompactKVStore(BaseInMemoryKVStore):
+    """Key-value store that keeps one collection compressed on disk.
+
+    Values of `compact_collection` (node text, metadata and relationships)
+    are appended to a node file as zlib-compressed blocks of consecutive
+    records, and read back one block at a time when asked for, so loading the
+    store only reads an offset per key. Every other collection (document
+    hashes, pages) is small and held in memory.
+
+    `persist` appends the records added since the last persist to the node
+    file, then atomically rewrites the JSON sidecar holding the offsets and
+    the in-memory collections. Deleted records stay in the file until more
+    than half of it is dead, when it is rewritten under a new name; stores
+    that still read the old file keep it open.
+    """
+
+    def __init__(self, compact_collection: str = f"{DEFAULT_NAMESPACE}{DATA_SUFFIX}"):
+        self.compact_collection = compact_collection
+        self._collections: Dict[str, Dict[str, dict]] = {}
+        self._locations: Dict[str, Location] = {}
+        self._pending: Dict[str, bytes] = {}
+        self._nodes_path: Optional[str] = None
+        self._nodes_file = None
+        self._generation = 0
+        self._dead_bytes = 0
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.block_reads = 0
+
+    def put(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        if collection != self.compact_collection:
+            self._collections.setdefault(collection, {})[key] = val.copy()
+            return
+        location = self._locations.pop(key, None)
+        if location is not None:
+            self._dead_bytes += location[3]
+        self._pending[key] = json.dumps(val).encode()
+
+    async def aput(self, key: str, val: dict, collection: str = DEFAULT_COLLECTION) -> None:
+        self.put(key, val, collection)
+
+    def get(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        if collection != self.compact_collection:
+            val = self._collections.get(collection, {}).get(key)
+            return val.copy() if val is not None else None
+        record = self._pending.get(key)
+        if record is None:
+            location = self._locations.get(key)
+            if location is None:
+                return None
+            record = self._read(location)
+        return json.loads(record)
+
+    async def aget(self, key: str, collection: str = DEFAULT_COLLECTION) -> Optional[dict]:
+        return self.get(key, collection)
+
+    def get_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        if collection != self.compact_collection:
+            return {key: val.copy() for key, val in self._collections.get(collection, {}).items()}
+        return {key: json.loads(record) for key, record in self._records()}
+
+    async def aget_all(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, dict]:
+        return self.get_all(collection)
+
+    def delete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        if collection != self.compact_collection:
+            return self._collections.get(collection, {}).pop(key, None) is not None
+        if self._pending.pop(key, None) is not None:
+            return True
+        location = self._locations.pop(key, None)
+        if location is None:
+            return False
+        self._dead_bytes += location[3]
+        return True
+
+    async def adelete(self, key: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        return self.delete(key, collection)
+
+    def _read(self, location: Location) -> bytes:
+        """Raw record at a location, decompressing its block unless it is cached."""
+        offset, length, start, size = location
+        with self._lock:
+            block = self._blocks.get(offset)
+            if block is None:
+                self._nodes_file.seek(offset)
+                block = zlib.decompress(self._nodes_file.read(length))
+                self.block_reads += 1
+                self._blocks[offset] = block
+                if len(self._blocks) > BLOCK_CACHE_SIZE:
+                    self._blocks.popitem(last=False)
+            else:
+                self._blocks.move_to_end(offset)
+        return block[start:start + size]
+
+    def _records(self) -> Iterable[Tuple[str, bytes]]:
+        """Every raw record, persisted ones in file order, then the pending ones."""
+        for key, location in sorted(self._locations.items(), key=lambda item: item[1]):
+            yield key, self._read(location)
+        yield from list(self._pending.items())
+
+    @staticmethod
+    def _write_blocks(f, records: Iterable[Tuple[str, bytes]]) -> Dict[str, Location]:
+        """Append records to a file in compressed blocks, returning where each one went."""
+        locations: Dict[str, Location] = {}
+        block: List[Tuple[str, bytes]] = []
+        block_size = 0
+
+        def flush() -> None:
+            data = zlib.compress(b"".join(record for _, record in block))
+            offset = f.tell()
+            f.write(data)
+            start = 0
+            for key, record in block:
+                locations[key] = (offset, len(data), start, len(record))
+                start += len(record)
+
+        for key, record in records:
+            block.append((key, record))
+            block_size += len(record)
+            if block_size >= BLOCK_BYTES:
+                flush()
+                block, block_size = [], 0
+        if block:
+            flush()
+        return locations
+
+    def _can_append(self, nodes_path: str) -> bool:
+        """Whether the node file this store reads from is the one at `nodes_path`."""
+        if self._nodes_file is None or self._nodes_path != nodes_path or not os.path.exists(nodes_path):
+            return False
+        live_bytes = sum(location[3] for location in self._locations.values())
+        if self._dead_bytes > live_bytes:
+            return False
+        return os.path.samestat(os.fstat(self._nodes_file.fileno()), os.stat(nodes_path))
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """
+        Persist to the dir of `persist_path` (`<dir>/docstore.json`, as
+        `StorageContext.persist` passes it).
+        """
+        persist_dir = os.path.dirname(persist_path)
+        os.makedirs(persist_dir, exist_ok=True)
+        nodes_path = os.path.join(persist_dir, f"{NODES_PREFIX}{self._generation}{NODES_SUFFIX}")
+
+        with self._lock:
+            if self._can_append(nodes_path):
+                with open(nodes_path, "ab") as f:
+                    # Another process may be appending to the same file
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                    f.seek(0, os.SEEK_END)
+                    self._locations.update(self._write_blocks(f, self._pending.items()))
+            else:
+                # First persist, persist to another dir, or too much dead space:
+                # write every live record to a new node file
+                if os.path.exists(persist_path) and has_compact_docstore(persist_dir):
+                    with open(persist_path) as f:
+                        self._generation = max(self._generation, json.load(f)["generation"])
+                self._generation += 1
+                nodes_path = os.path.join(persist_dir, f"{NODES_PREFIX}{self._generation}{NODES_SUFFIX}")
+                with open(nodes_path, "wb") as f:
+                    self._locations = self._write_blocks(f, self._records())
+                if self._nodes_file is not None:
+                    self._nodes_file.close()
+                self._nodes_file = open(nodes_path, "rb")
+                self._nodes_path = nodes_path
+                self._blocks.clear()
+                self._dead_bytes = 0
+            self._pending.clear()
+
+            tmp_path = f"{persist_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({
+                    "format": FORMAT,
+                    "generation": self._generation,
+                    "nodes_file": os.path.basename(nodes_path),
+                    "compact_collection": self.compact_collection,
+                    "dead_bytes": self._dead_bytes,
+                    "locations": self._locations,
+                    "collections": self._collections,
+                }, f)
+            os.replace(tmp_path, persist_path)
+        # Node files of earlier generations are no longer referenced
+        remove_compact_docstore_files(persist_dir, keep=os.path.basename(nodes_path))
+
+    @classmethod
+    def from_persist_path(cls, persist_path: str, fs: Optional[Any] = None) -> "CompactKVStore":
+        """Open a persisted store: reads the sidecar and opens the node file, but no records."""
+        with open(persist_path) as f:
+            data = json.load(f)
+        if data.get("format") != FORMAT:
+            raise ValueError(f"{persist_path} is not a compact docstore")
+        store = cls(compact_collection=data["compact_collection"])
+        store._collections = data["collections"]
+        store._locations = {key: tuple(location) for key, location in data["locations"].items()}
+        store._generation = data["generation"]
+        store._dead_bytes = data["dead_bytes"]
+        store._nodes_path = os.path.join(os.path.dirname(persist_path), data["nodes_file"])
+        store._nodes_file = open(store._nodes_path, "rb")
+        return store
+
+    def close(self) -> None:
+        """Close the node file (records can no longer be read)."""
+        if self._nodes_file is not None:
+            self._nodes_file.close()
+            self._nodes_file = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Record counts, node file size and blocks decompressed so far."""
+        return {
+            "records": len(self._locations) + len(self._pending),
+            "pending": len(self._pending),
+            "record_bytes": sum(location[3] for location in self._locations.values()),
+            "dead_bytes": self._dead_bytes,
+            "file_bytes": os.path.getsize(self._nodes_path) if self._nodes_path else 0,
+            "block_reads": self.block_reads,
+        }
+
+
+class CompactDocumentStore(KVDocumentStore):
+    """Docstore whose nodes are stored compressed and read only when used.
+
+    A drop-in replacement for `SimpleDocumentStore`: retrievers fetch the
+    nodes they return through `get_nodes`, which decompresses just the
+    blocks holding them, so query-time memory grows with the nodes retrieved
+    rather than with the size of the index. `docs` still reads every node.
+    """
+
+    def __init__(self, kvstore: Optional[CompactKVStore] = None, namespace: Optional[str] = None):
+        namespace = namespace or DEFAULT_NAMESPACE
+        kvstore = kvstore or CompactKVStore(compact_collection=f"{namespace}{DATA_SUFFIX}")
+        super().__init__(kvstore, namespace=namespace)
+
+    @classmethod
+    def from_persist_dir(cls, persist_dir: str, namespace: Optional[str] = None) -> "CompactDocumentStore":
+        """Open the compact docstore of a persist dir."""
+        kvstore = CompactKVStore.from_persist_path(os.path.join(persist_dir, DEFAULT_PERSIST_FNAME))
+        return cls(kvstore, namespace=namespace)
+
+    @classmethod
+    def from_dict(cls, save_dict: Dict[str, Dict[str, dict]], namespace: Optional[str] = None) -> "CompactDocumentStore":
+        """Create a store holding the collections of a `SimpleDocumentStore.to_dict()`, not yet persisted."""
+        docstore = cls(namespace=namespace)
+        # Records are stored in insertion order, so neighbouring chunks share compressed blocks
+        for collection, values in save_dict.items():
+            for key, value in values.items():
+                docstore._kvstore.put(key, value, collection=collection)
+        return docstore
+
+    def persist(self, persist_path: str = DEFAULT_PERSIST_PATH, fs: Optional[Any] = None) -> None:
+        """Persist the store (`persist_path` is the docstore.json in the persist dir)."""
+        self._kvstore.persist(persist_path, fs=fs)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._kvstore.stats()
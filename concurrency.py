@@ -0,0 +1,78 @@
+import threading
+import logging
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when an endpoint already has its maximum number of requests in flight."""
+
+
+class ConcurrencyLimit:
+    """Caps the number of in-flight requests to one endpoint.
+
+    Requests over the limit are rejected straight away (the server answers
+    503 with Retry-After) instead of queueing behind slow LLM calls. The
+    same limit works from WSGI threads and from ASGI coroutines: acquiring
+    never blocks, it only checks and updates a counter under a lock.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.admitted = 0
+        self.rejected = 0
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free."""
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            self.admitted += 1
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def release(self) -> None:
+        """Give back a slot taken with `try_acquire`."""
+        with self._lock:
+            self.in_flight -= 1
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot for the duration of a block, or raise ConcurrencyLimitExceeded."""
+        if not self.try_acquire():
+            raise ConcurrencyLimitExceeded(self.name)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Async form of `slot`."""
+        if not self.try_acquire():
+            raise ConcurrencyLimitExceeded(self.name)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the limit and its counters."""
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "peak": self.peak,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
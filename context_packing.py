@@ -0,0 +1,159 @@
+import re
+import math
+import time
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from llama_index.core.utils import get_tokenizer
+from keyword_index import tokenize
+from telemetry import traced
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sentence ends, or blank lines between paragraphs
+SENTENCE_BOUNDARY_RE = re.compile(r"(?<=[.!?])[\"”’)\]]*\s+|\n\s*\n")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences on end punctuation and paragraph breaks."""
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY_RE.split(text) if sentence and sentence.strip()]
+
+
+class ContextPacker(BaseNodePostprocessor):
+    """Shrinks retrieved chunks to the sentences that best answer the query.
+
+    Runs between retrieval and the LLM:
+
+    1. Chunks are split into sentences, and sentences already seen in a
+       higher-ranked chunk of the same page (the 200-token overlap between
+       neighbouring windows) are dropped.
+    2. Each sentence is scored locally: the idf-weighted share of query
+       terms it contains, blended with the retrieval rank of its chunk so
+       that dense-only matches are not starved.
+    3. The best sentences are packed greedily into `token_budget` tokens and
+       put back in document order, one node per source chunk, so citations
+       keep their page and file metadata.
+    """
+
+    token_budget: int = Field(default=2000, description="Most tokens of context sent to the LLM")
+    rank_weight: float = Field(default=0.4, description="Weight of the chunk's retrieval rank in a sentence's score")
+
+    _tokenizer: Optional[Callable[[str], List[Any]]] = PrivateAttr(default=None)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _queries: int = PrivateAttr(default=0)
+    _tokens_in: int = PrivateAttr(default=0)
+    _tokens_out: int = PrivateAttr(default=0)
+    _seconds: float = PrivateAttr(default=0.0)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPacker"
+
+    def _count_tokens(self, text: str) -> int:
+        # The tokenizer takes a few hundred milliseconds to load, so it waits for the first query
+        if self._tokenizer is None:
+            self._tokenizer = get_tokenizer()
+        return len(self._tokenizer(text))
+
+    @traced("context_packing")
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None
+    ) -> List[NodeWithScore]:
+        if not nodes or query_bundle is None:
+            return nodes
+        start = time.perf_counter()
+
+        # Sentences of every chunk, best chunk first, without the overlap between windows
+        candidates = []
+        seen_by_page: Dict[str, List[str]] = {}
+        tokens_in = 0
+        for rank, result in enumerate(nodes):
+            text = result.node.get_content()
+            tokens_in += self._count_tokens(text)
+            seen = seen_by_page.setdefault(result.node.ref_doc_id or result.node.node_id, [])
+            for position, sentence in enumerate(split_sentences(text)):
+                normalized = WHITESPACE_RE.sub(" ", sentence).lower()
+                if any(normalized in other for other in seen):
+                    continue
+                seen.append(normalized)
+                candidates.append({
+                    "rank": rank,
+                    "position": position,
+                    "text": sentence,
+                    "terms": set(tokenize(sentence)),
+                })
+
+        # Score: idf-weighted query term coverage, blended with the chunk's retrieval rank
+        query_terms = set(tokenize(query_bundle.query_str))
+        df: Dict[str, int] = {}
+        for candidate in candidates:
+            for term in candidate["terms"] & query_terms:
+                df[term] = df.get(term, 0) + 1
+        idf = {term: math.log1p(len(candidates) / count) for term, count in df.items()}
+        total_idf = sum(idf.values()) or 1.0
+        for candidate in candidates:
+            lexical = sum(idf.get(term, 0.0) for term in candidate["terms"] & query_terms) / total_idf
+            prior = 1.0 - candidate["rank"] / len(nodes)
+            candidate["score"] = (1 - self.rank_weight) * lexical + self.rank_weight * prior
+
+        # Greedy packing; a sentence too long for what is left is skipped, not truncated
+        remaining = self.token_budget
+        chosen = []
+        for candidate in sorted(candidates, key=lambda c: c["score"], reverse=True):
+            tokens = self._count_tokens(candidate["text"])
+            if tokens <= remaining:
+                chosen.append(candidate)
+                remaining -= tokens
+
+        # One node per source chunk, sentences back in reading order, best chunk first
+        by_rank: Dict[int, List[Dict[str, Any]]] = {}
+        for candidate in chosen:
+            by_rank.setdefault(candidate["rank"], []).append(candidate)
+        packed = []
+        for rank, sentences in sorted(by_rank.items(), key=lambda item: -max(c["score"] for c in item[1])):
+            sentences.sort(key=lambda c: c["position"])
+            source = nodes[rank].node
+            node = TextNode(
+                id_=source.node_id,
+                text=" ".join(c["text"] for c in sentences),
+                metadata=dict(source.metadata),
+                excluded_llm_metadata_keys=source.excluded_llm_metadata_keys,
+                excluded_embed_metadata_keys=source.excluded_embed_metadata_keys,
+                relationships=source.relationships,
+            )
+            packed.append(NodeWithScore(node=node, score=nodes[rank].score))
+
+        tokens_out = self.token_budget - remaining
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self._queries += 1
+            self._tokens_in += tokens_in
+            self._tokens_out += tokens_out
+            self._seconds += seconds
+        logger.info(
+            f"Packed context from {len(nodes)} chunks: {tokens_in} -> {tokens_out} tokens "
+            f"({tokens_in - tokens_out} saved) in {seconds * 1000:.1f} ms"
+        )
+        return packed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the context tokens retrieved and sent to the LLM so far."""
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "queries": self._queries,
+                "tokens_retrieved": self._tokens_in,
+                "tokens_sent": self._tokens_out,
+                "tokens_saved": self._tokens_in - self._tokens_out,
+                "saved_ratio": 1 - self._tokens_out / self._tokens_in if self._tokens_in else 0.0,
+                "avg_packing_ms": self._seconds / self._queries * 1000 if self._queries else 0.0,
+            }
@@ -0,0 +1,221 @@
+import time
+import random
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Signature of a batch embedding call: texts in, one vector per text out
+EmbedBatchFn = Callable[[List[str]], List[List[float]]]
+# Signature of a cache lookup: texts in, a vector or None per text out
+LookupFn = Callable[[List[str]], List[Optional[List[float]]]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1) -> None:
+        """Block until `amount` tokens are available, then take them."""
+        # A request larger than the bucket could never be served; cap it
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._available = min(
+                    self.capacity,
+                    self._available + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._available >= amount:
+                    self._available -= amount
+                    return
+                wait = (amount - self._available) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budgets for an API."""
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        """Block until one request carrying `tokens` tokens may be sent."""
+        with self._lock:
+            pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for a while, e.g. after a 429 response."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether an exception from an embedding client is an HTTP 429."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None:
+        status = getattr(error, "code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EmbeddingPipeline:
+    """Embeds texts in large batches sent concurrently under a rate limit.
+
+    Batches are dispatched to a thread pool. Before each request the pipeline
+    takes a request token and an estimated number of text tokens from the
+    limiter; a 429 pauses all workers (honouring Retry-After when present)
+    and the batch is retried with exponential backoff and jitter.
+
+    With a `lookup` (e.g. an embedding cache), each batch is looked up
+    first and only the texts it does not have are sent and charged to the
+    limiter.
+    """
+
+    def __init__(
+        self,
+        embed_batch: EmbedBatchFn,
+        batch_size: int = 256,
+        max_workers: int = 4,
+        limiter: Optional[RateLimiter] = None,
+        max_retries: int = 6,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        lookup: Optional[LookupFn] = None
+    ):
+        self.embed_batch = embed_batch
+        self.lookup = lookup
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limited = 0
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        """
+        Embed texts, preserving their order.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One embedding per text
+        """
+        batches = [
+            list(texts[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        if len(batches) <= 1 or self.max_workers <= 1:
+            results = [self._embed_with_retry(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed") as executor:
+                # Each batch runs in a copy of the caller's context so its spans join the caller's trace
+                futures = [executor.submit(contextvars.copy_context().run, self._embed_with_retry, batch) for batch in batches]
+                results = [future.result() for future in futures]
+        return [embedding for batch in results for embedding in batch]
+
+    def _embed_with_retry(self, batch: List[str]) -> List[List[float]]:
+        if self.lookup is None:
+            return self._request_with_retry(batch)
+        embeddings = self.lookup(batch)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            for i, embedding in zip(missing, self._request_with_retry([batch[i] for i in missing])):
+                embeddings[i] = embedding
+        return embeddings
+
+    def _request_with_retry(self, batch: List[str]) -> List[List[float]]:
+        tokens = sum(estimate_tokens(text) for text in batch)
+        for attempt in range(self.max_retries + 1):
+            if self.limiter:
+                self.limiter.acquire(tokens)
+            try:
+                return self.embed_batch(batch)
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == self.max_retries:
+                    raise
+                self.rate_limited += 1
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                    delay *= 0.5 + random.random() / 2
+                logger.warning(f"Embedding request rate limited, retrying in {delay:.1f}s")
+                if self.limiter:
+                    self.limiter.pause(delay)
+                time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+
+def embed_nodes(nodes: List[Any], embed_model: Any, pipeline_kwargs: Optional[dict] = None) -> None:
+    """
+    Fill in `node.embedding` for every node that does not have one yet.
+
+    Args:
+        nodes: LlamaIndex nodes to embed
+        embed_model: Embedding model; `get_text_embedding_batch` is called
+            once per batch of `embed_model.embed_batch_size` texts
+        pipeline_kwargs: Extra EmbeddingPipeline arguments (batch size,
+            workers, limiter, retries)
+    """
+    from llama_index.core.schema import MetadataMode
+
+    pending = [node for node in nodes if node.embedding is None]
+    if not pending:
+        return
+
+    # One pipeline batch per API request: batch at the model's own batch size
+    pipeline_kwargs = dict(pipeline_kwargs or {})
+    pipeline_kwargs.setdefault("batch_size", embed_model.embed_batch_size)
+    # Cached chunks cost no request, so they must not use up the rate limits
+    pipeline_kwargs.setdefault("lookup", getattr(embed_model, "get_cached_embeddings", None))
+    pipeline = EmbeddingPipeline(embed_model.get_text_embedding_batch, **pipeline_kwargs)
+
+    start = time.perf_counter()
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in pending]
+    embeddings = pipeline.embed(texts)
+    for node, embedding in zip(pending, embeddings):
+        node.embedding = embedding
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Embedded {len(pending)} chunks in {elapsed:.1f}s "
+        f"({len(pending) / elapsed if elapsed else 0:.0f} chunks/s, "
+        f"{pipeline.rate_limited} rate-limited retries)"
+    )
@@ -0,0 +1,79 @@
+import hashlib
+import threading
+from typing import Dict, List, Tuple, Union
+
+from github import GithubException, UnknownObjectException
+
+
+def git_blob_sha(content: bytes) -> str:
+    """SHA-1 of a blob as git (and the GitHub contents API) computes it."""
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+
+class FakeContentFile:
+    """The parts of PyGithub's ContentFile the app uses."""
+
+    def __init__(self, path: str, content: bytes):
+        self.path = path
+        self.name = path.rsplit("/", 1)[-1]
+        self.decoded_content = content
+        self.size = len(content)
+        self.sha = git_blob_sha(content)
+        self.type = "file"
+        self.download_url = f"memory://{path}"
+
+
+class FakeGithubRepo:
+    """In-memory stand-in for a PyGithub Repository.
+
+    Implements `get_contents`, `create_file`, `update_file` and `delete_file`
+    with GitHub's semantics: missing paths raise UnknownObjectException,
+    creating an existing path fails with 422 and a stale SHA fails with 409.
+    Every successful write is recorded in `commits`, so callers can count
+    round-trips and commits without a network.
+    """
+
+    def __init__(self):
+        self._files: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self.commits: List[Tuple[str, str]] = []
+        self.reads = 0
+
+    @staticmethod
+    def _encode(content: Union[str, bytes]) -> bytes:
+        return content.encode() if isinstance(content, str) else bytes(content)
+
+    def get_contents(self, path: str) -> FakeContentFile:
+        with self._lock:
+            self.reads += 1
+            if path not in self._files:
+                raise UnknownObjectException(404, {"message": "Not Found"}, None)
+            return FakeContentFile(path, self._files[path])
+
+    def create_file(self, path: str, message: str, content: Union[str, bytes], branch: str = "main") -> dict:
+        with self._lock:
+            if path in self._files:
+                raise GithubException(422, {"message": '"sha" wasn\'t supplied.'}, None)
+            self._files[path] = self._encode(content)
+            self.commits.append((path, message))
+            return {"content": FakeContentFile(path, self._files[path])}
+
+    def update_file(self, path: str, message: str, content: Union[str, bytes], sha: str, branch: str = "main") -> dict:
+        with self._lock:
+            if path not in self._files:
+                raise UnknownObjectException(404, {"message": "Not Found"}, None)
+            if git_blob_sha(self._files[path]) != sha:
+                raise GithubException(409, {"message": f"{path} does not match {sha}"}, None)
+            self._files[path] = self._encode(content)
+            self.commits.append((path, message))
+            return {"content": FakeContentFile(path, self._files[path])}
+
+    def delete_file(self, path: str, message: str, sha: str, branch: str = "main") -> dict:
+        with self._lock:
+            if path not in self._files:
+                raise UnknownObjectException(404, {"message": "Not Found"}, None)
+            if git_blob_sha(self._files[path]) != sha:
+                raise GithubException(409, {"message": f"{path} does not match {sha}"}, None)
+            del self._files[path]
+            self.commits.append((path, message))
+            return {"commit": None}
@@ -1,211 +1,300 @@
 import os
+import json
 import base64
 import requests
 import logging
-from datetime import datetime
-import json
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from storage_backend import StorageBackend, STORAGE_IO_WORKERS, open_dest, open_source, source_size
+from telemetry import traced
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class GitHubStorage:
-    def __init__(self, token, username, repo_name):
+# Raw bytes base64-encoded per chunk of a streamed upload (a multiple of 3,
+# so the encoded chunks concatenate into one valid base64 string)
+UPLOAD_CHUNK_SIZE = 3 * 256 * 1024
+
+# Bytes written per chunk of a streamed download
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Repositories already known to exist, shared by every GitHubStorage instance
+_verified_repos = set()
+_verified_repos_lock = threading.Lock()
+
+class GitHubStorage(StorageBackend):
+    def __init__(self, token, username, repo_name, api_url=None, pool_size=STORAGE_IO_WORKERS, create_repo=True):
         self.token = token
         self.username = username
         self.repo_name = repo_name
-        self.base_url = f"https://api.github.com/repos/{username}/{repo_name}"
+        self.api_url = (api_url or os.getenv("GITHUB_API_URL", "https://api.github.com")).rstrip("/")
+        self.base_url = f"{self.api_url}/repos/{username}/{repo_name}"
         self.headers = {
             "Authorization": f"token {token}",
             "Accept": "application/vnd.github.v3+json"
         }
-        
-        # Check if repository exists, create if not
-        self._ensure_repo_exists()
-        
+
+        # One pooled, keep-alive session for every request; idempotent reads are retried
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=["GET", "HEAD"])
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # The repository is checked (and created if needed) on first use, once per process.
+        # With create_repo=False it must already exist, and nothing is created in it.
+        self.create_repo = create_repo
+        self._ready_lock = threading.Lock()
+
     def _ensure_repo_exists(self):
         """Ensure the GitHub repository exists"""
-        try:
-            response = requests.get(self.base_url, headers=self.headers)
-            
-            if response.status_code == 404:
-                # Repository doesn't exist, create it
-                data = {
-                    "name": self.repo_name,
-                    "private": True,
-                    "auto_init": True
-                }
-                
-                response = requests.post(
-                    f"https://api.github.com/user/repos",
-                    headers=self.headers,
-                    json=data
-                )
-                
-                response.raise_for_status()
-            
-            # Create pdfs directory if it doesn't exist
-            self._ensure_directory_exists("pdfs")
-            
-        except Exception as e:
-            logger.error(f"Error ensuring repository exists: {str(e)}")
-            raise
-    
+        if not self.create_repo or self.base_url in _verified_repos:
+            return
+
+        with self._ready_lock:
+            if self.base_url in _verified_repos:
+                return
+            try:
+                response = self.session.get(self.base_url)
+
+                if response.status_code == 404:
+                    # Repository doesn't exist, create it
+                    data = {
+                        "name": self.repo_name,
+                        "private": True,
+                        "auto_init": True
+                    }
+
+                    response = self.session.post(
+                        f"{self.api_url}/user/repos",
+                        json=data
+                    )
+
+                    response.raise_for_status()
+
+                # Create pdfs directory if it doesn't exist
+                self._ensure_directory_exists("pdfs")
+
+                with _verified_repos_lock:
+                    _verified_repos.add(self.base_url)
+
+            except Exception as e:
+                logger.error(f"Error ensuring repository exists: {str(e)}")
+                raise
+
     def _ensure_directory_exists(self, path):
         """Ensure a directory exists in the repository"""
         try:
             # Check if directory exists
-            response = requests.get(
-                f"{self.base_url}/contents/{path}",
-                headers=self.headers
-            )
-            
+            response = self.session.get(f"{self.base_url}/contents/{path}")
+
             if response.status_code == 404:
                 # Directory doesn't exist, create it with a README
                 readme_content = base64.b64encode(
                     f"# {path} Directory\nThis directory contains PDF files.".encode()
                 ).decode()
-                
+
                 create_data = {
                     "message": f"Create {path} directory",
                     "content": readme_content
                 }
-                
-                response = requests.put(
+
+                response = self.session.put(
                     f"{self.base_url}/contents/{path}/README.md",
-                    headers=self.headers,
                     json=create_data
                 )
-                
+
                 if response.status_code in [201, 200]:
                     logger.info(f"Created directory: {path}")
                 else:
                     logger.error(f"Failed to create directory: {response.text}")
-                    
+
         except Exception as e:
             logger.error(f"Error ensuring directory exists: {str(e)}")
             raise
-    
+
+    def _get_sha(self, filename):
+        """Get the blob SHA of a file, or None if it doesn't exist."""
+        # The object media type returns metadata without inlining large file contents
+        response = self.session.get(
+            f"{self.base_url}/contents/{filename}",
+            headers={"Accept": "application/vnd.github.object"}
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()["sha"]
+
+    @staticmethod
+    def _iter_upload_body(f, fields, chunk_size=UPLOAD_CHUNK_SIZE):
+        """Yield a JSON request body whose "content" is the file, base64-encoded chunk by chunk."""
+        yield (json.dumps(fields)[:-1] + ', "content": "').encode()
+        pending = b""
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            pending += chunk
+            usable = len(pending) - len(pending) % 3
+            if usable:
+                yield base64.b64encode(pending[:usable])
+                pending = pending[usable:]
+        yield base64.b64encode(pending) + b'"}'
+
+    @traced("storage.github.upload")
     def upload_file(self, filename, content):
-        """Upload a file to GitHub."""
+        """
+        Upload a file to GitHub.
+
+        The file is base64-encoded while it is sent, so memory use stays at
+        a few chunks regardless of the file size.
+
+        Args:
+            filename: Path of the file in the repository
+            content: File bytes, a path on disk or a readable binary file
+
+        Returns:
+            The GitHub API response
+        """
         try:
             self._ensure_repo_exists()
-            
-            # Encode file content
-            content_b64 = base64.b64encode(content).decode('utf-8')
-            
-            # Prepare the file data
+
+            # Prepare the file data. No branch is given, so the file goes to the
+            # repository's default branch, which every read also uses.
             data = {
-                "message": f"Upload {filename}",
-                "content": content_b64,
-                "branch": "main"
+                "message": f"Upload {filename}"
             }
-            
-            # Check if file exists
-            response = requests.get(
-                f"{self.base_url}/contents/{filename}",
-                headers=self.headers
-            )
-            
-            if response.status_code == 200:
-                # File exists, update it
-                file_data = response.json()
-                data["sha"] = file_data["sha"]
-                response = requests.put(
-                    f"{self.base_url}/contents/{filename}",
-                    headers=self.headers,
-                    json=data
-                )
-            else:
-                # File doesn't exist, create it
-                response = requests.put(
+
+            # Update the file if it already exists
+            sha = self._get_sha(filename)
+            if sha is not None:
+                data["sha"] = sha
+
+            with open_source(content) as f:
+                headers = {"Content-Type": "application/json"}
+                size = source_size(f)
+                if size is not None:
+                    # A known length avoids chunked transfer encoding
+                    prefix_length = len(json.dumps(data)) - 1 + len(', "content": "')
+                    headers["Content-Length"] = str(prefix_length + 4 * ((size + 2) // 3) + len('"}'))
+                response = self.session.put(
                     f"{self.base_url}/contents/{filename}",
-                    headers=self.headers,
-                    json=data
+                    data=self._iter_upload_body(f, data),
+                    headers=headers
                 )
-            
+
             response.raise_for_status()
             return response.json()
-            
+
         except Exception as e:
             logger.error(f"Error uploading file to GitHub: {str(e)}")
             raise
-    
+
+    @traced("storage.github.download")
+    def download_file(self, filename, dest):
+        """
+        Stream a file from GitHub to a path or binary file object.
+
+        Args:
+            filename: Path of the file in the repository
+            dest: Destination path or writable binary file
+
+        Returns:
+            The number of bytes written
+        """
+        try:
+            written = 0
+            with self.session.get(
+                f"{self.base_url}/contents/{filename}",
+                headers={"Accept": "application/vnd.github.raw"},
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                with open_dest(dest) as f:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+            return written
+
+        except Exception as e:
+            logger.error(f"Error downloading file from GitHub: {str(e)}")
+            raise
+
     def get_file_url(self, filename):
         """Get the download URL for a file."""
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/contents/{filename}",
-                headers=self.headers
+                headers={"Accept": "application/vnd.github.object"}
             )
             response.raise_for_status()
-            
+
             return response.json()["download_url"]
-            
+
         except Exception as e:
             logger.error(f"Error getting file URL from GitHub: {str(e)}")
             raise
-    
-    def list_files(self):
-        """List all files in the repository."""
+
+    def iter_files(self, path=""):
+        """Yield every PDF in a directory of the repository (the root by default)."""
         try:
             self._ensure_repo_exists()
-            
-            response = requests.get(
-                f"{self.base_url}/contents",
-                headers=self.headers
-            )
+
+            response = self.session.get(f"{self.base_url}/contents/{path}")
             response.raise_for_status()
-            
-            files = []
+
             for item in response.json():
                 if item["type"] == "file" and item["name"].endswith(".pdf"):
-                    files.append({
+                    # The listing already carries download URLs; no per-file request is needed
+                    yield {
                         "filename": item["name"],
                         "size": item["size"],
                         "url": item["download_url"],
-                        "last_modified": item["updated_at"]
-                    })
-            
-            return files
-            
+                        "last_modified": item.get("updated_at")
+                    }
+
         except Exception as e:
             logger.error(f"Error listing files from GitHub: {str(e)}")
             raise
-    
+
+    @traced("storage.github.list")
+    def list_files(self, path=""):
+        """List all files in the repository."""
+        return list(self.iter_files(path))
+
+    @traced("storage.github.delete")
     def delete_file(self, key):
         """Delete a file from GitHub"""
         try:
             # First get the file's SHA
-            response = requests.get(
-                f"{self.base_url}/contents/{key}",
-                headers=self.headers
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"Failed to get file SHA: {response.text}")
+            sha = self._get_sha(key)
+            if sha is None:
+                logger.error(f"Failed to get file SHA: {key} not found")
                 return False
-            
-            sha = response.json()['sha']
-            
+
             # Delete the file
             data = {
                 "message": f"Delete {key}",
                 "sha": sha
             }
-            
-            response = requests.delete(
+
+            response = self.session.delete(
                 f"{self.base_url}/contents/{key}",
-                headers={"Authorization": f"token {self.github_token}"},
                 json=data
             )
-            
+
             if response.status_code == 200:
                 return True
             else:
                 logger.error(f"Failed to delete file: {response.text}")
                 return False
-                
+
         except Exception as e:
             logger.error(f"Error deleting file from GitHub: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
@@ -0,0 +1,133 @@
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def persist_dir_fingerprint(persist_dir: str) -> Tuple[Tuple[str, int, int], ...]:
+    """
+    Build a cheap fingerprint of the files in a persist directory.
+
+    Args:
+        persist_dir: Directory holding a persisted index
+
+    Returns:
+        A tuple of (name, size, mtime_ns) for every file in the directory
+    """
+    entries = []
+    with os.scandir(persist_dir) as it:
+        for entry in it:
+            if entry.is_file():
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(entries))
+
+
+class IndexCache:
+    """Process-wide LRU cache of loaded indexes keyed by persist directory.
+
+    An entry is reloaded only when the files in its persist directory change
+    (for example after `create_index` rewrites it). The cache is bounded by a
+    number of entries and, optionally, by the on-disk size of the cached
+    indexes, which is used as a proxy for their resident memory.
+    """
+
+    def __init__(self, max_entries: int = 8, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def get(self, persist_dir: str, loader: Callable[[str], Any]) -> Any:
+        """
+        Return the index for a persist directory, loading it if needed.
+
+        Args:
+            persist_dir: Directory where the index is stored
+            loader: Callable that loads the index from the persist directory
+
+        Returns:
+            The loaded index
+        """
+        key = os.path.abspath(persist_dir)
+        fingerprint = persist_dir_fingerprint(key)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["fingerprint"] == fingerprint:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["index"]
+            self.misses += 1
+            if entry is not None:
+                self.reloads += 1
+                self._remove(key)
+
+        # Load outside the lock so a slow load does not block other indexes
+        index = loader(persist_dir)
+        size = sum(size for _, size, _ in fingerprint)
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "index": index,
+                "fingerprint": fingerprint,
+                "size": size,
+            }
+            self._total_bytes += size
+            self._evict()
+
+        return index
+
+    def invalidate(self, persist_dir: str) -> None:
+        """Drop the cached index for a persist directory, if any."""
+        key = os.path.abspath(persist_dir)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        """Drop every cached index."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters and current occupancy."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry["size"]
+
+    def _evict(self) -> None:
+        # Always keep the most recently used entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._total_bytes > self.max_bytes)
+        ):
+            key, _ = next(iter(self._entries.items()))
+            self._remove(key)
+            self.evictions += 1
+            logger.info(f"Evicted index from cache: {key}")
@@ -0,0 +1,176 @@
+import os
+import json
+import uuid
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Job lifecycle states
+QUEUED = "queued"
+PARSING = "parsing"
+EMBEDDING = "embedding"
+PERSISTED = "persisted"
+FAILED = "failed"
+
+TERMINAL_STATES = (PERSISTED, FAILED)
+
+
+class JobStore:
+    """Persistent job records, one JSON file per job in a directory."""
+
+    def __init__(self, jobs_dir: str):
+        self.jobs_dir = jobs_dir
+        self._lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def save(self, job: Dict[str, Any]) -> None:
+        """Atomically write a job record to disk."""
+        job["updated_at"] = datetime.now().isoformat()
+        path = self._path(job["id"])
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            with open(tmp_path, "w") as f:
+                json.dump(job, f, indent=2)
+            os.replace(tmp_path, path)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Load a job record, or None if it does not exist."""
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def all(self) -> List[Dict[str, Any]]:
+        """Load every job record."""
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if name.endswith(".json"):
+                job = self.get(name[:-len(".json")])
+                if job is not None:
+                    jobs.append(job)
+        return jobs
+
+
+class JobQueue:
+    """Worker pool that runs jobs and records their progress in a JobStore.
+
+    The handler receives the job record plus `set_state(state)` and
+    `mark_done(step)` callbacks, both of which persist the record. Steps
+    recorded with `mark_done` are listed in `job["steps_done"]` so a job
+    interrupted by a restart can skip them when it is resumed.
+
+    Jobs submitted with the same `key` (e.g. the file they write) run one
+    at a time, in submission order; jobs with different keys run in
+    parallel.
+    """
+
+    def __init__(
+        self,
+        jobs_dir: str,
+        handler: Callable[[Dict[str, Any], Callable[[str], None], Callable[[str], None]], None],
+        max_workers: int = 2
+    ):
+        self.store = JobStore(jobs_dir)
+        self.handler = handler
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        # Jobs waiting for the running job of their key, by key
+        self._waiting: Dict[str, "deque[Dict[str, Any]]"] = {}
+
+    def submit(self, kind: str, payload: Dict[str, Any], key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Create a job and schedule it on the worker pool.
+
+        Args:
+            kind: Job type, recorded for reporting
+            payload: Handler-specific job parameters
+            key: Jobs with the same key run one at a time, in order
+
+        Returns:
+            The new job record
+        """
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "key": key,
+            "state": QUEUED,
+            "payload": payload,
+            "steps_done": [],
+            "error": None,
+            "created_at": datetime.now().isoformat(),
+        }
+        self.store.save(job)
+        self._schedule(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the current record for a job."""
+        return self.store.get(job_id)
+
+    def resume(self) -> int:
+        """
+        Re-schedule every job that had not finished when the process stopped.
+
+        Returns:
+            The number of resumed jobs
+        """
+        resumed = 0
+        for job in sorted(self.store.all(), key=lambda job: job["created_at"]):
+            if job["state"] not in TERMINAL_STATES:
+                logger.info(f"Resuming job {job['id']} from state {job['state']}")
+                self._schedule(job)
+                resumed += 1
+        return resumed
+
+    def _schedule(self, job: Dict[str, Any]) -> None:
+        key = job.get("key")
+        if key is not None:
+            with self._lock:
+                if key in self._waiting:
+                    # Another job of this key is running; this one starts after it
+                    self._waiting[key].append(job)
+                    return
+                self._waiting[key] = deque()
+        self.executor.submit(self._run_keyed, job)
+
+    def _run_keyed(self, job: Dict[str, Any]) -> None:
+        try:
+            self._run(job)
+        finally:
+            key = job.get("key")
+            if key is not None:
+                with self._lock:
+                    waiting = self._waiting[key]
+                    if waiting:
+                        self.executor.submit(self._run_keyed, waiting.popleft())
+                    else:
+                        del self._waiting[key]
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        def set_state(state: str) -> None:
+            job["state"] = state
+            self.store.save(job)
+
+        def mark_done(step: str) -> None:
+            job["steps_done"].append(step)
+            self.store.save(job)
+
+        try:
+            self.handler(job, set_state, mark_done)
+            set_state(PERSISTED)
+            logger.info(f"Job {job['id']} finished")
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {str(e)}")
+            job["error"] = str(e)
+            set_state(FAILED)
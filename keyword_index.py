@@ -0,0 +1,243 @@
+import os
+import re
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from telemetry import span
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Written next to the other stores in a persist dir, per namespace
+KEYWORD_INDEX_FNAME = "keyword_index.npz"
+DEFAULT_NAMESPACE = "default"
+
+# Words, keeping inner dots, commas and apostrophes so "3.5", "1,000" and "don't" stay whole
+TOKEN_RE = re.compile(r"[^\W_]+(?:[.,'’][^\W_]+)*")
+
+# Longer tokens are extraction debris (URLs, run-together words) rather than search terms
+MAX_TOKEN_LENGTH = 40
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most
+my myself no nor not of off on once only or other our ours ourselves out over own same she should so
+some such than that the their theirs them themselves then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would you your
+yours yourself yourselves
+""".split())
+
+
+def keyword_index_path(persist_dir: str, namespace: str = DEFAULT_NAMESPACE) -> str:
+    return os.path.join(persist_dir, f"{namespace}__{KEYWORD_INDEX_FNAME}")
+
+
+def has_keyword_index(persist_dir: str, namespace: str = DEFAULT_NAMESPACE) -> bool:
+    """Whether a persist dir holds a keyword index."""
+    return os.path.exists(keyword_index_path(persist_dir, namespace))
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms of a text, without stopwords and possessive endings."""
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token.endswith(("'s", "’s")):
+            token = token[:-2]
+        if token not in STOPWORDS and len(token) <= MAX_TOKEN_LENGTH:
+            terms.append(token)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 keyword index stored as flat arrays.
+
+    Postings are kept in CSR form: the postings of term `t` are
+    `doc_ids[offsets[t]:offsets[t + 1]]`, with the full BM25 weight of the
+    term in each document precomputed in `weights`. A query is then a
+    dictionary lookup per term, a few array slices and one `bincount`, with
+    no per-document Python work. The index is rebuilt rather than updated
+    when the chunks change.
+    """
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, doc_ids: np.ndarray, weights: np.ndarray, node_ids: List[str]):
+        self.terms = terms
+        self.offsets = offsets.astype(np.int64, copy=False)
+        self.doc_ids = doc_ids.astype(np.int32, copy=False)
+        self.weights = weights.astype(np.float32, copy=False)
+        self.node_ids = node_ids
+        self._term_ids = {term: i for i, term in enumerate(terms)}
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    @classmethod
+    def build(cls, node_ids: List[str], texts: List[str], k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """
+        Index a set of chunks.
+
+        Args:
+            node_ids: Id of each chunk
+            texts: Text of each chunk
+            k1: Term frequency saturation
+            b: Document length normalisation
+
+        Returns:
+            The index
+        """
+        term_ids: Dict[str, int] = {}
+        posting_terms, posting_docs, posting_tfs = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                posting_terms.append(term_ids.setdefault(term, len(term_ids)))
+                posting_docs.append(doc)
+                posting_tfs.append(tf)
+
+        terms = list(term_ids)
+        posting_terms = np.asarray(posting_terms, dtype=np.int64)
+        # Stable sort keeps each term's postings in document order
+        order = np.argsort(posting_terms, kind="stable")
+        doc_ids = np.asarray(posting_docs, dtype=np.int32)[order]
+        tfs = np.asarray(posting_tfs, dtype=np.float32)[order]
+        df = np.bincount(posting_terms, minlength=len(terms))
+        offsets = np.concatenate([[0], np.cumsum(df)])
+
+        n = max(len(texts), 1)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_length = float(doc_lengths.mean()) if len(texts) and doc_lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * doc_lengths[doc_ids] / avg_length)
+        weights = np.repeat(idf, df) * tfs * (k1 + 1) / (tfs + norm)
+        return cls(terms, offsets, doc_ids, weights, list(node_ids))
+
+    def search(self, query_text: str, top_k: int = 8) -> List[Tuple[str, float]]:
+        """
+        Score the chunks against a query.
+
+        Args:
+            query_text: The query text
+            top_k: Number of results
+
+        Returns:
+            (node id, BM25 score) pairs, best first; only chunks sharing a
+            term with the query
+        """
+        term_ids = {self._term_ids[term] for term in tokenize(query_text) if term in self._term_ids}
+        if not term_ids or not self.node_ids:
+            return []
+        slices = [slice(self.offsets[t], self.offsets[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        scores = np.bincount(docs, weights=weights, minlength=len(self.node_ids))
+        k = min(top_k, np.count_nonzero(scores))
+        if k <= 0:
+            return []
+        rows = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return [(self.node_ids[row], float(scores[row])) for row in rows if scores[row] > 0]
+
+    def save(self, path: str) -> None:
+        """Write the index atomically."""
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            terms=np.asarray(self.terms, dtype=np.str_),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            weights=self.weights,
+            node_ids=np.asarray(self.node_ids, dtype=np.str_)
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as data:
+            return cls(
+                data["terms"].tolist(),
+                data["offsets"],
+                data["doc_ids"],
+                data["weights"],
+                data["node_ids"].tolist()
+            )
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Merge rankings by summing 1 / (k + rank) for every list an id appears in.
+
+    Args:
+        rankings: Lists of ids, best first
+        k: Damping constant; higher values flatten the contribution of top ranks
+
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, start=1):
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses dense vector retrieval with BM25 keyword search.
+
+    Both retrievers return `candidate_k` chunks; the two rankings are merged
+    with reciprocal rank fusion and the best `similarity_top_k` are kept.
+    Chunks found only by keyword search are read from the docstore.
+    """
+
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        keyword_index: BM25Index,
+        docstore: Any,
+        similarity_top_k: int = 8,
+        candidate_k: int = 20,
+        rrf_k: int = 60,
+        **kwargs: Any
+    ):
+        self._vector_retriever = vector_retriever
+        self._keyword_index = keyword_index
+        self._docstore = docstore
+        self._similarity_top_k = similarity_top_k
+        self._candidate_k = candidate_k
+        self._rrf_k = rrf_k
+        super().__init__(**kwargs)
+
+    def _fuse(self, query_bundle: QueryBundle, dense: List[NodeWithScore]) -> List[NodeWithScore]:
+        with span("keyword_search"):
+            keyword_hits = self._keyword_index.search(query_bundle.query_str, self._candidate_k)
+        nodes = {result.node.node_id: result.node for result in dense}
+        fused = reciprocal_rank_fusion(
+            [[result.node.node_id for result in dense], [node_id for node_id, _ in keyword_hits]],
+            self._rrf_k
+        )[:self._similarity_top_k]
+        for node_id, _ in fused:
+            if node_id not in nodes:
+                node = self._docstore.get_document(node_id, raise_error=False)
+                if node is not None:
+                    nodes[node_id] = node
+        return [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in fused if node_id in nodes]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._fuse(query_bundle, self._vector_retriever.retrieve(query_bundle))
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # Keyword search is in-memory array work, so only the dense side is awaited
+        return self._fuse(query_bundle, await self._vector_retriever.aretrieve(query_bundle))
+
+
+def build_keyword_index(docstore: Any, node_ids: List[str]) -> Optional[BM25Index]:
+    """Build a keyword index over the text of the given docstore nodes (None if there are none)."""
+    nodes = [node for node in (docstore.get_document(node_id, raise_error=False) for node_id in node_ids) if node is not None]
+    if not nodes:
+        return None
+    return BM25Index.build([node.node_id for node in nodes], [node.get_content() for node in nodes])
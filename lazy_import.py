@@ -0,0 +1,56 @@
+import sys
+import types
+import importlib
+import logging
+from typing import Any, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access.
+
+    Importing the query pipeline pulls in llama_index and the OpenAI SDK,
+    which takes seconds. Holding it behind a LazyModule lets the server
+    start, and answer requests that do not need it, before paying for that.
+    Concurrent first accesses are safe: the import system serialises them
+    on the module's import lock.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._module: Optional[types.ModuleType] = None
+
+    def _load(self) -> types.ModuleType:
+        if self._module is None:
+            module = importlib.import_module(self.__name__)
+            logger.info(f"Imported {self.__name__} on first use")
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the module has finished importing through this proxy."""
+        return self._module is not None
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Get a proxy that imports a module on first use.
+
+    Args:
+        name: Absolute module name
+
+    Returns:
+        A LazyModule, already loaded if the module was imported before
+    """
+    proxy = LazyModule(name)
+    if name in sys.modules:
+        proxy._load()
+    return proxy
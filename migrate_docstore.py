@@ -0,0 +1,71 @@
+"""Convert JSON docstores of persist dirs to the compact docstore format.
+
+Usage:
+
+    python migrate_docstore.py                 # every index under storage/
+    python migrate_docstore.py storage/a.pdf   # specific persist dirs
+    python migrate_docstore.py --keep-json storage/a.pdf
+"""
+import os
+import sys
+import shutil
+import argparse
+import logging
+
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.docstore.types import DEFAULT_PERSIST_FNAME
+
+from compact_docstore import CompactDocumentStore, has_compact_docstore
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def migrate_persist_dir(persist_dir: str, keep_json: bool = False) -> bool:
+    """
+    Convert the JSON docstore of one persist dir.
+
+    Args:
+        persist_dir: Directory holding a persisted index
+        keep_json: Keep the JSON docstore (copied to `docstore.json.bak`)
+
+    Returns:
+        True if the dir was migrated, False if it had no JSON docstore
+    """
+    json_path = os.path.join(persist_dir, DEFAULT_PERSIST_FNAME)
+    if not os.path.exists(json_path) or has_compact_docstore(persist_dir):
+        return False
+
+    # Every collection is copied as is, so nodes, pages and hashes keep their ids
+    source = SimpleDocumentStore.from_persist_path(json_path)
+    docstore = CompactDocumentStore.from_dict(source.to_dict())
+
+    if keep_json:
+        shutil.copyfile(json_path, f"{json_path}.bak")
+    docstore.persist(json_path)
+
+    logger.info(f"Migrated {docstore.stats()['records']} nodes in {persist_dir}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert JSON docstores to compact docstores")
+    parser.add_argument("persist_dirs", nargs="*", help="Persist dirs (default: every dir under storage/)")
+    parser.add_argument("--storage-dir", default="storage")
+    parser.add_argument("--keep-json", action="store_true", help="Keep the JSON docstore as a .bak file")
+    args = parser.parse_args()
+
+    persist_dirs = args.persist_dirs
+    if not persist_dirs:
+        persist_dirs = [args.storage_dir] + [
+            entry.path for entry in os.scandir(args.storage_dir) if entry.is_dir()
+        ]
+
+    migrated = sum(migrate_persist_dir(persist_dir, args.keep_json) for persist_dir in persist_dirs)
+    print(f"Migrated {migrated} of {len(persist_dirs)} persist dirs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Convert JSON SimpleVectorStore persist dirs to the binary MmapVectorStore format.
+
+Usage:
+
+    python migrate_vector_store.py                 # every index under storage/
+    python migrate_vector_store.py storage/a.pdf   # specific persist dirs
+    python migrate_vector_store.py --keep-json storage/a.pdf
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+
+import numpy as np
+
+from mmap_vector_store import MmapVectorStore, filterable_metadata, normalize_rows
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JSON_FNAME = "default__vector_store.json"
+
+
+def migrate_persist_dir(persist_dir: str, keep_json: bool = False) -> bool:
+    """
+    Convert the default-namespace JSON vector store of one persist dir.
+
+    Args:
+        persist_dir: Directory holding a persisted index
+        keep_json: Keep the JSON file (renamed to `.json.bak`) instead of deleting it
+
+    Returns:
+        True if the dir was migrated, False if it had no JSON vector store
+    """
+    json_path = os.path.join(persist_dir, JSON_FNAME)
+    if not os.path.exists(json_path):
+        return False
+
+    with open(json_path) as f:
+        data = json.load(f)
+
+    embedding_dict = data.get("embedding_dict", {})
+    ids = list(embedding_dict)
+    ref_doc_ids = [data.get("text_id_to_ref_doc_id", {}).get(node_id, "None") for node_id in ids]
+    metadata_dict = data.get("metadata_dict") or {}
+    metadata = [filterable_metadata(metadata_dict.get(node_id, {})) for node_id in ids]
+    if ids:
+        matrix = normalize_rows(np.asarray([embedding_dict[node_id] for node_id in ids], dtype=np.float32))
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+
+    store = MmapVectorStore(matrix=matrix, ids=ids, ref_doc_ids=ref_doc_ids, metadata=metadata)
+    store.persist_to_dir(persist_dir)
+
+    if keep_json:
+        os.replace(json_path, f"{json_path}.bak")
+    else:
+        os.remove(json_path)
+
+    logger.info(f"Migrated {len(ids)} vectors in {persist_dir}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert JSON vector stores to memory-mapped binary stores")
+    parser.add_argument("persist_dirs", nargs="*", help="Persist dirs (default: every dir under storage/)")
+    parser.add_argument("--storage-dir", default="storage")
+    parser.add_argument("--keep-json", action="store_true", help="Keep the JSON store as a .bak file")
+    args = parser.parse_args()
+
+    persist_dirs = args.persist_dirs
+    if not persist_dirs:
+        persist_dirs = [args.storage_dir] + [
+            entry.path for entry in os.scandir(args.storage_dir) if entry.is_dir()
+        ]
+
+    migrated = sum(migrate_persist_dir(persist_dir, args.keep_json) for persist_dir in persist_dirs)
+    print(f"Migrated {migrated} of {len(persist_dirs)} persist dirs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
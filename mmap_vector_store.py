@@ -0,0 +1,533 @@
+import os
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from ann_index import HNSWIndex, IVFFlatIndex, hnswlib_available, train_ann_index
+from telemetry import traced
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Files written next to the other stores in a persist dir, per namespace
+VECTORS_FNAME = "vector_store.npy"
+META_FNAME = "vector_store.meta.json"
+ANN_FNAMES = {"ivf": "vector_store.ivf.npz", "hnsw": "vector_store.hnsw.bin"}
+DEFAULT_NAMESPACE = "default"
+
+
+def _paths(persist_dir: str, namespace: str = DEFAULT_NAMESPACE):
+    return (
+        os.path.join(persist_dir, f"{namespace}__{VECTORS_FNAME}"),
+        os.path.join(persist_dir, f"{namespace}__{META_FNAME}"),
+    )
+
+
+def _ann_path(persist_dir: str, namespace: str, kind: str) -> str:
+    return os.path.join(persist_dir, f"{namespace}__{ANN_FNAMES[kind]}")
+
+
+def has_mmap_vector_store(persist_dir: str, namespace: str = DEFAULT_NAMESPACE) -> bool:
+    """Whether a persist dir holds a binary vector store."""
+    vectors_path, meta_path = _paths(persist_dir, namespace)
+    return os.path.exists(vectors_path) and os.path.exists(meta_path)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """Vector store keeping embeddings in a contiguous float32 matrix.
+
+    Embeddings are L2-normalised on insert and persisted as a `.npy` file that
+    is memory-mapped on load, so opening an index does not parse any vectors.
+    Node ids, ref doc ids and user metadata (used for filtering) are kept in a
+    small JSON sidecar. Top-k search is one matrix-vector product followed by
+    `argpartition`, and returns cosine similarities.
+
+    With `ann_kind` set ("ivf" or "hnsw"), unfiltered queries against stores
+    of at least `ann_min_rows` rows go through an approximate index instead.
+    Inserts and deletes update the index in place. It is (re)trained when
+    there is none yet or it has drifted too far from the data it was trained
+    on: in a background thread when a query needs it, with exact search
+    until it is ready, or inline on persist, so that the saved index is
+    current. Per-query `nprobe` (IVF) or `ef_search` (HNSW) can be passed
+    through `vector_store_kwargs`.
+
+    The store is shared by request threads through the index cache, so
+    mutations and the lazily built state are guarded by a lock; searches
+    take a consistent snapshot under it and score outside it.
+    """
+
+    stores_text: bool = False
+
+    _matrix: np.ndarray = PrivateAttr()
+    _pending: List[np.ndarray] = PrivateAttr()
+    _ids: List[str] = PrivateAttr()
+    _ref_doc_ids: List[str] = PrivateAttr()
+    _metadata: List[Dict[str, Any]] = PrivateAttr()
+    _row_by_id: Dict[str, int] = PrivateAttr()
+    _value_rows: Dict[str, Dict[Any, np.ndarray]] = PrivateAttr()
+    _ann: Any = PrivateAttr()
+    _lock: Any = PrivateAttr()
+    _training: bool = PrivateAttr()
+    # Bumped by every delete, so a background training run can tell its rows went stale
+    _generation: int = PrivateAttr()
+    _ann_kind: Optional[str] = PrivateAttr()
+    _ann_min_rows: int = PrivateAttr()
+    _ann_params: Dict[str, Any] = PrivateAttr()
+
+    def __init__(
+        self,
+        matrix: Optional[np.ndarray] = None,
+        ids: Optional[List[str]] = None,
+        ref_doc_ids: Optional[List[str]] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        ann_kind: Optional[str] = None,
+        ann_min_rows: int = 20000,
+        ann_params: Optional[Dict[str, Any]] = None,
+        **kwargs: Any
+    ) -> None:
+        super().__init__(**kwargs)
+        self._lock = threading.RLock()
+        self._training = False
+        self._generation = 0
+        self._ann = None
+        self._ann_kind = ann_kind
+        self._ann_min_rows = ann_min_rows
+        self._ann_params = ann_params or {}
+        self._matrix = matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        self._pending = []
+        self._ids = ids or []
+        self._ref_doc_ids = ref_doc_ids or []
+        self._metadata = metadata or [{} for _ in self._ids]
+        self._reindex()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @property
+    def node_ids(self) -> List[str]:
+        """Node ids, in row order."""
+        return self._ids
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """The (rows x dim) matrix of normalised embeddings."""
+        with self._lock:
+            self._consolidate()
+            return self._matrix
+
+    def get(self, node_id: str) -> List[float]:
+        """Get the (normalised) embedding of a node."""
+        return self.matrix[self._row_by_id[node_id]].tolist()
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        """Append nodes' embeddings to the matrix."""
+        if not nodes:
+            return []
+        rows = normalize_rows(np.asarray([node.get_embedding() for node in nodes], dtype=np.float32))
+        with self._lock:
+            self._pending.append(rows)
+            if self._ann is not None:
+                self._ann.add(rows)
+            for node in nodes:
+                self._row_by_id[node.node_id] = len(self._ids)
+                self._ids.append(node.node_id)
+                self._ref_doc_ids.append(node.ref_doc_id or "None")
+                self._metadata.append(filterable_metadata(node.metadata))
+            self._value_rows = {}
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        """Delete every row that belongs to a ref doc."""
+        with self._lock:
+            self._delete_rows([i for i, doc_id in enumerate(self._ref_doc_ids) if doc_id == ref_doc_id])
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **delete_kwargs: Any
+    ) -> None:
+        """Delete rows by node id and/or metadata filters."""
+        with self._lock:
+            rows = np.arange(len(self._ids))
+            if node_ids is not None:
+                rows = np.array(
+                    sorted(self._row_by_id[node_id] for node_id in node_ids if node_id in self._row_by_id),
+                    dtype=np.int64
+                )
+            if filters is not None:
+                rows = np.intersect1d(rows, self._filter_rows(filters))
+            self._delete_rows(rows.tolist())
+
+    def clear(self) -> None:
+        """Remove every row."""
+        with self._lock:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+            self._pending = []
+            self._ids, self._ref_doc_ids, self._metadata = [], [], []
+            self._ann = None
+            self._generation += 1
+            self._reindex()
+
+    @traced("vector_search")
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        """
+        Return the top-k rows by cosine similarity to the query embedding.
+
+        `row_range=(start, end)` searches only those rows, exactly (one
+        partition of a store split across shard workers). Other keyword
+        arguments are ANN search parameters (nprobe, ef_search).
+        """
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"Invalid query mode: {query.mode}")
+
+        query_vector = normalize_rows(np.asarray([query.query_embedding], dtype=np.float32))[0]
+        with self._lock:
+            # Deletes replace the matrix and id list rather than editing them,
+            # so these stay consistent with each other after the lock is released
+            matrix, ids = self.matrix, self._ids
+            candidates = self._candidate_rows(query)
+            row_range = kwargs.get("row_range")
+            if row_range is not None:
+                start, end = row_range[0], min(row_range[1], len(ids))
+                if candidates is None:
+                    # A contiguous slice of the matrix is a view, not a copy
+                    return self._query_slice(query_vector, query.similarity_top_k, matrix, ids, start, end)
+                candidates = candidates[(candidates >= start) & (candidates < end)]
+            if len(ids) == 0 or (candidates is not None and len(candidates) == 0):
+                return VectorStoreQueryResult(similarities=[], ids=[])
+
+            ann = self._ensure_ann() if candidates is None else None
+            if ann is not None:
+                search_kwargs = {k: v for k, v in kwargs.items() if k in ("nprobe", "ef_search")}
+                rows, scores = ann.search(matrix, query_vector, query.similarity_top_k, **search_kwargs)
+                return VectorStoreQueryResult(
+                    similarities=scores.tolist(),
+                    ids=[ids[row] for row in rows]
+                )
+
+        if candidates is not None:
+            matrix = matrix[candidates]
+        scores = matrix @ query_vector
+        rows = top_k_rows(scores, query.similarity_top_k)
+        if candidates is not None:
+            rows_global = candidates[rows]
+        else:
+            rows_global = rows
+        return VectorStoreQueryResult(
+            similarities=scores[rows].tolist(),
+            ids=[ids[row] for row in rows_global]
+        )
+
+    def _query_slice(
+        self,
+        query_vector: np.ndarray,
+        similarity_top_k: int,
+        matrix: np.ndarray,
+        ids: List[str],
+        start: int,
+        end: int
+    ) -> VectorStoreQueryResult:
+        if end <= start:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+        scores = matrix[start:end] @ query_vector
+        rows = top_k_rows(scores, similarity_top_k)
+        return VectorStoreQueryResult(
+            similarities=scores[rows].tolist(),
+            ids=[ids[start + row] for row in rows]
+        )
+
+    @traced("vector_search")
+    def query_many(self, query_embeddings: List[List[float]], similarity_top_k: int, **kwargs: Any) -> List[VectorStoreQueryResult]:
+        """
+        Top-k rows for many query embeddings at once.
+
+        Exact search scores every query with one matrix product instead of
+        a matrix-vector product per query. Stores large enough for an ANN
+        index search it once per query.
+
+        Args:
+            query_embeddings: One embedding per query
+            similarity_top_k: Rows returned per query
+            **kwargs: ANN search parameters (nprobe, ef_search)
+
+        Returns:
+            One result per query, in the order given
+        """
+        if len(self._ids) == 0 or not query_embeddings:
+            return [VectorStoreQueryResult(similarities=[], ids=[]) for _ in query_embeddings]
+
+        query_matrix = normalize_rows(np.asarray(query_embeddings, dtype=np.float32))
+        with self._lock:
+            matrix, ids = self.matrix, self._ids
+            ann = self._ensure_ann()
+            if ann is not None:
+                search_kwargs = {k: v for k, v in kwargs.items() if k in ("nprobe", "ef_search")}
+                results = []
+                for query_vector in query_matrix:
+                    rows, scores = ann.search(matrix, query_vector, similarity_top_k, **search_kwargs)
+                    results.append(VectorStoreQueryResult(similarities=scores.tolist(), ids=[ids[row] for row in rows]))
+                return results
+
+        results = []
+        for query_scores in query_matrix @ matrix.T:
+            rows = top_k_rows(query_scores, similarity_top_k)
+            results.append(VectorStoreQueryResult(
+                similarities=query_scores[rows].tolist(),
+                ids=[ids[row] for row in rows]
+            ))
+        return results
+
+    def persist(self, persist_path: str, fs: Optional[Any] = None) -> None:
+        """
+        Persist to the persist dir of `persist_path`.
+
+        `StorageContext.persist` passes `<dir>/<namespace>__vector_store.json`;
+        the matrix and sidecar are written next to it under the same namespace.
+        """
+        persist_dir = os.path.dirname(persist_path)
+        namespace = os.path.basename(persist_path).split("__")[0] or DEFAULT_NAMESPACE
+        self.persist_to_dir(persist_dir, namespace)
+
+    def persist_to_dir(self, persist_dir: str, namespace: str = DEFAULT_NAMESPACE) -> None:
+        """Write the matrix and its sidecar atomically to a persist dir."""
+        os.makedirs(persist_dir, exist_ok=True)
+        vectors_path, meta_path = _paths(persist_dir, namespace)
+
+        with self._lock:
+            tmp_vectors = f"{vectors_path}.tmp"
+            with open(tmp_vectors, "wb") as f:
+                np.save(f, np.ascontiguousarray(self.matrix, dtype=np.float32))
+            tmp_meta = f"{meta_path}.tmp"
+            with open(tmp_meta, "w") as f:
+                json.dump({
+                    "ids": self._ids,
+                    "ref_doc_ids": self._ref_doc_ids,
+                    "metadata": self._metadata,
+                }, f)
+            os.replace(tmp_vectors, vectors_path)
+            os.replace(tmp_meta, meta_path)
+
+            # Save the ANN index alongside, and drop any index of another kind
+            ann = self._ann_for_persist()
+            for kind in ANN_FNAMES:
+                path = _ann_path(persist_dir, namespace, kind)
+                if ann is not None and ann.kind == kind:
+                    ann.save(path)
+                else:
+                    for stale_path in (path, f"{path}.rows.npy"):
+                        if os.path.exists(stale_path):
+                            os.remove(stale_path)
+
+    @classmethod
+    def from_persist_dir(
+        cls,
+        persist_dir: str,
+        namespace: str = DEFAULT_NAMESPACE,
+        **ann_kwargs: Any
+    ) -> "MmapVectorStore":
+        """Memory-map a persisted store (and load its ANN index, if saved)."""
+        vectors_path, meta_path = _paths(persist_dir, namespace)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        matrix = np.load(vectors_path, mmap_mode="r")
+        store = cls(
+            matrix=matrix,
+            ids=meta["ids"],
+            ref_doc_ids=meta["ref_doc_ids"],
+            metadata=meta["metadata"],
+            **ann_kwargs
+        )
+        store._load_ann(persist_dir, namespace)
+        return store
+
+    def _wants_ann(self) -> bool:
+        return self._ann_kind is not None and len(self._ids) >= self._ann_min_rows
+
+    def _ensure_ann(self):
+        """
+        Return the ANN index for a query, or None to search exactly.
+
+        A missing or drifted index is (re)trained in the background; queries
+        search exactly until a missing one is ready, and keep using a drifted
+        one until its replacement is. Called with the lock held.
+        """
+        if not self._wants_ann():
+            return None
+        if self._ann is None or self._ann.drifted():
+            self._train_in_background()
+        return self._ann
+
+    def _ann_for_persist(self):
+        """Return the ANN index to save, training it inline if it is missing or drifted."""
+        if not self._wants_ann():
+            return None
+        if self._ann is None or self._ann.drifted():
+            self._ann = train_ann_index(self._ann_kind, self.matrix, **self._ann_params)
+        return self._ann
+
+    def _train_in_background(self) -> None:
+        if self._training:
+            return
+        self._training = True
+        matrix, generation = self.matrix, self._generation
+
+        def train() -> None:
+            try:
+                ann = train_ann_index(self._ann_kind, matrix, **self._ann_params)
+                with self._lock:
+                    # Rows deleted meanwhile have shifted the row numbers; try again on next use
+                    if generation == self._generation:
+                        ann.add(self.matrix[len(matrix):])
+                        self._ann = ann
+            except Exception as e:
+                logger.error(f"Error training ANN index: {str(e)}")
+            finally:
+                with self._lock:
+                    self._training = False
+
+        threading.Thread(target=train, name="ann-train", daemon=True).start()
+
+    def _load_ann(self, persist_dir: str, namespace: str) -> None:
+        if self._ann_kind is None:
+            return
+        kind = self._ann_kind if self._ann_kind == "ivf" or hnswlib_available() else "ivf"
+        path = _ann_path(persist_dir, namespace, kind)
+        if not os.path.exists(path):
+            return
+        if kind == "ivf":
+            ann = IVFFlatIndex.load(path)
+            if "nprobe" in self._ann_params:
+                ann.nprobe = self._ann_params["nprobe"]
+        else:
+            ann = HNSWIndex.load(path, self._matrix.shape[1], self._ann_params.get("ef_search", 64))
+        # A stale index (e.g. from an interrupted write) is retrained on first use
+        if len(ann) == len(self._ids):
+            self._ann = ann
+
+    def _consolidate(self) -> None:
+        if self._pending:
+            blocks = [self._matrix] if self._matrix.size else []
+            self._matrix = np.vstack(blocks + self._pending)
+            self._pending = []
+
+    def _reindex(self) -> None:
+        self._row_by_id = {node_id: i for i, node_id in enumerate(self._ids)}
+        self._value_rows = {}
+
+    def _delete_rows(self, rows: List[int]) -> None:
+        if not rows:
+            return
+        keep = np.ones(len(self._ids), dtype=bool)
+        keep[rows] = False
+        self._matrix = self.matrix[keep]
+        self._ids = [x for x, k in zip(self._ids, keep) if k]
+        self._ref_doc_ids = [x for x, k in zip(self._ref_doc_ids, keep) if k]
+        self._metadata = [x for x, k in zip(self._metadata, keep) if k]
+        # Row numbers have shifted; the ANN index drops the deleted rows in place
+        if self._ann is not None:
+            self._ann.remove(keep)
+        self._generation += 1
+        self._reindex()
+
+    def _candidate_rows(self, query: VectorStoreQuery) -> Optional[np.ndarray]:
+        """Rows allowed by the query's node id, doc id and metadata restrictions."""
+        candidates = None
+        if query.node_ids is not None:
+            candidates = np.array(
+                sorted(self._row_by_id[i] for i in query.node_ids if i in self._row_by_id),
+                dtype=np.int64
+            )
+        if query.doc_ids is not None:
+            doc_ids = set(query.doc_ids)
+            rows = np.array([i for i, d in enumerate(self._ref_doc_ids) if d in doc_ids], dtype=np.int64)
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows)
+        if query.filters is not None:
+            rows = self._filter_rows(query.filters)
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows)
+        return candidates
+
+    def _rows_with_value(self, key: str, value: Any) -> np.ndarray:
+        """Rows whose metadata `key` equals `value`, via a lazily built inverted index."""
+        if key not in self._value_rows:
+            by_value: Dict[Any, List[int]] = {}
+            for i, metadata in enumerate(self._metadata):
+                if key in metadata:
+                    by_value.setdefault(metadata[key], []).append(i)
+            self._value_rows[key] = {v: np.array(r, dtype=np.int64) for v, r in by_value.items()}
+        return self._value_rows[key].get(value, np.zeros(0, dtype=np.int64))
+
+    def _filter_rows(self, filters: MetadataFilters) -> np.ndarray:
+        everything = np.arange(len(self._ids), dtype=np.int64)
+        result = None
+        for metadata_filter in filters.filters:
+            if isinstance(metadata_filter, MetadataFilters):
+                rows = self._filter_rows(metadata_filter)
+            elif metadata_filter.operator == FilterOperator.EQ:
+                rows = self._rows_with_value(metadata_filter.key, metadata_filter.value)
+            elif metadata_filter.operator == FilterOperator.NE:
+                rows = np.setdiff1d(everything, self._rows_with_value(metadata_filter.key, metadata_filter.value))
+            elif metadata_filter.operator == FilterOperator.IN:
+                rows = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + [
+                    self._rows_with_value(metadata_filter.key, value) for value in metadata_filter.value
+                ]))
+            elif metadata_filter.operator == FilterOperator.NIN:
+                excluded = np.concatenate([np.zeros(0, dtype=np.int64)] + [
+                    self._rows_with_value(metadata_filter.key, value) for value in metadata_filter.value
+                ])
+                rows = np.setdiff1d(everything, excluded)
+            else:
+                raise ValueError(f"Unsupported filter operator: {metadata_filter.operator}")
+
+            if result is None:
+                result = rows
+            elif filters.condition == FilterCondition.OR:
+                result = np.union1d(result, rows)
+            else:
+                result = np.intersect1d(result, rows)
+        return everything if result is None else result
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(scores):
+        rows = np.argpartition(-scores, k - 1)[:k]
+    else:
+        rows = np.arange(len(scores))
+    return rows[np.argsort(-scores[rows], kind="stable")]
+
+
+def filterable_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep the scalar user metadata that filters can match on."""
+    return {
+        key: value for key, value in metadata.items()
+        if not key.startswith("_") and isinstance(value, (str, int, float, bool))
+    }
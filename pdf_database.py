@@ -0,0 +1,368 @@
+import json
+import time
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from telemetry import traced
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SyncConflict(Exception):
+    """The remote copy changed since it was read."""
+
+
+class GitHubDatabaseRemote:
+    """Stores the PDF database as one JSON file in a GitHub repository.
+
+    Writes are conditional on the blob SHA that was read, so a concurrent
+    writer surfaces as a `SyncConflict` instead of being overwritten.
+    `repo` may be a PyGithub Repository or a callable returning one, so the
+    connection can be deferred until the first sync.
+    """
+
+    def __init__(self, repo, path: str = "pdf_database.json"):
+        self._repo = repo
+        self.path = path
+
+    @property
+    def repo(self):
+        return self._repo() if callable(self._repo) else self._repo
+
+    @traced("pdf_database.remote_load")
+    def load(self) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Return the remote database and its SHA (None if the file does not exist)."""
+        from github import UnknownObjectException
+
+        try:
+            contents = self.repo.get_contents(self.path)
+        except UnknownObjectException:
+            return {}, None
+        return json.loads(contents.decoded_content.decode()), contents.sha
+
+    @traced("pdf_database.remote_save")
+    def save(self, database: Dict[str, Any], sha: Optional[str], message: str) -> None:
+        """Write the database, failing with SyncConflict if the remote SHA moved."""
+        from github import GithubException
+
+        content = json.dumps(database, indent=2)
+        try:
+            if sha is None:
+                self.repo.create_file(self.path, message, content)
+            else:
+                self.repo.update_file(self.path, message, content, sha)
+        except GithubException as e:
+            # 409: SHA mismatch; 422: file created by someone else since we read it
+            if e.status in (409, 422):
+                raise SyncConflict(str(e)) from e
+            raise
+
+
+class PdfDatabase:
+    """Local PDF metadata store with asynchronous, batched remote sync.
+
+    Records live in a WAL-mode SQLite file and are mirrored in memory, so
+    reads never touch the network. Writes are applied locally under a lock
+    and marked dirty; a background thread waits `sync_interval` seconds to
+    coalesce further writes, then pushes every pending change to the remote
+    in a single commit. The push is a read-merge-write conditional on the
+    remote SHA and is retried on conflicts, so entries written by other
+    servers are kept. Pending changes survive a restart. Rows written to the
+    same file by another process (e.g. bulk_ingest.py) are picked up on the
+    next read, and pushed with the next sync if they are pending.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        remote: Optional[GitHubDatabaseRemote] = None,
+        sync_interval: float = 2.0,
+        max_retries: int = 5
+    ):
+        self.path = path
+        self.remote = remote
+        self.sync_interval = sync_interval
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.writes = 0
+        self.syncs = 0
+        self.conflicts = 0
+        self.sync_errors = 0
+        self.last_sync_error: Optional[str] = None
+        self.last_sync_at: Optional[float] = None
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pdfs ("
+            "filename TEXT PRIMARY KEY, record TEXT, deleted INTEGER NOT NULL DEFAULT 0, "
+            "dirty INTEGER NOT NULL DEFAULT 0, version INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.commit()
+
+        # In-memory mirror: filename -> record, plus pending changes: filename -> version
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._pending: Dict[str, int] = {}
+        self._data_version: Optional[int] = None
+        self._reload_locked()
+
+    def _reload_locked(self) -> bool:
+        """
+        Re-read the rows if another connection committed to the file since
+        they were last read. Cheap when nothing changed: SQLite's data_version
+        only moves on other connections' commits.
+
+        Returns:
+            True if another connection left changes to push
+        """
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+        records, pending = {}, {}
+        for filename, record, deleted, dirty, version in self._conn.execute(
+            "SELECT filename, record, deleted, dirty, version FROM pdfs"
+        ):
+            if not deleted:
+                records[filename] = json.loads(record)
+            if dirty:
+                pending[filename] = version
+        new_pending = any(self._pending.get(filename) != version for filename, version in pending.items())
+        self._records, self._pending = records, pending
+        return new_pending
+
+    def _refresh(self) -> None:
+        """Pick up rows written by other processes, scheduling a sync for their pending changes."""
+        with self._lock:
+            new_pending = self._reload_locked()
+        if new_pending:
+            self._schedule_sync()
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Return every PDF record."""
+        self._refresh()
+        with self._lock:
+            return [dict(record) for record in self._records.values()]
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        """Return the record for a PDF, or None."""
+        self._refresh()
+        with self._lock:
+            record = self._records.get(filename)
+            return dict(record) if record is not None else None
+
+    def upsert(self, filename: str, record: Dict[str, Any]) -> None:
+        """Create or replace the record for a PDF."""
+        self._write(filename, dict(record))
+
+    def update(self, filename: str, **fields: Any) -> Dict[str, Any]:
+        """Merge fields into a PDF's record (creating it if needed) and return it."""
+        with self._lock:
+            self._reload_locked()
+            record = dict(self._records.get(filename, {"filename": filename}))
+            record.update(fields)
+            self._write_locked(filename, record)
+        self._schedule_sync()
+        return dict(record)
+
+    def delete(self, filename: str) -> bool:
+        """Delete the record for a PDF. Returns False if it did not exist."""
+        with self._lock:
+            self._reload_locked()
+            if filename not in self._records:
+                return False
+            self._write_locked(filename, None)
+        self._schedule_sync()
+        return True
+
+    def _write(self, filename: str, record: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._write_locked(filename, record)
+        self._schedule_sync()
+
+    @traced("pdf_database.write")
+    def _write_locked(self, filename: str, record: Optional[Dict[str, Any]]) -> None:
+        self._reload_locked()
+        # Time-based, so versions written by different processes do not collide
+        version = max(time.time_ns(), self._pending.get(filename, 0) + 1)
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pdfs (filename, record, deleted, dirty, version) VALUES (?, ?, ?, 1, ?)",
+                (filename, json.dumps(record) if record is not None else None, int(record is None), version)
+            )
+        if record is None:
+            self._records.pop(filename, None)
+        else:
+            self._records[filename] = record
+        self._pending[filename] = version
+        self.writes += 1
+
+    def bootstrap(self) -> int:
+        """
+        Seed an empty local store from the remote copy.
+
+        Returns:
+            The number of records loaded
+        """
+        if self.remote is None:
+            return 0
+        with self._lock:
+            if self._records or self._pending:
+                return 0
+        database, _ = self.remote.load()
+        with self._lock:
+            self._adopt_remote_locked(database)
+        logger.info(f"Loaded {len(database)} PDF records from the remote database")
+        return len(database)
+
+    def _adopt_remote_locked(self, database: Dict[str, Any]) -> None:
+        """Take remote records for every PDF without a pending local change."""
+        with self._conn:
+            for filename in list(self._records):
+                if filename not in database and filename not in self._pending:
+                    del self._records[filename]
+                    self._conn.execute("DELETE FROM pdfs WHERE filename = ?", (filename,))
+            for filename, record in database.items():
+                if filename in self._pending:
+                    continue
+                self._records[filename] = record
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO pdfs (filename, record, deleted, dirty, version) VALUES (?, ?, 0, 0, 0)",
+                    (filename, json.dumps(record))
+                )
+
+    def _schedule_sync(self) -> None:
+        if self.remote is None:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sync_loop, name="pdf-database-sync", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _sync_loop(self) -> None:
+        while not self._closed.is_set():
+            self._wake.wait()
+            if self._closed.is_set():
+                break
+            # Give concurrent writers a moment so their changes share one commit
+            self._closed.wait(self.sync_interval)
+            self._wake.clear()
+            try:
+                self.sync()
+            except Exception as e:
+                self.sync_errors += 1
+                self.last_sync_error = str(e)
+                logger.error(f"Error syncing PDF database: {str(e)}")
+                # Try again later rather than spinning on a failing remote
+                self._closed.wait(self.sync_interval * 5)
+                self._wake.set()
+
+    def sync(self) -> int:
+        """
+        Push every pending change to the remote in one commit.
+
+        Returns:
+            The number of records pushed
+        """
+        if self.remote is None:
+            return 0
+        with self._sync_lock:
+            return self._sync()
+
+    @traced("pdf_database.sync")
+    def _sync(self) -> int:
+        with self._lock:
+            self._reload_locked()
+            batch = dict(self._pending)
+            changes = {filename: self._records.get(filename) for filename in batch}
+        if not batch:
+            return 0
+
+        for attempt in range(self.max_retries + 1):
+            database, sha = self.remote.load()
+            merged = dict(database)
+            for filename, record in changes.items():
+                if record is None:
+                    merged.pop(filename, None)
+                else:
+                    merged[filename] = record
+            try:
+                self.remote.save(merged, sha, f"Update PDF database ({len(batch)} changes)")
+                break
+            except SyncConflict:
+                self.conflicts += 1
+                if attempt == self.max_retries:
+                    raise
+                logger.info("PDF database changed remotely, retrying sync")
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+        with self._lock:
+            with self._conn:
+                # Hold the write lock from the re-read on, so another process's
+                # write cannot land between the two and be marked as pushed
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._reload_locked()
+                for filename, version in batch.items():
+                    # A write made during the push stays pending for the next batch
+                    if self._pending.get(filename) != version:
+                        continue
+                    del self._pending[filename]
+                    if changes[filename] is None:
+                        self._conn.execute("DELETE FROM pdfs WHERE filename = ? AND version = ?", (filename, version))
+                    else:
+                        self._conn.execute("UPDATE pdfs SET dirty = 0 WHERE filename = ? AND version = ?", (filename, version))
+                self._adopt_remote_locked(merged)
+        self.syncs += 1
+        self.last_sync_at = time.time()
+        self.last_sync_error = None
+        logger.info(f"Synced {len(batch)} PDF database changes")
+        return len(batch)
+
+    def flush(self) -> bool:
+        """
+        Sync pending changes now, in the calling thread.
+
+        Returns:
+            True if nothing is left pending
+        """
+        self.sync()
+        with self._lock:
+            return not self._pending
+
+    def close(self) -> None:
+        """Stop the sync thread after pushing pending changes."""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        try:
+            self.sync()
+        except Exception as e:
+            logger.error(f"Error syncing PDF database on close: {str(e)}")
+        self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return record, pending-change and sync counters."""
+        with self._lock:
+            return {
+                "records": len(self._records),
+                "pending": len(self._pending),
+                "writes": self.writes,
+                "syncs": self.syncs,
+                "conflicts": self.conflicts,
+                "sync_errors": self.sync_errors,
+                "last_sync_error": self.last_sync_error,
+                "last_sync_at": self.last_sync_at,
+            }
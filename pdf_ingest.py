@@ -0,0 +1,150 @@
+import os
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from pypdf import PdfReader
+
+if TYPE_CHECKING:
+    from llama_index.core import Document
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Size of the reads used when copying an upload to disk
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+# Page metadata left out of the text that is embedded (the LLM still sees it)
+EMBED_EXCLUDED_METADATA_KEYS = ["file_name", "page_label"]
+
+
+def spool_upload(stream: BinaryIO, path: str, chunk_size: int = SPOOL_CHUNK_SIZE) -> int:
+    """
+    Copy an upload stream to a file in fixed-size chunks.
+
+    Args:
+        stream: Readable binary stream (e.g. a Werkzeug FileStorage stream)
+        path: Destination file
+        chunk_size: Bytes read per chunk
+
+    Returns:
+        The number of bytes written
+    """
+    written = 0
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            f.write(chunk)
+            written += len(chunk)
+    os.replace(tmp_path, path)
+    return written
+
+
+def _page_labels(reader: PdfReader) -> List[str]:
+    """
+    Label of every page, read once: `PdfReader.page_labels` rebuilds the
+    whole list on each access.
+    """
+    num_pages = len(reader.pages)
+    try:
+        labels = list(reader.page_labels)
+    except (IndexError, KeyError):
+        labels = []
+    return labels[:num_pages] + [str(page_number + 1) for page_number in range(len(labels), num_pages)]
+
+
+def _extract_pages(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract (page number, text) for pages [start, end) of a PDF."""
+    reader = PdfReader(path)
+    return [(page_number, reader.pages[page_number].extract_text() or "") for page_number in range(start, end)]
+
+
+def iter_pdf_documents(
+    path: str,
+    file_name: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    pages_per_task: int = 16
+) -> Iterator["Document"]:
+    """
+    Parse a PDF in parallel and yield one Document per page, in page order.
+
+    Page ranges are extracted in a process pool. Only about two ranges per
+    worker are in flight at once, so memory stays bounded by the pages being
+    parsed rather than by the size of the PDF.
+
+    Args:
+        path: Path to the PDF on disk
+        file_name: Name recorded in each Document's metadata
+        max_workers: Number of parser processes (defaults to the CPU count)
+        pages_per_task: Pages extracted per task
+
+    Yields:
+        A Document for each page, with id "<file_name>#page=<n>"
+    """
+    # Imported here so that the server can spool uploads without loading llama_index
+    from llama_index.core import Document
+
+    file_name = file_name or os.path.basename(path)
+    reader = PdfReader(path)
+    num_pages = len(reader.pages)
+    labels = _page_labels(reader)
+    del reader
+    max_workers = max_workers or os.cpu_count() or 1
+    ranges = deque(
+        (start, min(start + pages_per_task, num_pages))
+        for start in range(0, num_pages, pages_per_task)
+    )
+
+    def to_documents(pages: List[Tuple[int, str]]) -> Iterator["Document"]:
+        for page_number, text in pages:
+            yield Document(
+                id_=f"{file_name}#page={page_number + 1}",
+                text=text,
+                metadata={"page_label": labels[page_number], "file_name": file_name},
+                # Embed the text alone, so the same passage in another book,
+                # on another page or under a new file name hits the embedding cache
+                excluded_embed_metadata_keys=EMBED_EXCLUDED_METADATA_KEYS
+            )
+
+    # Small documents are not worth the cost of starting worker processes
+    if max_workers <= 1 or len(ranges) <= 1:
+        for start, end in ranges:
+            yield from to_documents(_extract_pages(path, start, end))
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < max_workers * 2:
+                start, end = ranges.popleft()
+                in_flight.append(executor.submit(_extract_pages, path, start, end))
+            yield from to_documents(in_flight.popleft().result())
+
+    logger.info(f"Parsed {num_pages} pages from {file_name}")
+
+
+def iter_node_batches(documents: Iterable["Document"], node_parser, batch_size: int) -> Iterator[list]:
+    """
+    Split a stream of Documents into nodes, yielding them in batches.
+
+    Args:
+        documents: Documents to split, consumed lazily
+        node_parser: Node parser used to split each Document
+        batch_size: Minimum number of nodes per batch (the last may be smaller)
+
+    Yields:
+        Lists of nodes
+    """
+    batch = []
+    for document in documents:
+        batch.extend(node_parser.get_nodes_from_documents([document]))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
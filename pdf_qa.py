@@ -1,14 +1,32 @@
 from dotenv import load_dotenv
 import os
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings, StorageContext, load_index_from_storage, ServiceContext
-from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core.retrievers import VectorIndexRetriever
-from llama_index.core.query_engine import RetrieverQueryEngine
-from llama_index.llms.openai import OpenAI
-from llama_index.embeddings.openai import OpenAIEmbedding
-import openai
+import asyncio
+import contextvars
 import logging
-from typing import List
+import time
+import hashlib
+import threading
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from index_cache import IndexCache
+from answer_cache import AnswerCache
+from embedding_cache import EmbeddingCache
+from embedding_pipeline import RateLimiter, embed_nodes
+from pdf_ingest import iter_pdf_documents, iter_node_batches
+from telemetry import span, timed_iter, trace, traced
+
+# llama_index, and the stores, retrievers and callbacks built on it, are
+# imported in the functions that use them: importing llama_index takes about
+# a second and a half, which `import pdf_qa` no longer pays
+if TYPE_CHECKING:
+    from llama_index.core import VectorStoreIndex
+    from llama_index.core.node_parser import SentenceSplitter
+    from llama_index.core.retrievers import BaseRetriever
+    from llama_index.core.schema import NodeWithScore, QueryBundle
+    from llama_index.core.vector_stores import MetadataFilters
+    from keyword_index import BM25Index
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,117 +38,1082 @@ os.environ["OPENAI_API_KEY"] = "sk-proj-ohY8aLAY2VKXTGr2cZ5vgybHU8yd6t1z25dH06bS
 # Load environment variables (this will now use the key we just set)
 load_dotenv()
 
-# Set OpenAI API key
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# The OpenAI clients are built on first use: importing the OpenAI SDK alone
+# takes about half a second of every worker's startup
+_models_configured = False
+_models_lock = threading.Lock()
+
+def configure_models() -> None:
+    """
+    Set the global LLM and embedding model, once per process.
+    
+    Called by every function that needs a model or a query engine. It also
+    builds the module's other llama_index objects: the metrics callbacks,
+    `QA_TEMPLATE` and `context_packer`. Code that replaces `Settings.llm`,
+    `Settings.embed_model` or `context_packer` should call this first, so
+    that its replacements are not overwritten on first use.
+    """
+    global _models_configured, QA_TEMPLATE, context_packer
+    if _models_configured:
+        return
+    with _models_lock:
+        if _models_configured:
+            return
+        import openai
+        from llama_index.core import PromptTemplate, Settings
+        from llama_index.core.callbacks import CallbackManager
+        from llama_index.llms.openai import OpenAI
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        from context_packing import ContextPacker
+        from telemetry_callbacks import MetricsCallbackHandler
+        
+        # Time LLM calls, query embeddings, retrieval and synthesis, and count their tokens
+        Settings.callback_manager = CallbackManager([MetricsCallbackHandler()])
+        
+        QA_TEMPLATE = PromptTemplate(QA_PROMPT)
+        context_packer = ContextPacker(token_budget=CONTEXT_TOKEN_BUDGET) if CONTEXT_TOKEN_BUDGET > 0 else None
+        
+        # Set OpenAI API key
+        openai.api_key = os.getenv("OPENAI_API_KEY")
+        
+        # Configure global settings for OpenAI models
+        Settings.llm = OpenAI(model="gpt-4o-mini", temperature=0)
+        Settings.embed_model = OpenAIEmbedding(embed_batch_size=EMBED_BATCH_SIZE)
+        _models_configured = True
+
+# Process-wide cache of loaded indexes, keyed by persist directory
+index_cache = IndexCache(
+    max_entries=int(os.getenv("INDEX_CACHE_MAX_ENTRIES", "8")),
+    max_bytes=int(os.getenv("INDEX_CACHE_MAX_BYTES")) if os.getenv("INDEX_CACHE_MAX_BYTES") else None
+)
+
+# Embedding cache shared by every index, keyed by (model name, chunk text)
+embedding_cache = EmbeddingCache(
+    os.getenv("EMBEDDING_CACHE_PATH", os.path.join("storage", "_embedding_cache.sqlite3")),
+    max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "1000000"))
+)
+
+# Embedding requests are sent in large batches, concurrently, within the
+# account's requests-per-minute and tokens-per-minute limits
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "256"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+embedding_rate_limiter = RateLimiter(
+    requests_per_minute=float(os.getenv("EMBED_RPM", "3000")),
+    tokens_per_minute=float(os.getenv("EMBED_TPM", "1000000"))
+)
+
+# PDF pages are parsed in a process pool (0 = one process per CPU)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or None
+
+# Vector store used for new indexes: "mmap" (binary, memory-mapped) or "simple" (JSON)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "mmap")
+
+# Docstore used for new indexes: "compact" (compressed node file read per
+# retrieved node) or "simple" (JSON, loaded whole)
+DOCSTORE_BACKEND = os.getenv("DOCSTORE_BACKEND", "compact")
+
+# Approximate nearest-neighbour search for large stores: "ivf", "hnsw"
+# (needs hnswlib) or "none". Smaller stores are always searched exactly.
+ANN_INDEX = os.getenv("ANN_INDEX", "ivf")
+ANN_KWARGS = {
+    "ann_kind": None if ANN_INDEX == "none" else ANN_INDEX,
+    "ann_min_rows": int(os.getenv("ANN_MIN_ROWS", "20000")),
+    "ann_params": {
+        "nprobe": int(os.getenv("ANN_NPROBE", "16")),
+        "ef_search": int(os.getenv("ANN_EF_SEARCH", "64"))
+    }
+}
+
+# Hybrid retrieval for per-PDF queries: BM25 keyword search fused with the
+# dense results by reciprocal rank fusion, each side contributing
+# HYBRID_CANDIDATES chunks. HYBRID_SEARCH=0 falls back to dense only.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") != "0"
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+
+# Retrieved chunks are cut down to the sentences that best match the query,
+# within CONTEXT_TOKEN_BUDGET tokens. 0 sends the chunks as they are.
+# The packer is built by configure_models.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+context_packer = None
+
+# Answers to repeated questions, keyed by (index, index version, normalised
+# query). Set ANSWER_CACHE_SIMILARITY (e.g. 0.95) to also reuse the answer of
+# a cached query whose embedding is at least that cosine-similar.
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0")) or None
+
+def _embed_query(text: str) -> List[float]:
+    from llama_index.core import Settings
+    
+    configure_models()
+    return Settings.embed_model.get_query_embedding(text)
+
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "10000")),
+    ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL", "86400")),
+    similarity_threshold=ANSWER_CACHE_SIMILARITY,
+    embed_query=_embed_query
+)
+
+# Global index holding every chunk of every PDF, tagged with its file_name
+LIBRARY_PERSIST_DIR = os.getenv("LIBRARY_PERSIST_DIR", os.path.join("storage", "_library"))
+_library_lock = threading.Lock()
+
+# Keyword index of each loaded index, dropped along with the index
+_keyword_indexes: "weakref.WeakKeyDictionary[VectorStoreIndex, BM25Index]" = weakref.WeakKeyDictionary()
+
+@traced("index_load")
+def _load_index(persist_dir: str):
+    """Load an index from its persist directory without going through the cache."""
+    from llama_index.core import StorageContext, load_index_from_storage
+    from compact_docstore import CompactDocumentStore, has_compact_docstore
+    from keyword_index import BM25Index, build_keyword_index, has_keyword_index, keyword_index_path
+    from mmap_vector_store import MmapVectorStore, has_mmap_vector_store
+    
+    vector_store = None
+    if has_mmap_vector_store(persist_dir):
+        vector_store = MmapVectorStore.from_persist_dir(persist_dir, **ANN_KWARGS)
+    docstore = CompactDocumentStore.from_persist_dir(persist_dir) if has_compact_docstore(persist_dir) else None
+    storage_context = StorageContext.from_defaults(persist_dir=persist_dir, vector_store=vector_store, docstore=docstore)
+    index = load_index_from_storage(storage_context)
+    
+    if HYBRID_SEARCH:
+        if has_keyword_index(persist_dir):
+            _keyword_indexes[index] = BM25Index.load(keyword_index_path(persist_dir))
+        elif os.path.abspath(persist_dir) != os.path.abspath(LIBRARY_PERSIST_DIR):
+            # Indexes persisted before keyword search existed get one in memory
+            keyword_index = build_keyword_index(index.docstore, list(index.index_struct.nodes_dict))
+            if keyword_index is not None:
+                _keyword_indexes[index] = keyword_index
+    return index
+
+def get_index(persist_dir: str):
+    """
+    Get the index for a persist directory from the process-wide cache.
+    
+    Args:
+        persist_dir: Directory where the index is stored
+    
+    Returns:
+        The loaded index, reloaded only if the files on disk have changed
+    """
+    configure_models()
+    return index_cache.get(persist_dir, _load_index)
+
+def warm_up(persist_dirs: List[str]) -> int:
+    """
+    Build the model clients, load the tokenizer and load indexes into the cache.
+    
+    Meant to run in a background thread after startup, so that the first
+    queries do not pay for work that imports and loads deferred.
+    
+    Args:
+        persist_dirs: Index directories to load, most important first
+    
+    Returns:
+        The number of indexes loaded
+    """
+    from llama_index.core.utils import get_tokenizer
+    
+    start = time.perf_counter()
+    configure_models()
+    # Shared by the context packer and the token counts in the metrics
+    get_tokenizer()
+    loaded = 0
+    for persist_dir in persist_dirs:
+        if not os.path.exists(os.path.join(persist_dir, "docstore.json")):
+            continue
+        try:
+            get_index(persist_dir)
+            loaded += 1
+        except Exception as e:
+            logger.error(f"Error warming up index {persist_dir}: {str(e)}")
+    logger.info(f"Warmed up {loaded} indexes in {time.perf_counter() - start:.2f}s")
+    return loaded
+
+# Prompt used to answer questions from the retrieved context (QA_TEMPLATE
+# is its PromptTemplate, built by configure_models)
+QA_PROMPT = (
+    "You are a helpful AI assistant. Answer the question based ONLY on the provided context. "
+    "If the context doesn't contain the answer, say 'I don't have enough information to answer that question.' "
+    "Context: {context_str}\n\nQuestion: {query_str}\n\nAnswer: "
+)
+QA_TEMPLATE = None
+
+# Recent time-to-first-token samples (seconds) for streamed queries
+_ttft_samples = deque(maxlen=1000)
+
+def _build_query_engine(
+    index,
+    streaming: bool = False,
+    filters: Optional["MetadataFilters"] = None,
+    vector_retriever: Optional["BaseRetriever"] = None
+):
+    """
+    Create the query engine used for both blocking and streaming queries.
+    
+    `vector_retriever` replaces the index's own dense retriever, e.g. with
+    results searched ahead of time for a batch of questions.
+    """
+    from llama_index.core.query_engine import RetrieverQueryEngine
+    from keyword_index import HybridRetriever
+    
+    configure_models()
+    node_postprocessors = [context_packer] if context_packer is not None else []
+    keyword_index = _keyword_indexes.get(index)
+    if keyword_index is not None and filters is None:
+        retriever = HybridRetriever(
+            vector_retriever or index.as_retriever(similarity_top_k=HYBRID_CANDIDATES),
+            keyword_index,
+            index.docstore,
+            similarity_top_k=8,
+            candidate_k=HYBRID_CANDIDATES
+        )
+        return RetrieverQueryEngine.from_args(
+            retriever,
+            response_mode="compact",
+            text_qa_template=QA_TEMPLATE,
+            streaming=streaming,
+            node_postprocessors=node_postprocessors
+        )
+    if vector_retriever is not None:
+        return RetrieverQueryEngine.from_args(
+            vector_retriever,
+            response_mode="compact",
+            text_qa_template=QA_TEMPLATE,
+            streaming=streaming,
+            node_postprocessors=node_postprocessors
+        )
+    return index.as_query_engine(
+        similarity_top_k=8,
+        response_mode="compact",
+        text_qa_template=QA_TEMPLATE,
+        streaming=streaming,
+        filters=filters,
+        node_postprocessors=node_postprocessors
+    )
+
+def _file_filters(filenames: Optional[List[str]]) -> Optional["MetadataFilters"]:
+    """Metadata filter restricting retrieval to chunks of these PDFs."""
+    from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
+    
+    if not filenames:
+        return None
+    return MetadataFilters(filters=[
+        MetadataFilter(key="file_name", value=list(filenames), operator=FilterOperator.IN)
+    ])
+
+def _shard_retriever(index, persist_dir: str, shard_pool, filenames: Optional[List[str]] = None) -> Optional["BaseRetriever"]:
+    """The sharded dense retriever for an index, or None to search it in process."""
+    from mmap_vector_store import MmapVectorStore
+    from retrievers import ShardedRetriever
+    
+    if shard_pool is None or not isinstance(index.vector_store, MmapVectorStore):
+        return None
+    top_k = HYBRID_CANDIDATES if _keyword_indexes.get(index) is not None and not filenames else 8
+    return ShardedRetriever(index, persist_dir, shard_pool, top_k, filenames, filters=_file_filters(filenames))
+
+def _new_index(service_context=None) -> "VectorStoreIndex":
+    """Create an empty index backed by the configured vector store and docstore."""
+    from llama_index.core import StorageContext, VectorStoreIndex
+    from compact_docstore import CompactDocumentStore
+    from mmap_vector_store import MmapVectorStore
+    
+    vector_store = MmapVectorStore(**ANN_KWARGS) if VECTOR_STORE_BACKEND == "mmap" else None
+    docstore = CompactDocumentStore() if DOCSTORE_BACKEND == "compact" else None
+    return VectorStoreIndex(
+        [],
+        service_context=service_context,
+        storage_context=StorageContext.from_defaults(vector_store=vector_store, docstore=docstore)
+    )
+
+def _delete_nodes(index: "VectorStoreIndex", node_ids: List[str]) -> None:
+    """Remove nodes from an index's vector store, index struct and docstore."""
+    if not node_ids:
+        return
+    index.vector_store.delete_nodes(node_ids)
+    for node_id in node_ids:
+        index.index_struct.nodes_dict.pop(node_id, None)
+        index.docstore.delete_document(node_id, raise_error=False)
+    index.storage_context.index_store.add_index_struct(index.index_struct)
+
+def _delete_files_from_index(index: "VectorStoreIndex", file_names: Iterable[str]) -> None:
+    """Remove every document (page) of these PDFs from an index, in one scan of its docstore."""
+    file_names = set(file_names)
+    if not file_names:
+        return
+    ref_doc_infos = index.docstore.get_all_ref_doc_info() or {}
+    ref_doc_ids = [
+        ref_doc_id for ref_doc_id, info in ref_doc_infos.items()
+        if info.metadata.get("file_name") in file_names
+    ]
+    _delete_nodes(index, [node_id for ref_doc_id in ref_doc_ids for node_id in ref_doc_infos[ref_doc_id].node_ids])
+    for ref_doc_id in ref_doc_ids:
+        index.docstore.delete_ref_doc(ref_doc_id, raise_error=False)
+
+def add_to_library(file_name: str, batches: Iterable[List[Any]], removed_node_ids: Optional[List[str]] = None) -> None:
+    """
+    Replace a PDF's chunks in the library index with freshly embedded nodes.
+    
+    The library is updated on a private copy and persisted before the cached
+    copy is invalidated, so concurrent library queries never see a partial update.
+    
+    Args:
+        file_name: PDF the nodes belong to
+        batches: Batches of embedded nodes carrying `file_name` metadata,
+            inserted one batch at a time
+        removed_node_ids: If given, apply a delta instead: keep the PDF's
+            other chunks, delete these and add the nodes
+    """
+    _update_library([(file_name, batches, removed_node_ids)])
+
+def add_indexes_to_library(persist_dirs: Iterable[str]) -> int:
+    """
+    Replace the chunks of many PDFs in the library index, loading and
+    persisting the library once for all of them.
+    
+    Embeddings are copied from the per-file vector stores, so nothing is re-embedded.
+    
+    Args:
+        persist_dirs: Per-file index directories, each named after its PDF
+    
+    Returns:
+        The number of PDFs added to the library
+    """
+    configure_models()
+    
+    def batches(persist_dir: str, file_name: str) -> Iterator[List[Any]]:
+        # Each per-file index is loaded only when its turn comes
+        yield from _embedded_nodes(_load_index(persist_dir), file_name)
+    
+    updates = []
+    for persist_dir in persist_dirs:
+        file_name = os.path.basename(os.path.normpath(persist_dir))
+        updates.append((file_name, batches(persist_dir, file_name), None))
+    return _update_library(updates)
+
+def _update_library(updates: List[Tuple[str, Iterable[List[Any]], Optional[List[str]]]]) -> int:
+    """
+    Apply (file name, node batches, removed node ids) updates to a private
+    copy of the library index, then persist it and invalidate the cached copy.
+    
+    Returns:
+        The number of PDFs updated
+    """
+    if not updates:
+        return 0
+    with _library_lock:
+        if os.path.exists(os.path.join(LIBRARY_PERSIST_DIR, "docstore.json")):
+            library = _load_index(LIBRARY_PERSIST_DIR)
+        else:
+            library = _new_index()
+        
+        _delete_files_from_index(library, [file_name for file_name, _, removed_node_ids in updates if removed_node_ids is None])
+        for file_name, batches, removed_node_ids in updates:
+            if removed_node_ids is not None:
+                _delete_nodes(library, removed_node_ids)
+            added = 0
+            for nodes in batches:
+                library.insert_nodes(nodes)
+                added += len(nodes)
+            logger.info(f"Added {added} chunks from {file_name} to the library")
+        library.storage_context.persist(persist_dir=LIBRARY_PERSIST_DIR)
+        index_cache.invalidate(LIBRARY_PERSIST_DIR)
+        answer_cache.invalidate(LIBRARY_PERSIST_DIR)
+    return len(updates)
+
+def _library_has_nodes(node_ids) -> bool:
+    """Whether the library index already holds every one of these nodes."""
+    if not os.path.exists(os.path.join(LIBRARY_PERSIST_DIR, "docstore.json")):
+        return not node_ids
+    nodes_dict = get_index(LIBRARY_PERSIST_DIR).index_struct.nodes_dict
+    return all(node_id in nodes_dict for node_id in node_ids)
+
+def _stored_nodes(docstore, node_ids: Iterable[str]) -> List[Any]:
+    """
+    The nodes of these ids that a docstore holds, skipping missing or damaged ones.
+    
+    `get_nodes(..., raise_error=False)` still raises on a missing id (the
+    None it gets back is not a node), so nodes are read one at a time.
+    """
+    from llama_index.core.schema import BaseNode
+    
+    nodes = []
+    for node_id in node_ids:
+        try:
+            node = docstore.get_document(node_id, raise_error=False)
+        except Exception as e:
+            logger.warning(f"Skipping unreadable node {node_id}: {str(e)}")
+            continue
+        if isinstance(node, BaseNode):
+            nodes.append(node)
+    return nodes
+
+def _embedded_nodes(index: "VectorStoreIndex", file_name: str, node_ids: Optional[List[str]] = None) -> Iterator[List[Any]]:
+    """
+    Nodes of a per-file index with their stored embeddings and `file_name` metadata.
+    
+    Nodes are read back from the docstore and vector store a batch at a
+    time, so only one batch is held with list-of-floats embeddings.
+    
+    Args:
+        index: The per-file index
+        file_name: PDF the index belongs to
+        node_ids: Nodes to read (default: every node of the index)
+    
+    Yields:
+        Batches of up to EMBED_BATCH_SIZE nodes
+    """
+    node_ids = list(index.index_struct.nodes_dict) if node_ids is None else node_ids
+    for start in range(0, len(node_ids), EMBED_BATCH_SIZE):
+        nodes = _stored_nodes(index.docstore, node_ids[start:start + EMBED_BATCH_SIZE])
+        for node in nodes:
+            node.metadata["file_name"] = file_name
+            node.embedding = index.vector_store.get(node.node_id)
+        yield nodes
+
+def rebuild_library(storage_dir: str = "storage") -> int:
+    """
+    Rebuild the library index from every per-file index under a storage dir.
+    
+    Embeddings are copied from the per-file vector stores, so nothing is re-embedded.
+    
+    Args:
+        storage_dir: Directory containing one persist dir per PDF
+    
+    Returns:
+        The number of PDFs added to the library
+    """
+    persist_dirs = [
+        entry.path for entry in sorted(os.scandir(storage_dir), key=lambda e: e.name)
+        if entry.is_dir() and not entry.name.startswith("_")
+        and os.path.exists(os.path.join(entry.path, "docstore.json"))
+    ]
+    return add_indexes_to_library(persist_dirs)
+
+def create_node_parser() -> "SentenceSplitter":
+    """Create the node parser that splits pages into chunks, with larger chunks and more overlap than the default."""
+    from llama_index.core.node_parser import SentenceSplitter
+    
+    return SentenceSplitter(
+        chunk_size=1024,
+        chunk_overlap=200,
+        paragraph_separator="\n\n"
+    )
+
+def _remove_stale_stores(persist_dir: str) -> None:
+    """Remove default-namespace vector files and docstore node files not written by the current backends."""
+    if VECTOR_STORE_BACKEND == "mmap":
+        stale = ["default__vector_store.json"]
+    else:
+        stale = ["default__vector_store.npy", "default__vector_store.meta.json"]
+    for name in stale:
+        path = os.path.join(persist_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+    # A JSON docstore.json replaces a compact one, whose node files are left over
+    if DOCSTORE_BACKEND != "compact":
+        from compact_docstore import remove_compact_docstore_files
+        
+        remove_compact_docstore_files(persist_dir)
 
-# Configure global settings for OpenAI models
-Settings.llm = OpenAI(model="gpt-4o-mini", temperature=0)
-Settings.embed_model = OpenAIEmbedding()
+def _load_existing_index(persist_dir: str) -> Optional["VectorStoreIndex"]:
+    """Load a private copy of a persisted index that can be updated in place, if there is one."""
+    from compact_docstore import has_compact_docstore
+    from mmap_vector_store import has_mmap_vector_store
+    
+    if not os.path.exists(os.path.join(persist_dir, "docstore.json")):
+        return None
+    # Switching vector store or docstore backends needs a full rebuild
+    if has_mmap_vector_store(persist_dir) != (VECTOR_STORE_BACKEND == "mmap"):
+        return None
+    if has_compact_docstore(persist_dir) != (DOCSTORE_BACKEND == "compact"):
+        return None
+    try:
+        return _load_index(persist_dir)
+    except Exception as e:
+        logger.warning(f"Could not load existing index in {persist_dir}, rebuilding: {str(e)}")
+        return None
 
-def create_index(content: bytes, persist_dir: str) -> None:
+@trace("create_index")
+def create_index(
+    source: Union[bytes, str],
+    persist_dir: str,
+    on_stage: Optional[Callable[[str], None]] = None,
+    on_batch: Optional[Callable[[int], None]] = None,
+    update_library: bool = True
+) -> Dict[str, int]:
     """
-    Create an index from PDF content and persist it to disk.
+    Create an index from a PDF and persist it to disk.
+    
+    Pages are parsed in parallel and streamed through the splitter and the
+    embedding pipeline in batches, so memory use does not grow with the size
+    of the PDF file.
+    
+    If the persist dir already holds an index of the PDF (a re-upload), it is
+    updated in place: pages whose hash is unchanged are skipped before
+    splitting, chunks of changed pages that already exist are kept, chunks
+    that moved to another page reuse their embedding, only new text is
+    embedded and chunks no longer in the PDF are deleted.
     
     Args:
-        content: The PDF file content as bytes
+        source: Path to the PDF on disk, or the PDF content as bytes
         persist_dir: Directory to store the index
+        on_stage: Optional callback notified when indexing enters the
+            "parsing" and "embedding" stages
+        on_batch: Optional callback called with the number of chunks in each
+            batch once it is embedded (and its embeddings are in the
+            embedding cache, so a rerun after a crash does not pay for them again)
+        update_library: Also update the library index. Bulk ingestion turns
+            this off and adds all its PDFs with `add_indexes_to_library` at the end
+    
+    Returns:
+        Counts of chunks "kept", "added", "embedded" (added chunks that
+        needed the embedding API) and "removed"
     """
+    configure_models()
+    temp_file = None
     try:
-        # Create a temporary file to store the PDF content
-        temp_file = os.path.join(persist_dir, "temp.pdf")
-        with open(temp_file, "wb") as f:
-            f.write(content)
-        
-        # Create a custom node parser with larger chunks and more overlap
-        node_parser = SentenceSplitter(
-            chunk_size=1024,
-            chunk_overlap=200,
-            paragraph_separator="\n\n"
-        )
+        if isinstance(source, (bytes, bytearray)):
+            # Create a temporary file to store the PDF content
+            temp_file = os.path.join(persist_dir, "temp.pdf")
+            with open(temp_file, "wb") as f:
+                f.write(source)
+            pdf_path = temp_file
+        else:
+            pdf_path = source
+        
+        node_parser = create_node_parser()
         
-        # Create service context with custom node parser
+        # Create service context with custom node parser. Retries are left to
+        # the embedding pipeline so 429s feed back into its rate limiter.
+        from llama_index.core import ServiceContext
+        from llama_index.llms.openai import OpenAI
+        from llama_index.embeddings.openai import OpenAIEmbedding
+        from cached_embedding import CachedEmbedding
+        from keyword_index import build_keyword_index, has_keyword_index, keyword_index_path
+        
+        embed_model = CachedEmbedding(
+            OpenAIEmbedding(embed_batch_size=EMBED_BATCH_SIZE, max_retries=0),
+            embedding_cache
+        )
         service_context = ServiceContext.from_defaults(
             node_parser=node_parser,
             llm=OpenAI(temperature=0, model="gpt-3.5-turbo"),
-            embed_model=OpenAIEmbedding()
+            embed_model=embed_model
         )
         
-        # Create storage context
-        storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+        # Update an existing index of this PDF in place, or start from an empty one
+        index = _load_existing_index(persist_dir)
+        incremental = index is not None
+        if not incremental:
+            index = _new_index(service_context)
+        file_name = os.path.basename(os.path.normpath(persist_dir))
+        
+        # Hashes of the chunks already indexed, and of every page in this upload
+        docstore = index.docstore
+        old_node_ids = set(index.index_struct.nodes_dict)
+        existing_chunks = {
+            doc_hash: node_id for doc_hash, node_id in docstore.get_all_document_hashes().items()
+            if node_id in old_node_ids
+        }
+        old_pages = docstore.get_all_ref_doc_info() or {}
+        page_hashes: Dict[str, str] = {}
+        kept_node_ids = set()
+        moved_chunks: Dict[str, str] = {}
+        moved_chunks_read = False
         
-        # Load documents and create index
-        documents = SimpleDirectoryReader(input_files=[temp_file]).load_data()
-        index = VectorStoreIndex.from_documents(
-            documents,
-            service_context=service_context,
-            storage_context=storage_context
+        def moved_chunk(node) -> Optional[str]:
+            """Id of an indexed chunk with the same text on another page (e.g. after a page was inserted)."""
+            nonlocal moved_chunks_read
+            if not moved_chunks_read:
+                # Read once, on the first changed chunk; missing or damaged nodes are skipped
+                moved_chunks_read = True
+                for old_node in _stored_nodes(docstore, old_node_ids):
+                    moved_chunks[hashlib.sha256(old_node.text.encode("utf-8", "surrogatepass")).hexdigest()] = old_node.node_id
+            return moved_chunks.get(hashlib.sha256(node.text.encode("utf-8", "surrogatepass")).hexdigest())
+        
+        def changed_pages(documents):
+            """Yield only pages that are new or differ from the indexed copy."""
+            for document in documents:
+                page_hashes[document.doc_id] = document.hash
+                if document.doc_id in old_pages and docstore.get_document_hash(document.doc_id) == document.hash:
+                    kept_node_ids.update(old_pages[document.doc_id].node_ids)
+                    continue
+                yield document
+        
+        # Parse pages, split them into chunks and embed the chunks batch by batch
+        if on_stage:
+            on_stage("parsing")
+        documents = iter_pdf_documents(
+            pdf_path,
+            file_name=file_name,
+            max_workers=PARSE_WORKERS
         )
+        embedding = False
+        # Only the ids are kept: the library reads the nodes back once they are persisted
+        new_node_ids = []
+        embedded = 0
+        batches = iter_node_batches(changed_pages(documents), node_parser, EMBED_BATCH_SIZE * EMBED_CONCURRENCY)
+        for nodes in timed_iter(batches, "parse"):
+            fresh, to_embed = [], []
+            for node in nodes:
+                # Chunks of a changed page that are already indexed keep their node and embedding
+                node_id = existing_chunks.get(node.hash)
+                if node_id is not None:
+                    kept_node_ids.add(node_id)
+                    continue
+                # Text that only moved to another page is re-inserted with its stored embedding
+                # (the embedded text is identical: page metadata is excluded from it)
+                node_id = moved_chunk(node) if incremental else None
+                if node_id is not None:
+                    node.embedding = index.vector_store.get(node_id)
+                else:
+                    to_embed.append(node)
+                fresh.append(node)
+            if to_embed:
+                if on_stage and not embedding:
+                    on_stage("embedding")
+                    embedding = True
+                with span("embed", chunks=len(to_embed)):
+                    embed_nodes(to_embed, embed_model, {
+                        "max_workers": EMBED_CONCURRENCY,
+                        "limiter": embedding_rate_limiter
+                    })
+                embedded += len(to_embed)
+            if fresh:
+                with span("insert", chunks=len(fresh)):
+                    index.insert_nodes(fresh)
+                new_node_ids.extend(node.node_id for node in fresh)
+            if on_batch:
+                on_batch(len(nodes))
         
-        # Persist the index
-        index.storage_context.persist(persist_dir=persist_dir)
+        # Drop chunks and pages that are no longer in the PDF
+        removed_node_ids = sorted(old_node_ids - kept_node_ids)
+        _delete_nodes(index, removed_node_ids)
+        for page_id in old_pages:
+            if page_id not in page_hashes:
+                docstore.delete_ref_doc(page_id, raise_error=False)
+        docstore.set_document_hashes(page_hashes)
         
-        # Clean up temporary file
-        os.remove(temp_file)
+        # Persist the index, dropping any files left by other backends, with a keyword
+        # index over its chunks (rebuilt from the docstore, which holds all of them)
+        with span("persist"):
+            index.storage_context.persist(persist_dir=persist_dir)
+            _remove_stale_stores(persist_dir)
+        with span("keyword_index"):
+            keyword_index = build_keyword_index(docstore, list(index.index_struct.nodes_dict))
+            if keyword_index is not None:
+                keyword_index.save(keyword_index_path(persist_dir))
+            elif has_keyword_index(persist_dir):
+                os.remove(keyword_index_path(persist_dir))
+        index_cache.invalidate(persist_dir)
+        answer_cache.invalidate(persist_dir)
         
-        logger.info("Index created and persisted successfully")
+        # Make the PDF searchable from the library-wide index too, sending only the delta if the
+        # library already holds the chunks that were kept
+        if update_library:
+            with span("library_update"):
+                if incremental and _library_has_nodes(kept_node_ids):
+                    if new_node_ids or removed_node_ids:
+                        add_to_library(file_name, _embedded_nodes(index, file_name, new_node_ids), removed_node_ids=removed_node_ids)
+                else:
+                    add_to_library(file_name, _embedded_nodes(index, file_name))
+        
+        counts = {
+            "kept": len(kept_node_ids),
+            "added": len(new_node_ids),
+            "embedded": embedded,
+            "removed": len(removed_node_ids)
+        }
+        logger.info(f"Index created and persisted successfully: {counts}")
+        return counts
         
     except Exception as e:
         logger.error(f"Error creating index: {str(e)}")
         raise
+    
+    finally:
+        # Clean up temporary file
+        if temp_file and os.path.exists(temp_file):
+            os.remove(temp_file)
+
+def _query_bundle(query_text: str, query_embedding: Optional[Any]) -> "QueryBundle":
+    """
+    Query bundle carrying the (normalised numpy) embedding the answer cache
+    computed, so retrieval does not embed the query again.
+    """
+    from llama_index.core.schema import QueryBundle
+    
+    return QueryBundle(query_text, embedding=query_embedding.tolist() if query_embedding is not None else None)
 
-def query_index(query_text: str, persist_dir: str) -> str:
+@trace("query_index")
+def query_index(query_text: str, persist_dir: str, shard_pool=None) -> str:
     """
     Query the index with the given text.
     
     Args:
         query_text: The query text
         persist_dir: Directory where the index is stored
+        shard_pool: If given, the dense search runs in its worker processes
     
     Returns:
         The response text
     """
     try:
-        # Load the index from storage
-        storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
-        index = load_index_from_storage(storage_context)
+        # Repeated (or, with the semantic tier, near-duplicate) questions skip retrieval and the LLM
+        cached, query_embedding = answer_cache.lookup(persist_dir, query_text)
+        if cached is not None:
+            return cached
+        
+        # Load the index from the cache (or from storage on a miss)
+        index = get_index(persist_dir)
         
         # Create query engine with custom settings
-        query_engine = index.as_query_engine(
-            similarity_top_k=8,
-            response_mode="compact",
-            text_qa_template=(
-                "You are a helpful AI assistant. Answer the question based ONLY on the provided context. "
-                "If the context doesn't contain the answer, say 'I don't have enough information to answer that question.' "
-                "Context: {context_str}\n\nQuestion: {query_str}\n\nAnswer: "
-            )
-        )
+        query_engine = _build_query_engine(index, vector_retriever=_shard_retriever(index, persist_dir, shard_pool))
         
         # Get response
-        response = query_engine.query(query_text)
-        return str(response)
+        response = str(query_engine.query(_query_bundle(query_text, query_embedding)))
+        answer_cache.put(persist_dir, query_text, response, embedding=query_embedding)
+        return response
         
     except Exception as e:
         logger.error(f"Error querying index: {str(e)}")
         raise
 
-if __name__ == "__main__":
-    pdf_dir = "pdfs"
-    persist_dir = "storage"
+def _source_citations(source_nodes) -> List[Dict[str, Any]]:
+    """Group retrieved chunks by book, best-scoring book first."""
+    books: Dict[str, Dict[str, Any]] = {}
+    for source in source_nodes:
+        file_name = source.node.metadata.get("file_name", "unknown")
+        book = books.setdefault(file_name, {"filename": file_name, "pages": [], "score": 0.0})
+        page = source.node.metadata.get("page_label")
+        if page is not None and page not in book["pages"]:
+            book["pages"].append(page)
+        book["score"] = max(book["score"], source.score or 0.0)
+    return sorted(books.values(), key=lambda book: book["score"], reverse=True)
+
+@trace("query_library")
+def query_library(query_text: str, filenames: Optional[List[str]] = None, shard_pool=None) -> Dict[str, Any]:
+    """
+    Query the library-wide index, optionally restricted to some PDFs.
+    
+    Args:
+        query_text: The query text
+        filenames: If given, only chunks from these PDFs are retrieved
+        shard_pool: If given, the dense search runs in its worker processes
+    
+    Returns:
+        The response text and per-book source citations
+    """
+    try:
+        scope = "\n".join(sorted(filenames)) if filenames else ""
+        cached, query_embedding = answer_cache.lookup(LIBRARY_PERSIST_DIR, query_text, scope)
+        if cached is not None:
+            return cached
+        
+        index = get_index(LIBRARY_PERSIST_DIR)
+        
+        query_engine = _build_query_engine(
+            index,
+            filters=_file_filters(filenames),
+            vector_retriever=_shard_retriever(index, LIBRARY_PERSIST_DIR, shard_pool, filenames)
+        )
+        response = query_engine.query(_query_bundle(query_text, query_embedding))
+        result = {
+            "response": str(response),
+            "sources": _source_citations(response.source_nodes)
+        }
+        answer_cache.put(LIBRARY_PERSIST_DIR, query_text, result, scope, embedding=query_embedding)
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error querying library: {str(e)}")
+        raise
+
+# LLM calls in flight at once for a batch of questions
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+def _embed_questions(questions: List[str]) -> Dict[str, List[float]]:
+    """Embed questions in as few embedding requests as the batch size allows."""
+    from llama_index.core import Settings
+    
+    if not questions:
+        return {}
+    configure_models()
+    return dict(zip(questions, Settings.embed_model.get_text_embedding_batch(questions)))
+
+def _search_many(index, questions: List[str], embeddings: List[List[float]], top_k: int) -> Dict[str, List["NodeWithScore"]]:
+    """Dense top-k of many questions against one index, as one matrix product when the store allows it."""
+    from llama_index.core.schema import NodeWithScore
+    from llama_index.core.vector_stores import VectorStoreQuery
+    from mmap_vector_store import MmapVectorStore
+    
+    vector_store = index.vector_store
+    if isinstance(vector_store, MmapVectorStore):
+        results = vector_store.query_many(embeddings, top_k)
+    else:
+        results = [vector_store.query(VectorStoreQuery(query_embedding=embedding, similarity_top_k=top_k)) for embedding in embeddings]
+    
+    searched = {}
+    for question, result in zip(questions, results):
+        node_ids = [index.index_struct.nodes_dict.get(vector_id, vector_id) for vector_id in result.ids]
+        nodes = index.docstore.get_nodes(node_ids, raise_error=False)
+        searched[question] = [
+            NodeWithScore(node=node, score=score)
+            for node, score in zip(nodes, result.similarities) if node is not None
+        ]
+    return searched
+
+def query_batch(questions: List[str], persist_dirs: List[str]) -> Iterator[Dict[str, Any]]:
+    """
+    Ask every question of every index, yielding each answer as soon as it is ready.
+    
+    Answers in the answer cache are yielded first. For the rest, each index
+    is loaded once, the questions are embedded in batched requests, each
+    index's dense search runs over all its questions as one matrix product,
+    and the LLM calls run BATCH_LLM_CONCURRENCY at a time.
     
+    Args:
+        questions: The questions
+        persist_dirs: Directories of the indexes to ask them of
+    
+    Yields:
+        {"persist_dir", "query", "response"} per question and index, in
+        completion order, with "cached": True for answer cache hits, or
+        "error" in place of "response" if answering failed
+    """
+    from llama_index.core.schema import QueryBundle
+    from retrievers import PrecomputedRetriever
+    
+    with trace("query_batch", questions=len(questions), indexes=len(persist_dirs)):
+        questions = list(dict.fromkeys(questions))
+        
+        # The semantic tier needs every question's embedding; otherwise only misses are embedded
+        embeddings = _embed_questions(questions) if answer_cache.semantic else {}
+        misses: Dict[str, List[str]] = {}
+        cache_embeddings = {}
+        for persist_dir in persist_dirs:
+            for question in questions:
+                cached, cache_embeddings[persist_dir, question] = answer_cache.lookup(persist_dir, question, embedding=embeddings.get(question))
+                if cached is not None:
+                    yield {"persist_dir": persist_dir, "query": question, "response": cached, "cached": True}
+                else:
+                    misses.setdefault(persist_dir, []).append(question)
+        if not misses:
+            return
+        embeddings.update(_embed_questions([
+            question for question in dict.fromkeys(q for dir_questions in misses.values() for q in dir_questions)
+            if question not in embeddings
+        ]))
+        
+        # One load and one dense search per index
+        retrievers: Dict[str, Tuple[Any, "BaseRetriever"]] = {}
+        for persist_dir, dir_questions in list(misses.items()):
+            try:
+                index = get_index(persist_dir)
+                top_k = HYBRID_CANDIDATES if _keyword_indexes.get(index) is not None else 8
+                searched = _search_many(index, dir_questions, [embeddings[question] for question in dir_questions], top_k)
+                retrievers[persist_dir] = (index, PrecomputedRetriever(searched))
+            except Exception as e:
+                logger.error(f"Error loading index {persist_dir}: {str(e)}")
+                for question in misses.pop(persist_dir):
+                    yield {"persist_dir": persist_dir, "query": question, "error": str(e)}
+        
+        def answer(persist_dir: str, question: str) -> str:
+            index, retriever = retrievers[persist_dir]
+            query_engine = _build_query_engine(index, vector_retriever=retriever)
+            response = str(query_engine.query(QueryBundle(question, embedding=embeddings[question])))
+            answer_cache.put(persist_dir, question, response, embedding=cache_embeddings[persist_dir, question])
+            return response
+        
+        executor = ThreadPoolExecutor(max_workers=BATCH_LLM_CONCURRENCY, thread_name_prefix="batch-query")
+        try:
+            futures = {
+                executor.submit(contextvars.copy_context().run, answer, persist_dir, question): (persist_dir, question)
+                for persist_dir, dir_questions in misses.items() for question in dir_questions
+            }
+            for future in as_completed(futures):
+                persist_dir, question = futures[future]
+                try:
+                    yield {"persist_dir": persist_dir, "query": question, "response": future.result()}
+                except Exception as e:
+                    logger.error(f"Error answering batch question: {str(e)}")
+                    yield {"persist_dir": persist_dir, "query": question, "error": str(e)}
+        finally:
+            # A client that hangs up stops the questions that have not started
+            executor.shutdown(wait=False, cancel_futures=True)
+
+def stream_query_index(query_text: str, persist_dir: str, shard_pool=None) -> Iterator[str]:
+    """
+    Query the index and yield the answer token by token as the LLM produces it.
+    
+    Args:
+        query_text: The query text
+        persist_dir: Directory where the index is stored
+        shard_pool: If given, the dense search runs in its worker processes
+    
+    Yields:
+        Response text fragments
+    """
+    with trace("stream_query_index"):
+        try:
+            start = time.perf_counter()
+            cached, query_embedding = answer_cache.lookup(persist_dir, query_text)
+            if cached is not None:
+                yield cached
+                return
+            
+            index = get_index(persist_dir)
+            query_engine = _build_query_engine(index, streaming=True, vector_retriever=_shard_retriever(index, persist_dir, shard_pool))
+            response = query_engine.query(_query_bundle(query_text, query_embedding))
+            
+            first = True
+            tokens = []
+            for token in response.response_gen:
+                if first:
+                    ttft = time.perf_counter() - start
+                    _ttft_samples.append(ttft)
+                    logger.info(f"Time to first token: {ttft * 1000:.0f} ms")
+                    first = False
+                tokens.append(token)
+                yield token
+            
+            # Only complete answers are cached; a client disconnect stops the generator before this
+            answer_cache.put(persist_dir, query_text, "".join(tokens), embedding=query_embedding)
+            
+        except Exception as e:
+            logger.error(f"Error streaming query: {str(e)}")
+            raise
+
+async def _alookup_answer(persist_dir: str, query_text: str, scope: str = ""):
+    """Answer cache lookup that only leaves the event loop when the semantic tier must embed the query."""
+    if answer_cache.semantic:
+        return await asyncio.to_thread(answer_cache.lookup, persist_dir, query_text, scope)
+    return answer_cache.lookup(persist_dir, query_text, scope)
+
+async def aquery_index(query_text: str, persist_dir: str, shard_pool=None) -> str:
+    """
+    Async variant of `query_index` for the ASGI server.
+    
+    The query embedding and the LLM call are awaited on the event loop, so
+    many queries can be in flight without a thread each.
+    
+    Args:
+        query_text: The query text
+        persist_dir: Directory where the index is stored
+        shard_pool: If given, the dense search runs in its worker processes
+    
+    Returns:
+        The response text
+    """
+    with trace("query_index"):
+        try:
+            cached, query_embedding = await _alookup_answer(persist_dir, query_text)
+            if cached is not None:
+                return cached
+            
+            # Loading from disk on a cache miss would block the loop, so it runs on a worker thread
+            index = await asyncio.to_thread(get_index, persist_dir)
+            query_engine = _build_query_engine(index, vector_retriever=_shard_retriever(index, persist_dir, shard_pool))
+            response = str(await query_engine.aquery(_query_bundle(query_text, query_embedding)))
+            answer_cache.put(persist_dir, query_text, response, embedding=query_embedding)
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error querying index: {str(e)}")
+            raise
+
+async def aquery_library(query_text: str, filenames: Optional[List[str]] = None, shard_pool=None) -> Dict[str, Any]:
+    """Async variant of `query_library` for the ASGI server."""
+    with trace("query_library"):
+        try:
+            scope = "\n".join(sorted(filenames)) if filenames else ""
+            cached, query_embedding = await _alookup_answer(LIBRARY_PERSIST_DIR, query_text, scope)
+            if cached is not None:
+                return cached
+            
+            index = await asyncio.to_thread(get_index, LIBRARY_PERSIST_DIR)
+            
+            query_engine = _build_query_engine(
+                index,
+                filters=_file_filters(filenames),
+                vector_retriever=_shard_retriever(index, LIBRARY_PERSIST_DIR, shard_pool, filenames)
+            )
+            response = await query_engine.aquery(_query_bundle(query_text, query_embedding))
+            result = {
+                "response": str(response),
+                "sources": _source_citations(response.source_nodes)
+            }
+            answer_cache.put(LIBRARY_PERSIST_DIR, query_text, result, scope, embedding=query_embedding)
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error querying library: {str(e)}")
+            raise
+
+async def astream_query_index(query_text: str, persist_dir: str, shard_pool=None) -> AsyncIterator[str]:
+    """Async variant of `stream_query_index` for the ASGI server."""
+    with trace("stream_query_index"):
+        try:
+            start = time.perf_counter()
+            cached, query_embedding = await _alookup_answer(persist_dir, query_text)
+            if cached is not None:
+                yield cached
+                return
+            
+            index = await asyncio.to_thread(get_index, persist_dir)
+            query_engine = _build_query_engine(index, streaming=True, vector_retriever=_shard_retriever(index, persist_dir, shard_pool))
+            response = await query_engine.aquery(_query_bundle(query_text, query_embedding))
+            
+            first = True
+            tokens = []
+            async for token in response.async_response_gen():
+                if first:
+                    ttft = time.perf_counter() - start
+                    _ttft_samples.append(ttft)
+                    logger.info(f"Time to first token: {ttft * 1000:.0f} ms")
+                    first = False
+                tokens.append(token)
+                yield token
+            
+            answer_cache.put(persist_dir, query_text, "".join(tokens), embedding=query_embedding)
+            
+        except Exception as e:
+            logger.error(f"Error streaming query: {str(e)}")
+            raise
+
+def streaming_stats() -> Dict[str, float]:
+    """Summarise recent time-to-first-token samples in milliseconds."""
+    samples = sorted(_ttft_samples)
+    if not samples:
+        return {"count": 0}
+    
+    def percentile(p: float) -> float:
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+    
+    return {
+        "count": len(samples),
+        "ttft_p50_ms": percentile(0.50),
+        "ttft_p95_ms": percentile(0.95),
+        "ttft_max_ms": samples[-1] * 1000
+    }
+
+def context_packing_stats() -> Dict[str, Any]:
+    """Context tokens retrieved and sent to the LLM by the context packer."""
+    if context_packer is None:
+        # Before configure_models there is no packer yet, but there will be
+        return {"enabled": CONTEXT_TOKEN_BUDGET > 0 and not _models_configured}
+    return {"enabled": True, **context_packer.stats()}
+
+if __name__ == "__main__":
+    # Ask questions of the whole library from the terminal; build it with
+    # `python bulk_ingest.py <directory of PDFs>`
     if not os.getenv("OPENAI_API_KEY"):
         raise ValueError("OPENAI_API_KEY environment variable is not set")
     
-    # Check if we need to create a new index
-    if not os.path.exists(persist_dir) or not os.path.exists(os.path.join(persist_dir, "docstore.json")):
-        if not os.path.exists(pdf_dir):
-            os.makedirs(pdf_dir)
-            print(f"Please add your PDF documents to the {pdf_dir} directory")
-            exit(1)
-        print("Creating new index...")
-        index = create_index(pdf_dir, persist_dir)
-    else:
-        print("Loading existing index...")
-        index = load_index(persist_dir)
+    if not os.path.exists(os.path.join(LIBRARY_PERSIST_DIR, "docstore.json")):
+        print("The library is empty. Index a directory of PDFs first: python bulk_ingest.py pdfs/")
+        exit(1)
     
     while True:
         query = input("\nEnter your question (or 'quit' to exit): ")
@@ -138,5 +1121,7 @@ if __name__ == "__main__":
             break
         
         print("\nProcessing query...")
-        response = query_index(query, persist_dir)
-        print(f"\nResponse: {response}") 
\ No newline at end of file
+        result = query_library(query)
+        print(f"\nResponse: {result['response']}")
+        for source in result["sources"]:
+            print(f"  {source['filename']}, pages {', '.join(source['pages'])}")
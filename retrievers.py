@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from llama_index.core import Settings
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.vector_stores import MetadataFilters
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ShardedRetriever(BaseRetriever):
+    """Dense retriever that searches an index's vectors in the shard workers.
+
+    The query is embedded here; the workers return vector ids and scores
+    and the nodes are read from this process's docstore. If the pool fails,
+    the index is searched in process instead, with `filters` standing in for
+    the workers' file name filter.
+    """
+
+    def __init__(
+        self,
+        index: Any,
+        persist_dir: str,
+        shard_pool: Any,
+        top_k: int,
+        filenames: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None
+    ):
+        self._index = index
+        self._persist_dir = persist_dir
+        self._shard_pool = shard_pool
+        self._top_k = top_k
+        self._filenames = filenames
+        self._filters = filters
+        super().__init__()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        embedding = query_bundle.embedding
+        if embedding is None:
+            embedding = Settings.embed_model.get_agg_embedding_from_queries(query_bundle.embedding_strs)
+        try:
+            hits = self._shard_pool.search(
+                [(self._persist_dir, len(self._index.vector_store.node_ids))],
+                embedding,
+                self._top_k,
+                filenames=self._filenames
+            )
+        except Exception as e:
+            logger.error(f"Shard search failed, searching in process: {str(e)}")
+            retriever = self._index.as_retriever(similarity_top_k=self._top_k, filters=self._filters)
+            return retriever.retrieve(QueryBundle(query_bundle.query_str, embedding=embedding))
+
+        nodes_dict = self._index.index_struct.nodes_dict
+        node_ids = [nodes_dict.get(vector_id, vector_id) for _, vector_id, _ in hits]
+        nodes = self._index.docstore.get_nodes(node_ids, raise_error=False)
+        return [
+            NodeWithScore(node=node, score=score)
+            for node, (_, _, score) in zip(nodes, hits) if node is not None
+        ]
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if query_bundle.embedding is None:
+            embedding = await Settings.embed_model.aget_agg_embedding_from_queries(query_bundle.embedding_strs)
+            query_bundle = QueryBundle(query_bundle.query_str, embedding=embedding)
+        # Waiting on the workers would block the event loop
+        return await asyncio.to_thread(self._retrieve, query_bundle)
+
+
+class PrecomputedRetriever(BaseRetriever):
+    """Serves dense results searched ahead of time for a batch of questions, keyed by question text."""
+
+    def __init__(self, results: Dict[str, List[NodeWithScore]]):
+        self._results = results
+        super().__init__()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._results.get(query_bundle.query_str, [])
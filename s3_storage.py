@@ -1,62 +1,124 @@
 import boto3
 import os
+import threading
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import logging
 from datetime import datetime
+from storage_backend import StorageBackend, STORAGE_IO_WORKERS, open_dest, open_source
+from telemetry import traced
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class S3Storage:
-    def __init__(self):
+# Multipart transfers: files above the threshold move in concurrent chunks
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True
+)
+
+class S3Storage(StorageBackend):
+    def __init__(self, endpoint_url=None, pool_size=STORAGE_IO_WORKERS):
+        # The client keeps a pool of connections shared by every call and transfer thread
         self.s3_client = boto3.client(
             's3',
             aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
             aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('AWS_REGION', 'us-east-1')
+            region_name=os.getenv('AWS_REGION', 'us-east-1'),
+            endpoint_url=endpoint_url or os.getenv('AWS_ENDPOINT_URL'),
+            config=Config(max_pool_connections=pool_size * TRANSFER_CONFIG.max_concurrency)
         )
         self.bucket_name = os.getenv('AWS_BUCKET_NAME')
-        
-        # Create bucket if it doesn't exist
-        try:
-            self.s3_client.head_bucket(Bucket=self.bucket_name)
-        except ClientError:
-            self.s3_client.create_bucket(Bucket=self.bucket_name)
-            logger.info(f"Created new S3 bucket: {self.bucket_name}")
 
-    def upload_file(self, file_obj, filename):
-        """Upload a file to S3"""
+        # The bucket is checked (and created if needed) on first use
+        self._bucket_ready = False
+        self._bucket_lock = threading.Lock()
+
+    def _ensure_bucket_exists(self):
+        """Ensure the S3 bucket exists"""
+        if self._bucket_ready:
+            return
+        with self._bucket_lock:
+            if self._bucket_ready:
+                return
+            try:
+                self.s3_client.head_bucket(Bucket=self.bucket_name)
+            except ClientError:
+                self.s3_client.create_bucket(Bucket=self.bucket_name)
+                logger.info(f"Created new S3 bucket: {self.bucket_name}")
+            self._bucket_ready = True
+
+    @traced("storage.s3.upload")
+    def upload_file(self, filename, file_obj):
+        """
+        Upload a file to S3.
+
+        Large files are sent as a multipart upload in concurrent chunks.
+
+        Args:
+            filename: Name of the PDF
+            file_obj: File bytes, a path on disk or a readable binary file
+
+        Returns:
+            The stored file's key, URL, name and upload date
+        """
         try:
+            self._ensure_bucket_exists()
+
             # Generate a unique key for the file
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             key = f"pdfs/{timestamp}_{filename}"
-            
+
             # Upload the file
-            self.s3_client.upload_fileobj(
-                file_obj,
-                self.bucket_name,
-                key
-            )
-            
-            # Get the file URL
-            url = self.s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': self.bucket_name, 'Key': key},
-                ExpiresIn=3600  # URL expires in 1 hour
-            )
-            
+            with open_source(file_obj) as f:
+                self.s3_client.upload_fileobj(
+                    f,
+                    self.bucket_name,
+                    key,
+                    Config=TRANSFER_CONFIG
+                )
+
             return {
                 'key': key,
-                'url': url,
+                'url': self.get_file_url(key),
                 'filename': filename,
                 'upload_date': datetime.now().isoformat()
             }
-            
+
         except ClientError as e:
             logger.error(f"Error uploading file to S3: {str(e)}")
             raise
 
+    @traced("storage.s3.download")
+    def download_file(self, key, dest):
+        """
+        Stream a file from S3 to a path or binary file object.
+
+        Args:
+            key: Object key
+            dest: Destination path or writable binary file
+
+        Returns:
+            The number of bytes written
+        """
+        try:
+            with open_dest(dest) as f:
+                start = f.tell()
+                self.s3_client.download_fileobj(
+                    self.bucket_name,
+                    key,
+                    f,
+                    Config=TRANSFER_CONFIG
+                )
+                return f.tell() - start
+        except ClientError as e:
+            logger.error(f"Error downloading file from S3: {str(e)}")
+            raise
+
     def get_file_url(self, key):
         """Get a presigned URL for a file"""
         try:
@@ -70,32 +132,41 @@ class S3Storage:
             logger.error(f"Error generating presigned URL: {str(e)}")
             raise
 
-    def list_files(self):
-        """List all PDF files in the bucket"""
+    def iter_files(self, include_urls=False):
+        """
+        Yield every PDF file in the bucket, following listing pages past 1000 keys.
+
+        Args:
+            include_urls: Sign a presigned URL for each file; otherwise callers
+                sign only the ones they need with `get_file_url`
+        """
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix='pdfs/'
-            )
-            
-            files = []
-            for obj in response.get('Contents', []):
-                if obj['Key'].endswith('.pdf'):
-                    url = self.get_file_url(obj['Key'])
-                    files.append({
-                        'key': obj['Key'],
-                        'url': url,
-                        'filename': obj['Key'].split('/')[-1],
-                        'size': obj['Size'],
-                        'last_modified': obj['LastModified'].isoformat()
-                    })
-            
-            return files
-            
+            self._ensure_bucket_exists()
+
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix='pdfs/'):
+                for obj in page.get('Contents', []):
+                    if obj['Key'].endswith('.pdf'):
+                        record = {
+                            'key': obj['Key'],
+                            'filename': obj['Key'].split('/')[-1],
+                            'size': obj['Size'],
+                            'last_modified': obj['LastModified'].isoformat()
+                        }
+                        if include_urls:
+                            record['url'] = self.get_file_url(obj['Key'])
+                        yield record
+
         except ClientError as e:
             logger.error(f"Error listing files from S3: {str(e)}")
             raise
 
+    @traced("storage.s3.list")
+    def list_files(self, include_urls=False):
+        """List all PDF files in the bucket"""
+        return list(self.iter_files(include_urls))
+
+    @traced("storage.s3.delete")
     def delete_file(self, key):
         """Delete a file from S3"""
         try:
@@ -106,4 +177,4 @@ class S3Storage:
             return True
         except ClientError as e:
             logger.error(f"Error deleting file from S3: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
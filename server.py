@@ -1,12 +1,27 @@
 import os
 import json
+import atexit
+import functools
+import threading
+import time
+import uuid
 import logging
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from pdf_qa import create_index, query_index
-from github import Github
+from jobs import JobQueue
+from pdf_database import PdfDatabase, GitHubDatabaseRemote
+from concurrency import ConcurrencyLimit
+from blob_cache import BlobCache
+from shard_pool import ShardPool
+from pdf_ingest import spool_upload
+from telemetry import REQUEST_SECONDS, metrics, span, trace
+from lazy_import import lazy_import
+
+# The query pipeline (llama_index and the OpenAI SDK) is imported on first
+# use, so the server starts in a fraction of the time
+pdf_qa = lazy_import("pdf_qa")
 
 # Load environment variables
 load_dotenv()
@@ -17,75 +32,307 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    """Observe each request's latency, up to its headers, by route rather than by URL."""
+    start = g.get("request_start")
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint, status=response.status_code)
+    return response
+
 # GitHub configuration
 GITHUB_TOKEN = os.getenv('GITHUB_TOKEN')
 GITHUB_USERNAME = os.getenv('GITHUB_USERNAME')
 GITHUB_REPO = os.getenv('GITHUB_REPO')
 
-# Initialize GitHub client
-g = Github(GITHUB_TOKEN)
-repo = g.get_user(GITHUB_USERNAME).get_repo(GITHUB_REPO)
+GITHUB_BACKEND = os.getenv('GITHUB_BACKEND', 'github')
+
+# GitHub client, connected on first use so startup does not wait on the network
+_repo = None
+_repo_lock = threading.Lock()
+
+def get_repo():
+    """Get the GitHub repository ("memory" keeps everything in-process, for offline use)."""
+    global _repo
+    with _repo_lock:
+        if _repo is None:
+            if GITHUB_BACKEND == 'memory':
+                from fake_github import FakeGithubRepo
+                _repo = FakeGithubRepo()
+            else:
+                from github import Github
+                g = Github(GITHUB_TOKEN)
+                _repo = g.get_user(GITHUB_USERNAME).get_repo(GITHUB_REPO)
+        return _repo
+
+# Streaming transfers of PDFs: raw bytes on the way down and base64
+# encoded chunk by chunk on the way up, never the whole file in memory
+_storage = None
+
+def get_storage():
+    """Get the streaming GitHub storage client, created on first use."""
+    global _storage
+    with _repo_lock:
+        if _storage is None:
+            from github_storage import GitHubStorage
+            # The repository is the one get_repo reads: never created or seeded by an upload
+            _storage = GitHubStorage(GITHUB_TOKEN, GITHUB_USERNAME, GITHUB_REPO, create_repo=False)
+        return _storage
+
+def fetch_pdf(filename, dest):
+    """Stream a PDF from GitHub into a writable binary file."""
+    if GITHUB_BACKEND == 'memory':
+        dest.write(get_repo().get_contents(f"pdfs/{filename}").decoded_content)
+        return
+    get_storage().download_file(f"pdfs/{filename}", dest)
+
+def push_pdf(filename, path):
+    """Stream a PDF on disk to GitHub, creating or replacing it."""
+    if GITHUB_BACKEND == 'memory':
+        repo = get_repo()
+        with open(path, "rb") as f:
+            content = f.read()
+        try:
+            contents = repo.get_contents(f"pdfs/{filename}")
+        except Exception:
+            repo.create_file(f"pdfs/{filename}", f"Upload {filename}", content)
+        else:
+            repo.update_file(f"pdfs/{filename}", f"Update {filename}", content, contents.sha)
+        return
+    get_storage().upload_file(f"pdfs/{filename}", path)
 
 # Storage configuration
 STORAGE_DIR = "storage"
 PDF_DATABASE_FILE = "pdf_database.json"
+JOBS_DIR = os.path.join(STORAGE_DIR, "_jobs")
+UPLOADS_DIR = os.path.join(STORAGE_DIR, "_uploads")
 
-# Create storage directory if it doesn't exist
+# Create storage directories if they don't exist
 os.makedirs(STORAGE_DIR, exist_ok=True)
+os.makedirs(UPLOADS_DIR, exist_ok=True)
+
+# Local copies of the PDFs in GitHub, served to the viewer from disk
+pdf_cache = BlobCache(
+    os.getenv('PDF_CACHE_DIR', os.path.join(STORAGE_DIR, "_pdf_cache")),
+    max_bytes=int(os.getenv('PDF_CACHE_MAX_MB', '2048')) * 1024 * 1024
+)
 
-def load_pdf_database():
-    """Load the PDF database from GitHub."""
+# PDF metadata is served from a local store; changes reach GitHub in
+# background batches, one commit per batch
+pdf_database = PdfDatabase(
+    os.getenv('PDF_DATABASE_PATH', os.path.join(STORAGE_DIR, "_pdf_database.sqlite3")),
+    remote=GitHubDatabaseRemote(get_repo, PDF_DATABASE_FILE),
+    sync_interval=float(os.getenv('PDF_DATABASE_SYNC_INTERVAL', '2'))
+)
+atexit.register(pdf_database.close)
+
+def bootstrap_pdf_database():
+    """Seed the local PDF database from GitHub on first start."""
     try:
-        contents = repo.get_contents(PDF_DATABASE_FILE)
-        return json.loads(contents.decoded_content.decode())
-    except:
-        return {}
+        pdf_database.bootstrap()
+    except Exception as e:
+        logger.error(f"Error loading PDF database from GitHub: {str(e)}")
+
+bootstrap_thread = threading.Thread(target=bootstrap_pdf_database, name="pdf-database-bootstrap", daemon=True)
+bootstrap_thread.start()
 
-def save_pdf_database(database):
-    """Save the PDF database to GitHub."""
+# Indexes loaded in the background at startup, so the first queries find
+# them in memory: a comma-separated list of PDF filenames ("_library" for
+# the library index), or a number N for the library and the N most recently
+# uploaded PDFs. Unset, everything is loaded on first use.
+WARMUP_INDEXES = os.getenv('WARMUP_INDEXES', '').strip()
+
+def warmup_persist_dirs(spec: str):
+    """Resolve a WARMUP_INDEXES value to index directories."""
+    if spec.isdigit():
+        records = sorted(pdf_database.list(), key=lambda record: record.get("upload_date", ""), reverse=True)
+        names = ["_library"] + [record["filename"] for record in records[:int(spec)]]
+    else:
+        names = [name.strip() for name in spec.split(",") if name.strip()]
+    return [
+        pdf_qa.LIBRARY_PERSIST_DIR if name == "_library" else os.path.join(STORAGE_DIR, secure_filename(name))
+        for name in names
+    ]
+
+# Sharded serving: SHARD_WORKERS worker processes keep the vector stores
+# loaded and run the dense search of every query, so searches use more than
+# one core. Stores with more than SHARD_PARTITION_ROWS vectors are split
+# across several workers. 0 searches in the request's thread.
+SHARD_WORKERS = int(os.getenv('SHARD_WORKERS', '0'))
+SHARD_PARTITION_ROWS = int(os.getenv('SHARD_PARTITION_ROWS', '200000'))
+shard_pool = None
+_shard_pool_lock = threading.Lock()
+
+def get_shard_pool():
+    """The shard worker pool, started on first use, or None if sharding is off."""
+    global shard_pool
+    if SHARD_WORKERS <= 0:
+        return None
+    with _shard_pool_lock:
+        if shard_pool is None:
+            shard_pool = ShardPool(SHARD_WORKERS, partition_rows=SHARD_PARTITION_ROWS, ann_kwargs=pdf_qa.ANN_KWARGS)
+            atexit.register(shard_pool.close)
+        return shard_pool
+
+def warm_up_pipeline():
+    """Import the query pipeline and load the WARMUP_INDEXES indexes, once the PDF database is seeded."""
+    bootstrap_thread.join()
     try:
-        contents = repo.get_contents(PDF_DATABASE_FILE)
-        repo.update_file(
-            PDF_DATABASE_FILE,
-            "Update PDF database",
-            json.dumps(database, indent=2),
-            contents.sha
-        )
-    except:
-        repo.create_file(
-            PDF_DATABASE_FILE,
-            "Create PDF database",
-            json.dumps(database, indent=2)
-        )
+        persist_dirs = warmup_persist_dirs(WARMUP_INDEXES)
+        pdf_qa.warm_up(persist_dirs)
+        if get_shard_pool() is not None:
+            from mmap_vector_store import has_mmap_vector_store
+            
+            shard_pool.load([persist_dir for persist_dir in persist_dirs if has_mmap_vector_store(persist_dir)])
+    except Exception as e:
+        logger.error(f"Error warming up: {str(e)}")
+
+if WARMUP_INDEXES:
+    threading.Thread(target=warm_up_pipeline, name="warm-up", daemon=True).start()
+
+# Per-endpoint caps on in-flight requests; excess requests get 503 with Retry-After
+concurrency_limits = {
+    "query": ConcurrencyLimit("query", int(os.getenv('QUERY_CONCURRENCY', '64'))),
+    "upload": ConcurrencyLimit("upload", int(os.getenv('UPLOAD_CONCURRENCY', '8'))),
+    "query_batch": ConcurrencyLimit("query_batch", int(os.getenv('QUERY_BATCH_CONCURRENCY', '4'))),
+    "library_rebuild": ConcurrencyLimit("library_rebuild", 1),
+}
+
+def too_many_requests():
+    """Response for a request rejected by a concurrency limit."""
+    response = jsonify({"error": "Too many concurrent requests, try again shortly"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+def limit_concurrency(name):
+    """Reject requests to a view while its endpoint is at its concurrency limit."""
+    limit = concurrency_limits[name]
+    
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not limit.try_acquire():
+                return too_many_requests()
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except Exception:
+                limit.release()
+                raise
+            # Streamed responses keep their slot until the body has been sent
+            response.call_on_close(limit.release)
+            return response
+        return wrapper
+    return decorator
 
 @app.route('/api/pdfs', methods=['GET'])
 def list_pdfs():
     """List all PDFs in the database."""
     try:
-        database = load_pdf_database()
-        return jsonify(list(database.values()))
+        return jsonify(pdf_database.list())
     except Exception as e:
         logger.error(f"Error listing PDFs: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/pdfs/<filename>', methods=['GET'])
 def get_pdf(filename):
-    """Get a specific PDF from GitHub."""
+    """
+    Serve a PDF from the local cache, fetching it from GitHub on a miss.
+    
+    The file is sent with sendfile where the server supports it, and with
+    an ETag and Range support, so the browser's PDF viewer can revalidate
+    with If-None-Match and load pages incrementally.
+    """
     try:
-        contents = repo.get_contents(f"pdfs/{filename}")
-        return send_file(
-            contents.decoded_content,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=filename
-        )
+        for attempt in range(2):
+            path, entry = pdf_cache.get(filename, lambda dest: fetch_pdf(filename, dest))
+            try:
+                response = send_file(
+                    path,
+                    mimetype='application/pdf',
+                    download_name=filename,
+                    conditional=True,
+                    etag=entry["etag"]
+                )
+                break
+            except FileNotFoundError:
+                # Evicted between the lookup and opening it; fetch it again
+                if attempt:
+                    raise
+        if response.status_code in (200, 206):
+            pdf_cache.served(response.content_length or 0)
+        return response
     except Exception as e:
         logger.error(f"Error getting PDF: {str(e)}")
         return jsonify({"error": str(e)}), 404
 
+# Steps of an upload job, all of which read the spooled upload
+UPLOAD_STEPS = {"github", "index", "database"}
+
+@trace("upload_job")
+def process_upload_job(job, set_state, mark_done):
+    """Push an uploaded PDF to GitHub, index it and record it in the database."""
+    filename = job["payload"]["filename"]
+    spool_path = job["payload"]["spool_path"]
+    steps_done = job["steps_done"]
+    
+    try:
+        if not UPLOAD_STEPS.issubset(steps_done) and not os.path.exists(spool_path):
+            raise FileNotFoundError(f"The spooled upload of {filename} is gone")
+        
+        # Upload PDF to GitHub
+        if "github" not in steps_done:
+            with span("github_upload"):
+                push_pdf(filename, spool_path)
+            # The upload is the new content of the cached copy, so its first view needs no download
+            pdf_cache.put(filename, spool_path)
+            mark_done("github")
+        
+        # Create index for the PDF
+        if "index" not in steps_done:
+            persist_dir = os.path.join(STORAGE_DIR, filename)
+            os.makedirs(persist_dir, exist_ok=True)
+            pdf_qa.create_index(spool_path, persist_dir, on_stage=set_state)
+            mark_done("index")
+        
+        # Update PDF database
+        if "database" not in steps_done:
+            pdf_database.upsert(filename, {
+                "filename": filename,
+                "upload_date": datetime.now().isoformat(),
+                "size": os.path.getsize(spool_path)
+            })
+            mark_done("database")
+    except Exception:
+        # Failed jobs are not retried, so their spooled upload is of no further use
+        remove_spool(spool_path)
+        raise
+    remove_spool(spool_path)
+
+def remove_spool(spool_path: str) -> None:
+    """Delete a spooled upload; a job resumed after a crash may have deleted it already."""
+    try:
+        os.remove(spool_path)
+    except FileNotFoundError:
+        pass
+
+# Background ingestion jobs; unfinished jobs resume after a restart
+job_queue = JobQueue(
+    JOBS_DIR,
+    process_upload_job,
+    max_workers=int(os.getenv('INGEST_WORKERS', '2'))
+)
+job_queue.resume()
+
 @app.route('/api/upload', methods=['POST'])
+@limit_concurrency("upload")
 def upload_file():
-    """Upload a PDF file to GitHub and create its index."""
+    """Accept a PDF upload and queue a job to store and index it."""
     try:
         if 'file' not in request.files:
             return jsonify({"error": "No file part"}), 400
@@ -98,68 +345,221 @@ def upload_file():
             return jsonify({"error": "File must be a PDF"}), 400
         
         filename = secure_filename(file.filename)
-        content = file.read()
         
-        # Upload PDF to GitHub
-        try:
-            repo.create_file(
-                f"pdfs/{filename}",
-                f"Upload {filename}",
-                content
-            )
-        except:
-            contents = repo.get_contents(f"pdfs/{filename}")
-            repo.update_file(
-                f"pdfs/{filename}",
-                f"Update {filename}",
-                content,
-                contents.sha
-            )
-        
-        # Create index for the PDF
-        persist_dir = os.path.join(STORAGE_DIR, filename)
-        os.makedirs(persist_dir, exist_ok=True)
-        create_index(content, persist_dir)
+        # Spool the upload to disk so the job survives a restart
+        spool_path = os.path.join(UPLOADS_DIR, f"{uuid.uuid4().hex}_{filename}")
+        spool_upload(file.stream, spool_path)
         
-        # Update PDF database
-        database = load_pdf_database()
-        database[filename] = {
+        # Uploads of the same file are indexed one after the other
+        job = job_queue.submit("upload", {
             "filename": filename,
-            "upload_date": datetime.now().isoformat(),
-            "size": len(content)
-        }
-        save_pdf_database(database)
+            "spool_path": spool_path
+        }, key=filename)
         
-        return jsonify({"message": "File uploaded successfully"})
+        return jsonify({
+            "message": "File queued for indexing",
+            "job_id": job["id"],
+            "status_url": f"/api/jobs/{job['id']}"
+        }), 202
         
     except Exception as e:
         logger.error(f"Error uploading file: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status of an ingestion job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+def sse_event(data, event=None):
+    """Format a server-sent event."""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+def stream_query_response(query_text, persist_dir):
+    """Stream the answer to a query as server-sent events."""
+    def generate():
+        start = time.perf_counter()
+        ttft_ms = None
+        try:
+            for token in pdf_qa.stream_query_index(query_text, persist_dir, shard_pool=get_shard_pool()):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                yield sse_event({"token": token})
+            yield sse_event({
+                "ttft_ms": ttft_ms,
+                "total_ms": (time.perf_counter() - start) * 1000
+            }, event="done")
+        except Exception as e:
+            logger.error(f"Error streaming query: {str(e)}")
+            yield sse_event({"error": str(e)}, event="error")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def parse_query_request(data, accept):
+    """
+    Validate a query request body and decide how to answer it.
+    
+    Shared by the Flask view and the ASGI server.
+    
+    Args:
+        data: Parsed JSON body
+        accept: The request's Accept header
+    
+    Returns:
+        (plan, None) where plan has a "mode" of "library", "stream" or
+        "index" plus its arguments, or (None, (error message, status))
+    """
+    if not data or 'query' not in data:
+        return None, ("No query provided", 400)
+    
+    query_text = data['query']
+    filename = data.get('filename')
+    
+    # Without a filename, search the whole library (optionally a subset of books)
+    if not filename:
+        filenames = data.get('filenames')
+        if filenames is not None and not isinstance(filenames, list):
+            return None, ("filenames must be a list", 400)
+        if not os.path.exists(pdf_qa.LIBRARY_PERSIST_DIR):
+            return None, ("Library is empty", 404)
+        return {"mode": "library", "query_text": query_text, "filenames": filenames}, None
+    
+    if not isinstance(filename, str):
+        return None, ("filename must be a string", 400)
+    
+    # Uploads are stored under their secure_filename, which also keeps the path inside STORAGE_DIR
+    safe_name = secure_filename(filename)
+    persist_dir = os.path.join(STORAGE_DIR, safe_name)
+    if not safe_name or not os.path.exists(persist_dir):
+        return None, ("PDF not indexed", 404)
+    
+    # Stream tokens when the client asks for it, otherwise answer in one JSON blob
+    if data.get('stream') or 'text/event-stream' in (accept or ''):
+        return {"mode": "stream", "query_text": query_text, "persist_dir": persist_dir}, None
+    return {"mode": "index", "query_text": query_text, "persist_dir": persist_dir}, None
+
 @app.route('/api/query', methods=['POST'])
+@limit_concurrency("query")
 def query():
     """Query the PDF index."""
     try:
-        data = request.get_json()
-        if not data or 'query' not in data:
-            return jsonify({"error": "No query provided"}), 400
-        
-        query_text = data['query']
-        filename = data.get('filename')
-        
-        if not filename:
-            return jsonify({"error": "No filename provided"}), 400
+        plan, error = parse_query_request(request.get_json(), request.headers.get('Accept', ''))
+        if error:
+            return jsonify({"error": error[0]}), error[1]
         
-        persist_dir = os.path.join(STORAGE_DIR, filename)
-        if not os.path.exists(persist_dir):
-            return jsonify({"error": "PDF not indexed"}), 404
+        if plan["mode"] == "library":
+            return jsonify(pdf_qa.query_library(plan["query_text"], plan["filenames"], shard_pool=get_shard_pool()))
+        if plan["mode"] == "stream":
+            return stream_query_response(plan["query_text"], plan["persist_dir"])
         
-        response = query_index(query_text, persist_dir)
+        response = pdf_qa.query_index(plan["query_text"], plan["persist_dir"], shard_pool=get_shard_pool())
         return jsonify({"response": response})
         
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+# Most question/file pairs one batch request may ask
+MAX_BATCH_QUESTIONS = int(os.getenv('MAX_BATCH_QUESTIONS', '500'))
+
+@app.route('/api/query/batch', methods=['POST'])
+@limit_concurrency("query_batch")
+def query_batch():
+    """Ask many questions of one or more PDFs, streaming one NDJSON line per answer as it completes."""
+    data = request.get_json(silent=True) or {}
+    questions = data.get('questions')
+    filenames = data.get('filenames') or ([data['filename']] if data.get('filename') else None)
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+        return jsonify({"error": "questions must be a non-empty list of strings"}), 400
+    if not isinstance(filenames, list) or not filenames or not all(isinstance(f, str) for f in filenames):
+        return jsonify({"error": "No filename or filenames provided"}), 400
+    if len(questions) * len(filenames) > MAX_BATCH_QUESTIONS:
+        return jsonify({"error": f"At most {MAX_BATCH_QUESTIONS} question/file pairs per batch"}), 400
+    
+    persist_dirs = {}
+    for filename in filenames:
+        safe_name = secure_filename(filename)
+        persist_dir = os.path.join(STORAGE_DIR, safe_name)
+        if not safe_name or not os.path.exists(persist_dir):
+            return jsonify({"error": f"PDF not indexed: {filename}"}), 404
+        persist_dirs[persist_dir] = filename
+    
+    def generate():
+        start = time.perf_counter()
+        answered = errors = 0
+        try:
+            for result in pdf_qa.query_batch(questions, list(persist_dirs)):
+                result["filename"] = persist_dirs[result.pop("persist_dir")]
+                if "error" in result:
+                    errors += 1
+                else:
+                    answered += 1
+                yield json.dumps(result) + "\n"
+        except Exception as e:
+            logger.error(f"Error processing batch query: {str(e)}")
+            yield json.dumps({"error": str(e)}) + "\n"
+            errors += 1
+        yield json.dumps({
+            "done": True,
+            "answered": answered,
+            "errors": errors,
+            "total_ms": (time.perf_counter() - start) * 1000
+        }) + "\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/library/rebuild', methods=['POST'])
+@limit_concurrency("library_rebuild")
+def rebuild_library_index():
+    """Rebuild the library-wide index from the per-file indexes."""
+    try:
+        added = pdf_qa.rebuild_library(STORAGE_DIR)
+        return jsonify({"message": f"Library rebuilt from {added} PDFs"})
+    except Exception as e:
+        logger.error(f"Error rebuilding library: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def collect_stats():
+    """Counters of the caches, the PDF database and the query pipeline."""
+    stats = {
+        "pdf_database": pdf_database.stats(),
+        "concurrency": {name: limit.stats() for name, limit in concurrency_limits.items()},
+        "pdf_cache": pdf_cache.stats(),
+        "shards": shard_pool.stats() if shard_pool is not None else {"workers": 0},
+        "pipeline_loaded": pdf_qa.loaded
+    }
+    # Asking for stats should not be what imports the query pipeline
+    if stats["pipeline_loaded"]:
+        stats.update({
+            "index_cache": pdf_qa.index_cache.stats(),
+            "embedding_cache": pdf_qa.embedding_cache.stats(),
+            "answer_cache": pdf_qa.answer_cache.stats(),
+            "streaming": pdf_qa.streaming_stats(),
+            "context_packing": pdf_qa.context_packing_stats()
+        })
+    return stats
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """Report cache and PDF database counters."""
+    return jsonify(collect_stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage and request latency histograms, token counters and the /api/stats counters, for Prometheus."""
+    return Response(metrics.render(collect_stats()), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8000) 
\ No newline at end of file
@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import zlib
+import heapq
+import socket
+import logging
+import itertools
+import threading
+import subprocess
+from concurrent.futures import Future
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Optional, Tuple
+
+from telemetry import span
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rows [start, end) of the vector store in a persist dir; end None is the whole store
+Shard = Tuple[str, int, Optional[int]]
+# (persist dir, vector id, cosine similarity)
+Hit = Tuple[str, str, float]
+
+# Vector stores a worker keeps loaded; the least recently searched is dropped beyond this
+WORKER_MAX_STORES = int(os.getenv("SHARD_WORKER_MAX_STORES", "256"))
+
+
+class _Worker:
+    """One worker process and the connection to it.
+
+    Requests are pickled over a socket pair. A thread reads the replies and
+    resolves the future of each request, so any number of threads can have
+    searches in flight on the same worker; the worker answers them in turn.
+    """
+
+    def __init__(self, number: int, ann_kwargs: Dict[str, Any]):
+        self.number = number
+        parent_socket, child_socket = socket.socketpair()
+        # One BLAS thread per worker: the parallelism comes from the workers
+        env = {**os.environ, "OMP_NUM_THREADS": "1", "OPENBLAS_NUM_THREADS": "1", "MKL_NUM_THREADS": "1"}
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), str(child_socket.fileno()), json.dumps(ann_kwargs)],
+            pass_fds=(child_socket.fileno(),),
+            env=env
+        )
+        child_socket.close()
+        self._conn = Connection(parent_socket.detach())
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._closed = False
+        threading.Thread(target=self._receive, name=f"shard-worker-{number}", daemon=True).start()
+
+    @property
+    def alive(self) -> bool:
+        return not self._closed and self.process.poll() is None
+
+    def submit(self, op: str, *args: Any) -> Future:
+        """Send a request; the future resolves to the worker's reply."""
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Shard worker {self.number} has exited")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            try:
+                self._conn.send((request_id, op, args))
+            except OSError:
+                del self._pending[request_id]
+                raise
+        return future
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                request_id, ok, result = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(result))
+
+        # The worker exited (or was closed): fail what it still had
+        with self._lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError(f"Shard worker {self.number} has exited"))
+        if self.process.poll() is None:
+            return
+        logger.warning(f"Shard worker {self.number} exited with code {self.process.returncode}")
+
+    def close(self) -> None:
+        self._conn.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class ShardPool:
+    """Worker processes that keep vector stores loaded and search them in parallel.
+
+    The vector store of each persist dir is one shard or, with more than
+    `partition_rows` vectors, several shards of contiguous rows, each
+    searched exactly. Every shard is owned by one worker, chosen from a
+    hash of its persist dir, so a worker searches the same stores from one
+    query to the next and the partitions of a store go to different
+    workers. `search` scatters a query embedding to the workers owning the
+    shards and merges their top-k.
+
+    Workers memory-map the stores (the pages are shared with this process
+    and with each other), reload them when their files change, and are
+    restarted on the next search if they die.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        partition_rows: int = 0,
+        ann_kwargs: Optional[Dict[str, Any]] = None,
+        timeout: float = 30.0
+    ):
+        self.partition_rows = partition_rows
+        self.timeout = timeout
+        self._ann_kwargs = ann_kwargs or {}
+        self._lock = threading.Lock()
+        self._workers = [_Worker(number, self._ann_kwargs) for number in range(max(1, workers))]
+        self.searches = 0
+        self.errors = 0
+        self.restarts = 0
+        logger.info(f"Started {len(self._workers)} shard workers")
+
+    def _worker(self, number: int) -> _Worker:
+        with self._lock:
+            worker = self._workers[number]
+            if not worker.alive:
+                worker = self._workers[number] = _Worker(number, self._ann_kwargs)
+                self.restarts += 1
+            return worker
+
+    def shards(self, persist_dir: str, rows: int) -> List[Tuple[int, Shard]]:
+        """
+        The shards of a store and the worker owning each.
+
+        Args:
+            persist_dir: Directory of the index
+            rows: Number of vectors in its store
+
+        Returns:
+            (worker number, shard) pairs
+        """
+        base = zlib.crc32(os.path.abspath(persist_dir).encode())
+        if not self.partition_rows or rows <= self.partition_rows:
+            return [(base % len(self._workers), (persist_dir, 0, None))]
+        parts = -(-rows // self.partition_rows)
+        size = -(-rows // parts)
+        return [
+            ((base + part) % len(self._workers), (persist_dir, part * size, (part + 1) * size))
+            for part in range(parts)
+        ]
+
+    def load(self, persist_dirs: List[str]) -> int:
+        """
+        Have the owning workers load these stores now rather than on first search.
+
+        Returns:
+            The number of stores loaded
+        """
+        loaded = 0
+        for persist_dir in persist_dirs:
+            try:
+                owner, _ = self.shards(persist_dir, 0)[0]
+                rows = self._worker(owner).submit("load", (persist_dir, 0, None)).result(timeout=self.timeout)
+                shards = self.shards(persist_dir, rows)
+                if len(shards) > 1:
+                    futures = [self._worker(number).submit("load", shard) for number, shard in shards]
+                    for future in futures:
+                        future.result(timeout=self.timeout)
+                loaded += 1
+            except Exception as e:
+                logger.error(f"Error loading {persist_dir} into the shard workers: {str(e)}")
+        return loaded
+
+    def search(
+        self,
+        indexes: List[Tuple[str, int]],
+        embedding: List[float],
+        top_k: int,
+        filenames: Optional[List[str]] = None
+    ) -> List[Hit]:
+        """
+        Top-k vectors across the shards of one or more stores.
+
+        Args:
+            indexes: (persist dir, number of vectors) of each store to search
+            embedding: Query embedding
+            top_k: Number of results
+            filenames: If given, only vectors with one of these `file_name`s
+
+        Returns:
+            (persist dir, vector id, similarity) of the best vectors, best first
+        """
+        by_worker: Dict[int, List[Shard]] = {}
+        for persist_dir, rows in indexes:
+            for number, shard in self.shards(persist_dir, rows):
+                by_worker.setdefault(number, []).append(shard)
+
+        with span("shard_search", workers=len(by_worker)):
+            try:
+                futures = [
+                    self._worker(number).submit("search", shards, embedding, top_k, filenames)
+                    for number, shards in by_worker.items()
+                ]
+                hits = [hit for future in futures for hit in future.result(timeout=self.timeout)]
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+                raise
+        with self._lock:
+            self.searches += 1
+        return heapq.nlargest(top_k, hits, key=lambda hit: hit[2])
+
+    def stats(self) -> Dict[str, Any]:
+        """Worker count, searches, errors and restarts."""
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "alive": sum(worker.alive for worker in self._workers),
+                "partition_rows": self.partition_rows,
+                "searches": self.searches,
+                "errors": self.errors,
+                "restarts": self.restarts,
+            }
+
+    def close(self) -> None:
+        """Stop the workers."""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+
+
+def serve(fd: int, ann_kwargs: Dict[str, Any]) -> None:
+    """Worker loop: answer the coordinator's requests until it hangs up."""
+    from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters, VectorStoreQuery
+    from index_cache import IndexCache
+    from mmap_vector_store import MmapVectorStore
+
+    stores = IndexCache(max_entries=WORKER_MAX_STORES)
+
+    def store(persist_dir: str) -> MmapVectorStore:
+        return stores.get(persist_dir, lambda path: MmapVectorStore.from_persist_dir(path, **ann_kwargs))
+
+    def load(shard: Shard) -> int:
+        persist_dir, start, end = shard
+        vector_store = store(persist_dir)
+        # Read the shard's rows once, so the first search does not fault them in
+        vector_store.matrix[start:end].sum()
+        return len(vector_store.node_ids)
+
+    def search(shards: List[Shard], embedding: List[float], top_k: int, filenames: Optional[List[str]]) -> List[Hit]:
+        filters = None
+        if filenames:
+            filters = MetadataFilters(filters=[
+                MetadataFilter(key="file_name", value=list(filenames), operator=FilterOperator.IN)
+            ])
+        query = VectorStoreQuery(query_embedding=embedding, similarity_top_k=top_k, filters=filters)
+        hits = []
+        for persist_dir, start, end in shards:
+            result = store(persist_dir).query(query, row_range=None if end is None else (start, end))
+            hits.extend((persist_dir, vector_id, score) for vector_id, score in zip(result.ids, result.similarities))
+        return heapq.nlargest(top_k, hits, key=lambda hit: hit[2])
+
+    handlers = {"load": load, "search": search}
+    conn = Connection(fd)
+    while True:
+        try:
+            request_id, op, args = conn.recv()
+        except EOFError:
+            break
+        try:
+            conn.send((request_id, True, handlers[op](*args)))
+        except Exception as e:
+            logger.error(f"Shard worker {op} failed: {str(e)}")
+            conn.send((request_id, False, f"{type(e).__name__}: {str(e)}"))
+
+
+if __name__ == "__main__":
+    serve(int(sys.argv[1]), json.loads(sys.argv[2]))
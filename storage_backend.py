@@ -0,0 +1,125 @@
+import os
+import io
+import asyncio
+import functools
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Threads shared by every backend's async methods
+STORAGE_IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", "8"))
+
+# What `upload_file` accepts: raw bytes, a path on disk or a readable binary file
+Source = Union[bytes, str, BinaryIO]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=STORAGE_IO_WORKERS, thread_name_prefix="storage-io")
+        return _executor
+
+
+@contextmanager
+def open_source(source: Source) -> Iterator[BinaryIO]:
+    """Open an upload source as a binary file object without copying it."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield io.BytesIO(source)
+    elif isinstance(source, str):
+        with open(source, "rb") as f:
+            yield f
+    else:
+        yield source
+
+
+def source_size(f: BinaryIO) -> Optional[int]:
+    """Bytes left to read in a file object, or None if it is not seekable."""
+    try:
+        position = f.tell()
+        size = f.seek(0, os.SEEK_END) - position
+        f.seek(position)
+        return size
+    except (OSError, io.UnsupportedOperation, AttributeError):
+        return None
+
+
+class StorageBackend:
+    """Interface shared by the PDF storage backends.
+
+    Backends implement the blocking methods, streaming file contents in
+    chunks rather than holding whole files in memory. The `a`-prefixed
+    coroutines run those methods on a shared, bounded thread pool so async
+    callers can overlap several transfers (e.g. with `asyncio.gather`)
+    while each backend reuses its own pooled connections.
+    """
+
+    def upload_file(self, filename: str, source: Source) -> Dict[str, Any]:
+        """Upload a file and return its record."""
+        raise NotImplementedError
+
+    def download_file(self, key: str, dest: Union[str, BinaryIO]) -> int:
+        """Stream a file to a path or binary file object and return its size."""
+        raise NotImplementedError
+
+    def iter_files(self) -> Iterator[Dict[str, Any]]:
+        """Yield a record for every stored PDF, page by page."""
+        raise NotImplementedError
+
+    def list_files(self) -> List[Dict[str, Any]]:
+        """Return a record for every stored PDF."""
+        return list(self.iter_files())
+
+    def get_file_url(self, key: str) -> str:
+        """Return a download URL for a file."""
+        raise NotImplementedError
+
+    def delete_file(self, key: str) -> bool:
+        """Delete a file."""
+        raise NotImplementedError
+
+    async def _run(self, method, *args):
+        # Run in a copy of the caller's context so the transfer's span joins the caller's trace
+        call = functools.partial(contextvars.copy_context().run, method, *args)
+        return await asyncio.get_running_loop().run_in_executor(_get_executor(), call)
+
+    async def aupload_file(self, filename: str, source: Source) -> Dict[str, Any]:
+        return await self._run(self.upload_file, filename, source)
+
+    async def adownload_file(self, key: str, dest: Union[str, BinaryIO]) -> int:
+        return await self._run(self.download_file, key, dest)
+
+    async def alist_files(self) -> List[Dict[str, Any]]:
+        return await self._run(self.list_files)
+
+    async def aget_file_url(self, key: str) -> str:
+        return await self._run(self.get_file_url, key)
+
+    async def adelete_file(self, key: str) -> bool:
+        return await self._run(self.delete_file, key)
+
+
+@contextmanager
+def open_dest(dest: Union[str, BinaryIO]) -> Iterator[BinaryIO]:
+    """Open a download destination, writing paths atomically."""
+    if not isinstance(dest, str):
+        yield dest
+        return
+    tmp_path = f"{dest}.part"
+    try:
+        with open(tmp_path, "wb") as f:
+            yield f
+        os.replace(tmp_path, dest)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,363 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import functools
+import threading
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Append one JSON line per finished request trace to this file (unset: no trace log)
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")
+
+# Seconds; ingestion stages can take minutes, queries a few milliseconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Monotonic counter with labels, in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Histogram with fixed buckets and labels, in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics of this process, rendered together for `/metrics`."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, documentation, labelnames, buckets))
+
+    def render(self, gauges: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Args:
+            gauges: Optional nested dict of current values (e.g. the
+                `/api/stats` payload); every number in it becomes a gauge
+                named after its path, under the `pdf_qa_` prefix
+
+        Returns:
+            The exposition text
+        """
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, value in _flatten("pdf_qa", gauges or {}):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(prefix: str, data: Dict[str, Any]) -> Iterator[Tuple[str, float]]:
+    for key, value in data.items():
+        name = f"{prefix}_{''.join(c if c.isalnum() else '_' for c in str(key))}"
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, bool):
+            yield name, float(value)
+        elif isinstance(value, (int, float)):
+            yield name, float(value)
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "pdf_qa_stage_seconds",
+    "Time spent in each stage of the query and ingest pipelines",
+    ["stage"]
+)
+STAGE_ERRORS = metrics.counter(
+    "pdf_qa_stage_errors_total",
+    "Stages that raised an exception",
+    ["stage"]
+)
+REQUEST_SECONDS = metrics.histogram(
+    "pdf_qa_http_request_seconds",
+    "HTTP request latency until the response headers are sent",
+    ["method", "endpoint", "status"]
+)
+TOKENS = metrics.counter(
+    "pdf_qa_tokens_total",
+    "Tokens sent to and received from the OpenAI API",
+    ["kind"]
+)
+
+
+class Trace:
+    """Timeline of the stages of one request, written to the trace log when it ends."""
+
+    def __init__(self, name: str, **attrs: Any):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, start: float, seconds: float, depth: int, attrs: Dict[str, Any], error: Optional[str] = None) -> None:
+        span = {
+            "name": name,
+            "depth": depth,
+            "offset_ms": round((start - self.start) * 1000, 3),
+            "duration_ms": round(seconds * 1000, 3),
+        }
+        if attrs:
+            span["attrs"] = attrs
+        if error:
+            span["error"] = error
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self, seconds: float, error: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["offset_ms"])
+        record = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(seconds * 1000, 3),
+            "attrs": self.attrs,
+            "spans": spans,
+        }
+        if error:
+            record["error"] = error
+        return record
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_depth: ContextVar[int] = ContextVar("current_span_depth", default=0)
+_trace_log_lock = threading.Lock()
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def _reset(var: ContextVar, token: Any) -> None:
+    try:
+        var.reset(token)
+    except ValueError:
+        # A generator finished in another context than it started in (e.g. closed by the
+        # garbage collector); there is nothing of this request left to restore
+        var.set(token.old_value if token.old_value is not token.MISSING else var.get())
+
+
+def _record(stage: str, start: float, seconds: float, depth: int, attrs: Dict[str, Any], error: Optional[str] = None) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if error:
+        STAGE_ERRORS.inc(stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(stage, start, seconds, depth, attrs, error)
+
+
+@contextmanager
+def span(stage: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a block as one pipeline stage.
+
+    The duration goes to the `pdf_qa_stage_seconds` histogram and, inside a
+    trace, onto the trace's timeline. The yielded dict can be filled with
+    attributes (counts, cache hits) recorded with the span.
+
+    Args:
+        stage: Stage name, e.g. "llm" or "storage.github.upload"
+        **attrs: Attributes recorded with the span
+    """
+    depth = _current_depth.get()
+    token = _current_depth.set(depth + 1)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _reset(_current_depth, token)
+        _record(stage, start, time.perf_counter() - start, depth, attrs, error)
+
+
+def begin_span() -> Tuple[float, int, Any]:
+    """Open a span whose start and end arrive as separate events; pass the result to `end_span`."""
+    depth = _current_depth.get()
+    return time.perf_counter(), depth, _current_depth.set(depth + 1)
+
+
+def end_span(stage: str, opened: Tuple[float, int, Any], attrs: Optional[Dict[str, Any]] = None) -> None:
+    """Close a span opened with `begin_span`."""
+    start, depth, token = opened
+    _reset(_current_depth, token)
+    _record(stage, start, time.perf_counter() - start, depth, attrs or {})
+
+
+def traced(stage: str):
+    """Decorator form of `span`."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def trace(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Trace one request (a query or an ingest job).
+
+    Starts a new trace unless one is already active, in which case this is
+    just a span of the enclosing trace. When the outermost trace ends it is
+    appended to TRACE_LOG_PATH as one JSON line, if that is set.
+
+    Args:
+        name: Request type, e.g. "query_index" or "ingest"
+        **attrs: Attributes recorded with the trace
+    """
+    if _current_trace.get() is not None:
+        with span(name, **attrs) as span_attrs:
+            yield span_attrs
+        return
+
+    current = Trace(name, **attrs)
+    trace_token = _current_trace.set(current)
+    depth_token = _current_depth.set(1)
+    error = None
+    try:
+        yield current.attrs
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _reset(_current_depth, depth_token)
+        _reset(_current_trace, trace_token)
+        seconds = time.perf_counter() - current.start
+        STAGE_SECONDS.observe(seconds, stage=name)
+        if error:
+            STAGE_ERRORS.inc(stage=name)
+        if TRACE_LOG_PATH:
+            _write_trace(current.to_dict(seconds, error))
+
+
+def _write_trace(record: Dict[str, Any]) -> None:
+    try:
+        line = json.dumps(record, default=str)
+        with _trace_log_lock, open(TRACE_LOG_PATH, "a") as f:
+            f.write(line + "\n")
+    except Exception as e:
+        logger.error(f"Error writing trace log: {str(e)}")
+
+
+def timed_iter(iterable: Iterable[Any], stage: str) -> Iterator[Any]:
+    """
+    Yield from an iterable, recording the total time spent producing items as one span.
+
+    For lazy pipelines (parse, then split, then embed batch by batch) where
+    the producing stage is interleaved with its consumers.
+    """
+    depth = _current_depth.get()
+    first_start = time.perf_counter()
+    seconds = 0.0
+    items = 0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                seconds += time.perf_counter() - start
+                break
+            seconds += time.perf_counter() - start
+            items += 1
+            yield item
+    finally:
+        _record(stage, first_start, seconds, depth, {"items": items})
@@ -0,0 +1,93 @@
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from llama_index.core.callbacks import CBEventType, EventPayload
+from llama_index.core.callbacks.base_handler import BaseCallbackHandler
+from llama_index.core.callbacks.token_counting import get_llm_token_counts
+from llama_index.core.utilities.token_counting import TokenCounter
+from telemetry import TOKENS, begin_span, end_span
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """LlamaIndex callback handler feeding LLM, embedding, retrieval and synthesis events into spans.
+
+    LLM prompt and completion tokens (from the API's usage when present,
+    otherwise counted with tiktoken) and query embedding tokens are added
+    to `pdf_qa_tokens_total`.
+    """
+
+    STAGES = {
+        CBEventType.LLM: "llm",
+        CBEventType.EMBEDDING: "embedding",
+        CBEventType.RETRIEVE: "retrieve",
+        CBEventType.SYNTHESIZE: "synthesize",
+    }
+    # Embedding models that count the tokens they send to the API themselves
+    # (CachedEmbedding skips cached chunks, which this handler cannot see)
+    SELF_COUNTING_EMBEDDINGS = frozenset({"CachedEmbedding"})
+
+    def __init__(self):
+        ignored = [event for event in CBEventType if event not in self.STAGES]
+        super().__init__(event_starts_to_ignore=ignored, event_ends_to_ignore=ignored)
+        self._token_counter: Optional[TokenCounter] = None
+        self._spans: Dict[str, Tuple[Tuple[float, int, Any], bool]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def token_counter(self) -> TokenCounter:
+        # Loading the tokenizer takes a few hundred milliseconds, so it waits for the first LLM call
+        if self._token_counter is None:
+            self._token_counter = TokenCounter()
+        return self._token_counter
+
+    def on_event_start(self, event_type: CBEventType, payload: Optional[Dict[str, Any]] = None, event_id: str = "", parent_id: str = "", **kwargs: Any) -> str:
+        serialized = (payload or {}).get(EventPayload.SERIALIZED) or {}
+        count_tokens = serialized.get("class_name") not in self.SELF_COUNTING_EMBEDDINGS
+        opened = begin_span()
+        with self._lock:
+            self._spans[event_id] = (opened, count_tokens)
+        return event_id
+
+    def on_event_end(self, event_type: CBEventType, payload: Optional[Dict[str, Any]] = None, event_id: str = "", **kwargs: Any) -> None:
+        with self._lock:
+            opened, count_tokens = self._spans.pop(event_id, (None, False))
+        if opened is None:
+            return
+        attrs: Dict[str, Any] = {}
+        payload = payload or {}
+        try:
+            if event_type == CBEventType.LLM:
+                prompt_tokens, completion_tokens = self._llm_tokens(payload, event_id)
+                attrs = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+                TOKENS.inc(prompt_tokens, kind="prompt")
+                TOKENS.inc(completion_tokens, kind="completion")
+            elif event_type == CBEventType.EMBEDDING and count_tokens:
+                tokens = sum(self.token_counter.get_string_tokens(chunk) for chunk in payload.get(EventPayload.CHUNKS, []))
+                attrs = {"tokens": tokens}
+                TOKENS.inc(tokens, kind="embedding")
+        except Exception as e:
+            logger.error(f"Error counting tokens: {str(e)}")
+        end_span(self.STAGES[event_type], opened, attrs)
+
+    def _llm_tokens(self, payload: Dict[str, Any], event_id: str) -> Tuple[int, int]:
+        """Prompt and completion tokens of an LLM call, from the API's usage when the response has it."""
+        response = payload.get(EventPayload.COMPLETION, payload.get(EventPayload.RESPONSE))
+        if getattr(response, "raw", None) is not None:
+            counts = get_llm_token_counts(self.token_counter, payload, event_id)
+            return counts.prompt_token_count, counts.completion_token_count
+        if EventPayload.MESSAGES in payload:
+            prompt_tokens = self.token_counter.estimate_tokens_in_messages(payload[EventPayload.MESSAGES])
+        else:
+            prompt_tokens = self.token_counter.get_string_tokens(str(payload.get(EventPayload.PROMPT, "")))
+        return prompt_tokens, self.token_counter.get_string_tokens(str(response or ""))
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        pass
+
+    def end_trace(self, trace_id: Optional[str] = None, trace_map: Optional[Dict[str, List[str]]] = None) -> None:
+        pass
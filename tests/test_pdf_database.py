@@ -0,0 +1,201 @@
+"""PdfDatabase syncing against the in-memory GitHub stand-in.
+
+    python -m pytest tests
+"""
+import json
+import threading
+
+import pytest
+
+from fake_github import FakeGithubRepo
+from pdf_database import GitHubDatabaseRemote, PdfDatabase, SyncConflict
+
+REMOTE_PATH = "pdf_database.json"
+
+
+def remote_records(repo: FakeGithubRepo) -> dict:
+    return json.loads(repo.get_contents(REMOTE_PATH).decoded_content)
+
+
+def record(filename: str, **fields) -> dict:
+    return {"filename": filename, **fields}
+
+
+class ConflictingRepo(FakeGithubRepo):
+    """A repo where another writer commits just before each of our next `conflicts` writes."""
+
+    def __init__(self, conflicts: int = 1):
+        super().__init__()
+        self.conflicts = conflicts
+        self.interference = 0
+
+    def _interfere(self, path: str) -> None:
+        if self.conflicts <= 0 or path != REMOTE_PATH:
+            return
+        self.conflicts -= 1
+        self.interference += 1
+        try:
+            contents = FakeGithubRepo.get_contents(self, path)
+        except Exception:
+            # Not created yet: the other writer creates it, so our create gets a 422
+            FakeGithubRepo.create_file(self, path, "Other writer", json.dumps({"other.pdf": record("other.pdf")}))
+            return
+        database = json.loads(contents.decoded_content)
+        database["other.pdf"] = record("other.pdf", writes=self.interference)
+        # Moves the SHA, so our update gets a 409
+        FakeGithubRepo.update_file(self, path, "Other writer", json.dumps(database), contents.sha)
+
+    def create_file(self, path, message, content, branch="main"):
+        self._interfere(path)
+        return super().create_file(path, message, content)
+
+    def update_file(self, path, message, content, sha, branch="main"):
+        self._interfere(path)
+        return super().update_file(path, message, content, sha)
+
+
+@pytest.fixture
+def databases(tmp_path):
+    """Factory for databases that are closed at the end of the test."""
+    opened = []
+
+    def open_database(name: str, repo=None, **kwargs) -> PdfDatabase:
+        # A long interval keeps the background thread out of the way; tests flush explicitly
+        kwargs.setdefault("sync_interval", 60)
+        remote = GitHubDatabaseRemote(repo, REMOTE_PATH) if repo is not None else None
+        database = PdfDatabase(str(tmp_path / name), remote=remote, **kwargs)
+        opened.append(database)
+        return database
+
+    yield open_database
+    for database in opened:
+        database.close()
+
+
+def test_writes_are_pushed_in_one_commit(databases):
+    repo = FakeGithubRepo()
+    database = databases("a.sqlite3", repo)
+    for i in range(5):
+        database.upsert(f"{i}.pdf", record(f"{i}.pdf", size=i))
+    database.delete("0.pdf")
+
+    assert database.flush()
+    assert sorted(remote_records(repo)) == ["1.pdf", "2.pdf", "3.pdf", "4.pdf"]
+    assert len(repo.commits) == 1
+    assert database.stats()["pending"] == 0
+
+
+@pytest.mark.parametrize("existing", [False, True], ids=["create-422", "update-409"])
+def test_conflict_is_retried_with_a_merge(databases, existing):
+    repo = ConflictingRepo(conflicts=0)
+    if existing:
+        repo.create_file(REMOTE_PATH, "Seed", json.dumps({"seed.pdf": record("seed.pdf")}))
+    repo.conflicts = 1
+    database = databases("a.sqlite3", repo, max_retries=3)
+    database.upsert("mine.pdf", record("mine.pdf"))
+
+    assert database.flush()
+    remote = remote_records(repo)
+    assert {"mine.pdf", "other.pdf"} <= set(remote)
+    assert ("seed.pdf" in remote) == existing
+    assert database.stats()["conflicts"] == 1
+    # The other writer's entry is adopted locally too
+    assert database.get("other.pdf")["filename"] == "other.pdf"
+
+
+def test_conflicts_beyond_the_retries_leave_changes_pending(databases):
+    repo = ConflictingRepo(conflicts=10)
+    database = databases("a.sqlite3", repo, max_retries=2)
+    database.upsert("mine.pdf", record("mine.pdf"))
+
+    with pytest.raises(SyncConflict):
+        database.flush()
+    assert database.stats()["pending"] == 1
+
+    repo.conflicts = 0
+    assert database.flush()
+    assert "mine.pdf" in remote_records(repo)
+
+
+def test_two_databases_writing_at_once_keep_each_others_entries(databases):
+    repo = FakeGithubRepo()
+    first = databases("first.sqlite3", repo, max_retries=20)
+    second = databases("second.sqlite3", repo, max_retries=20)
+    start = threading.Barrier(2)
+    errors = []
+
+    def write(database: PdfDatabase, prefix: str) -> None:
+        try:
+            start.wait()
+            for i in range(10):
+                database.upsert(f"{prefix}{i}.pdf", record(f"{prefix}{i}.pdf"))
+                database.flush()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=args) for args in ((first, "a"), (second, "b"))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    expected = {f"{prefix}{i}.pdf" for prefix in "ab" for i in range(10)}
+    assert set(remote_records(repo)) == expected
+    assert first.stats()["pending"] == second.stats()["pending"] == 0
+
+
+def test_write_during_a_push_stays_pending(databases):
+    repo = FakeGithubRepo()
+    database = databases("a.sqlite3", repo)
+    database.upsert("a.pdf", record("a.pdf", size=1))
+
+    save = database.remote.save
+
+    def save_and_write(*args, **kwargs):
+        save(*args, **kwargs)
+        # Lands after the batch was read, before it is marked as pushed
+        database.upsert("a.pdf", record("a.pdf", size=2))
+
+    database.remote.save = save_and_write
+    assert not database.flush()
+    assert remote_records(repo)["a.pdf"]["size"] == 1
+    assert database.get("a.pdf")["size"] == 2
+    assert database.stats()["pending"] == 1
+
+    database.remote.save = save
+    assert database.flush()
+    assert remote_records(repo)["a.pdf"]["size"] == 2
+
+
+def test_pending_changes_survive_a_restart(databases, tmp_path):
+    offline = databases("a.sqlite3")
+    offline.upsert("a.pdf", record("a.pdf"))
+    offline.upsert("b.pdf", record("b.pdf"))
+    offline.delete("b.pdf")
+    offline.close()
+
+    repo = FakeGithubRepo()
+    repo.create_file(REMOTE_PATH, "Seed", json.dumps({"b.pdf": record("b.pdf")}))
+    restarted = databases("a.sqlite3", repo)
+    assert restarted.stats()["pending"] == 2
+    assert [r["filename"] for r in restarted.list()] == ["a.pdf"]
+
+    assert restarted.flush()
+    assert set(remote_records(repo)) == {"a.pdf"}
+
+
+def test_rows_written_by_another_process_are_listed_and_pushed(databases):
+    repo = FakeGithubRepo()
+    server = databases("shared.sqlite3", repo)
+    server.upsert("a.pdf", record("a.pdf"))
+    assert server.flush()
+
+    # e.g. bulk_ingest.py, with its own connection to the same file and no remote
+    cli = databases("shared.sqlite3")
+    cli.upsert("b.pdf", record("b.pdf"))
+    cli.close()
+
+    assert {r["filename"] for r in server.list()} == {"a.pdf", "b.pdf"}
+    assert server.flush()
+    assert set(remote_records(repo)) == {"a.pdf", "b.pdf"}